@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of two xyxy box arrays, shape (len(a), len(b))."""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:4], boxes_b[None, :, 2:4])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:4] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:4] - boxes_b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
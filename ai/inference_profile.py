@@ -0,0 +1,71 @@
+import logging
+
+
+class InferenceProfile:
+    """Per-model inference settings, read from the model's entry in model-config.json.
+
+    - input_size: long side of the model input in pixels; unset uses the model's own input size
+    - preprocessing: "letterbox" (aspect-preserving, stride-aligned padding) or "stretch" (legacy square resize)
+    - confidence_threshold / iou_threshold: score cut-off and NMS overlap
+    - classes: class names or ids to keep, all classes when empty
+    - max_detections: upper bound of boxes per image
+    - precision: "fp32" or "int8" (int8 needs an exported backend, torch falls back to fp32)
+    - intra_op_threads: CPU threads for inference, 0 keeps the runtime default
+    """
+    PRECISIONS = ("fp32", "int8")
+    PREPROCESSING_MODES = ("letterbox", "stretch")
+    DEFAULT_PREPROCESS_SIZE = 960
+
+    def __init__(self, input_size: int | None = None, confidence_threshold: float = 0.5, iou_threshold: float = 0.7,
+                 classes: list | None = None, max_detections: int = 300, precision: str = "fp32",
+                 intra_op_threads: int = 0, preprocessing: str = "letterbox"):
+        if precision not in InferenceProfile.PRECISIONS:
+            raise ValueError(f"Unsupported precision [{precision}], use one of {InferenceProfile.PRECISIONS}")
+        if preprocessing not in InferenceProfile.PREPROCESSING_MODES:
+            raise ValueError(f"Unsupported preprocessing [{preprocessing}], "
+                             f"use one of {InferenceProfile.PREPROCESSING_MODES}")
+        self.input_size = input_size
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.classes = classes or []
+        self.max_detections = max_detections
+        self.precision = precision
+        self.intra_op_threads = intra_op_threads
+        self.preprocessing = preprocessing
+
+    @staticmethod
+    def from_config(model_config: dict) -> 'InferenceProfile':
+        return InferenceProfile(
+            input_size=model_config.get('input_size'),
+            confidence_threshold=model_config.get('confidence_threshold', 0.5),
+            iou_threshold=model_config.get('iou_threshold', 0.7),
+            classes=model_config.get('classes'),
+            max_detections=model_config.get('max_detections', 300),
+            precision=model_config.get('precision', 'fp32'),
+            intra_op_threads=model_config.get('intra_op_threads', 0),
+            preprocessing=model_config.get('preprocessing', 'letterbox'))
+
+    @property
+    def preprocess_size(self) -> int:
+        return self.input_size or InferenceProfile.DEFAULT_PREPROCESS_SIZE
+
+    def resolve_class_ids(self, names: dict[int, str]) -> list[int] | None:
+        """Maps the configured class allowlist (names or ids) to ids of the loaded model, None = all classes."""
+        if not self.classes:
+            return None
+        ids_by_name = {name: class_id for class_id, name in names.items()}
+        class_ids = []
+        for entry in self.classes:
+            if isinstance(entry, int) and entry in names:
+                class_ids.append(entry)
+            elif entry in ids_by_name:
+                class_ids.append(ids_by_name[entry])
+            else:
+                logging.getLogger(__name__).warning(f"Class [{entry}] is not known to the model, ignoring it")
+        return class_ids
+
+    def __repr__(self):
+        return (f"InferenceProfile(input_size={self.input_size or 'model default'}, conf={self.confidence_threshold}, "
+                f"iou={self.iou_threshold}, classes={self.classes or 'all'}, max_det={self.max_detections}, "
+                f"precision={self.precision}, threads={self.intra_op_threads or 'default'}, "
+                f"preprocessing={self.preprocessing})")
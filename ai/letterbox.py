@@ -0,0 +1,80 @@
+import math
+
+import cv2
+import numpy as np
+from av import VideoFrame
+
+
+class LetterboxGeometry:
+    """How an image was scaled and padded into the model input, used to map boxes back."""
+
+    def __init__(self, ratio: float, pad_x: int, pad_y: int, output_height: int, output_width: int):
+        self.ratio = ratio
+        self.pad_x = pad_x
+        self.pad_y = pad_y
+        self.output_height = output_height
+        self.output_width = output_width
+
+    @staticmethod
+    def compute(height: int, width: int, target_size: int | tuple[int, int], stride: int = 32,
+                auto: bool = True) -> 'LetterboxGeometry':
+        """Aspect-preserving fit of a `height` x `width` image into `target_size` (long side or (height, width)).
+
+        With `auto` the output is the smallest stride-aligned rectangle around the scaled image (rectangular
+        inference), otherwise it is padded to exactly `target_size`.
+        """
+        target_height, target_width = (target_size, target_size) if isinstance(target_size, int) else target_size
+        ratio = min(target_height / height, target_width / width)
+        content_height, content_width = int(round(height * ratio)), int(round(width * ratio))
+
+        if auto:
+            output_height = math.ceil(content_height / stride) * stride
+            output_width = math.ceil(content_width / stride) * stride
+        else:
+            output_height, output_width = target_height, target_width
+
+        return LetterboxGeometry(ratio, (output_width - content_width) // 2, (output_height - content_height) // 2,
+                                 output_height, output_width)
+
+    def to_original(self, boxes: np.ndarray, original_height: int, original_width: int) -> np.ndarray:
+        """Maps xyxy boxes from letterboxed coordinates back to the original image."""
+        boxes = (boxes - np.array([self.pad_x, self.pad_y, self.pad_x, self.pad_y], dtype=np.float32)) / self.ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, original_width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, original_height)
+        return boxes.astype(np.float32)
+
+
+def letterbox_frame(frame: VideoFrame, target_size: int | tuple[int, int], stride: int = 32, auto: bool = True,
+                    color=(114, 114, 114)) -> tuple[np.ndarray, LetterboxGeometry]:
+    """Same as `letterbox` for a decoded frame.
+
+    Scaling and the YUV to BGR conversion are a single libswscale pass straight to the content size, instead of
+    converting the full-resolution frame and resizing it with OpenCV.
+    """
+    geometry = LetterboxGeometry.compute(frame.height, frame.width, target_size, stride, auto)
+    content_height = int(round(frame.height * geometry.ratio))
+    content_width = int(round(frame.width * geometry.ratio))
+    img = frame.reformat(width=content_width, height=content_height, format="bgr24").to_ndarray()
+    return _pad(img, geometry, color), geometry
+
+
+def letterbox(img, target_size: int | tuple[int, int], stride: int = 32, auto: bool = True,
+              color=(114, 114, 114)) -> tuple[np.ndarray, LetterboxGeometry]:
+    height, width = img.shape[:2]
+    geometry = LetterboxGeometry.compute(height, width, target_size, stride, auto)
+    content_height = int(round(height * geometry.ratio))
+    content_width = int(round(width * geometry.ratio))
+
+    if (content_height, content_width) != (height, width):
+        img = cv2.resize(img, (content_width, content_height), interpolation=cv2.INTER_LINEAR)
+    return _pad(img, geometry, color), geometry
+
+
+def _pad(img, geometry: LetterboxGeometry, color) -> np.ndarray:
+    content_height, content_width = img.shape[:2]
+    if (content_height, content_width) == (geometry.output_height, geometry.output_width):
+        return img
+
+    bottom = geometry.output_height - content_height - geometry.pad_y
+    right = geometry.output_width - content_width - geometry.pad_x
+    return cv2.copyMakeBorder(img, geometry.pad_y, bottom, geometry.pad_x, right, cv2.BORDER_CONSTANT, value=color)
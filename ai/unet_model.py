@@ -10,13 +10,17 @@ from ultralytics import YOLO
 from ultralytics.engine.results import Results
 
 from ai.ai_model import AiModel
+from ai.inference_profile import InferenceProfile
 from detector import load_segmentator
 
 
 class UnetModel(AiModel):
 
-    def __init__(self, model_id: str, model_name: str, model_config_file: str):
+    def __init__(self, model_id: str, model_name: str, model_config_file: str,
+                 profile: InferenceProfile | None = None):
         super().__init__(model_id, model_name, 'unet')
+        # Only input size and threads apply, the segmentator has no detection thresholds or class filter
+        self.profile = profile if profile is not None else InferenceProfile()
         self.model_config_file = ""
         self.detector = None
         self.segmentator = None
@@ -31,6 +35,8 @@ class UnetModel(AiModel):
 
     def __load_segmentator(self, cls2bgr, model_config_file):
         self.segmentator = load_segmentator(model_config_file, cls2bgr=cls2bgr)
+        if self.profile.intra_op_threads > 0:
+            torch.set_num_threads(self.profile.intra_op_threads)
         if torch.cuda.is_available():
             self.device = "cuda:0"
             self.segmentator.to(self.device)
@@ -42,7 +48,7 @@ class UnetModel(AiModel):
         return result
 
     async def detect_yolo_as_image(self, img, font_scale=1, thickness=2):
-        resized_img = cv2.resize(img, (960, 960))
+        resized_img = cv2.resize(img, (self.profile.preprocess_size, self.profile.preprocess_size))
         detection_result = await asyncio.to_thread(
             partial(self.detect_yolo, image=resized_img)
         )
@@ -0,0 +1,40 @@
+import numpy as np
+
+from ai.box_geometry import iou_matrix
+
+
+def compare_detections(reference: dict, candidate: dict, iou_th: float = 0.5) -> dict:
+    """Greedily matches candidate to reference detections (same class, IoU >= `iou_th`) and summarizes agreement."""
+    ious = iou_matrix(np.asarray(reference["boxes"], dtype=np.float32).reshape(-1, 4),
+                      np.asarray(candidate["boxes"], dtype=np.float32).reshape(-1, 4))
+    if ious.size > 0:
+        ious[np.asarray(reference["labels"])[:, None] != np.asarray(candidate["labels"])[None, :]] = 0.0
+
+    matched_ious = []
+    score_differences = []
+    matched_reference = set()
+    matched_candidate = set()
+    for flat_index in np.argsort(-ious, axis=None):
+        reference_index, candidate_index = np.unravel_index(flat_index, ious.shape)
+        if ious[reference_index, candidate_index] < iou_th:
+            break
+        if reference_index in matched_reference or candidate_index in matched_candidate:
+            continue
+        matched_reference.add(reference_index)
+        matched_candidate.add(candidate_index)
+        matched_ious.append(float(ious[reference_index, candidate_index]))
+        score_differences.append(abs(float(reference["scores"][reference_index])
+                                     - float(candidate["scores"][candidate_index])))
+
+    reference_count, candidate_count = len(reference["boxes"]), len(candidate["boxes"])
+    recall = len(matched_reference) / reference_count if reference_count else 1.0
+    precision = len(matched_candidate) / candidate_count if candidate_count else 1.0
+    return {
+        'referenceDetections': reference_count,
+        'candidateDetections': candidate_count,
+        'recall': recall,
+        'precision': precision,
+        'f1': 2 * recall * precision / (recall + precision) if recall + precision > 0 else 0.0,
+        'meanIou': float(np.mean(matched_ious)) if matched_ious else 0.0,
+        'maxScoreDifference': max(score_differences, default=0.0),
+    }
@@ -0,0 +1,109 @@
+import ast
+from abc import abstractmethod
+
+import cv2
+import numpy as np
+
+from ai.inference_profile import InferenceProfile
+from ai.letterbox import LetterboxGeometry, letterbox
+from ai.yolo_backends.yolo_backend import YoloBackend
+
+
+class ExportedYoloBackend(YoloBackend):
+    """Base for YOLOv8 models exported from ultralytics (`yolo export format=onnx|openvino`).
+
+    Subclasses only run the network; input blob creation and decoding of the raw (batch, 4 + classes, anchors)
+    output including NMS happen here, mirroring what ultralytics does for the torch model so the results are
+    interchangeable with `TorchYoloBackend`.
+    """
+
+    def __init__(self, profile: InferenceProfile | None = None):
+        super().__init__()
+        self.profile = profile if profile is not None else InferenceProfile()
+        # Resolved once the subclass has loaded the class names
+        self.class_ids: np.ndarray | None = None
+        # (height, width) the network expects, None for dynamic shapes
+        self.input_size: tuple[int, int] | None = None
+        self.supports_batching = True
+
+    @abstractmethod
+    def run_inference(self, blob: np.ndarray) -> np.ndarray:
+        pass
+
+    @staticmethod
+    def parse_names(names) -> dict[int, str]:
+        if isinstance(names, str):
+            names = ast.literal_eval(names)
+        return {int(key): value for key, value in names.items()}
+
+    def apply_class_filter(self):
+        class_ids = self.profile.resolve_class_ids(self.names)
+        self.class_ids = np.array(class_ids, dtype=np.int64) if class_ids is not None else None
+
+    def predict(self, images: list, conf_th: float) -> list[dict]:
+        if not self.supports_batching and len(images) > 1:
+            return [result for image in images for result in self.predict([image], conf_th)]
+
+        blobs = []
+        geometries = []
+        for image in images:
+            blob, geometry = self.__to_blob(image)
+            blobs.append(blob)
+            geometries.append((geometry, image.shape[0], image.shape[1]))
+
+        # Letterboxed frames of differently shaped sources only stack with blobs of the same shape
+        outputs = [None] * len(blobs)
+        indices_by_shape = dict[tuple, list[int]]()
+        for index, blob in enumerate(blobs):
+            indices_by_shape.setdefault(blob.shape, []).append(index)
+        for indices in indices_by_shape.values():
+            for index, output in zip(indices, self.run_inference(np.stack([blobs[index] for index in indices]))):
+                outputs[index] = output
+        return [self.__decode(output, geometry, conf_th) for output, geometry in zip(outputs, geometries)]
+
+    def __to_blob(self, image) -> tuple[np.ndarray, LetterboxGeometry | None]:
+        geometry = None
+        if self.input_size is not None and image.shape[:2] != self.input_size:
+            # Static input shape: fit the (possibly rectangular) image in without distorting it
+            image, geometry = letterbox(image, self.input_size, stride=self.stride, auto=False)
+
+        # BGR HWC uint8 -> RGB CHW float32 0-1
+        blob = np.ascontiguousarray(image[:, :, ::-1].transpose(2, 0, 1), dtype=np.float32)
+        blob *= 1.0 / 255.0
+        return blob, geometry
+
+    def __decode(self, output: np.ndarray, geometry: tuple[LetterboxGeometry | None, int, int], conf_th: float):
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        labels = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(labels)), labels]
+
+        keep = scores > conf_th
+        if self.class_ids is not None:
+            keep &= np.isin(labels, self.class_ids)
+        xywh = predictions[keep, :4]
+        labels = labels[keep]
+        scores = scores[keep]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        if len(boxes) > 0:
+            top_left_wh = np.concatenate([boxes[:, :2], xywh[:, 2:]], axis=1)
+            indices = cv2.dnn.NMSBoxesBatched(top_left_wh.tolist(), scores.tolist(), labels.tolist(), conf_th,
+                                              self.profile.iou_threshold)
+            indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+            indices = indices[np.argsort(-scores[indices], kind="stable")][:self.profile.max_detections]
+            boxes, labels, scores = boxes[indices], labels[indices], scores[indices]
+
+        letterbox_geometry, height, width = geometry
+        if letterbox_geometry is not None:
+            boxes = letterbox_geometry.to_original(boxes, height, width)
+
+        return {
+            "boxes": boxes.astype(np.float32),
+            "labels": labels.astype(np.float32),
+            "scores": scores.astype(np.float32),
+            "names": self.names,
+        }
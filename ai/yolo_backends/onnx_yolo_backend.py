@@ -0,0 +1,54 @@
+import logging
+import os
+
+import numpy as np
+import onnxruntime
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from ai.inference_profile import InferenceProfile
+from ai.yolo_backends.exported_yolo_backend import ExportedYoloBackend
+
+
+class OnnxYoloBackend(ExportedYoloBackend):
+
+    def __init__(self, model_file_path: str, profile: InferenceProfile | None = None):
+        super().__init__(profile)
+        self.logger = logging.getLogger(__name__)
+        self.__session: onnxruntime.InferenceSession | None = None
+        self.__input_name = ""
+        if self.profile.precision == 'int8':
+            model_file_path = self.__quantized_model(model_file_path)
+        self.__load_session(model_file_path, self.profile.intra_op_threads)
+
+    def __quantized_model(self, model_file_path: str) -> str:
+        """Dynamically quantizes the weights to int8 once and caches the result next to the original model."""
+        quantized_path = os.path.splitext(model_file_path)[0] + ".int8.onnx"
+        if not os.path.exists(quantized_path):
+            self.logger.info(f"Quantizing {model_file_path} to int8 ...")
+            quantize_dynamic(model_file_path, quantized_path, weight_type=QuantType.QUInt8)
+        return quantized_path
+
+    def __load_session(self, model_file_path: str, intra_op_threads: int):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        # 0 lets onnxruntime use one thread per physical core
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        options.enable_cpu_mem_arena = True
+
+        self.__session = onnxruntime.InferenceSession(model_file_path, sess_options=options,
+                                                      providers=["CPUExecutionProvider"])
+        model_input = self.__session.get_inputs()[0]
+        self.__input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        if isinstance(height, int) and isinstance(width, int):
+            self.input_size = (height, width)
+            self.model_input_size = max(height, width)
+        self.supports_batching = not isinstance(batch, int) or batch > 1
+        self.names = self.parse_names(self.__session.get_modelmeta().custom_metadata_map["names"])
+        self.apply_class_filter()
+        self.logger.info(f"Loaded ONNX YOLO model: {model_file_path} (input {model_input.shape}, {self.profile})")
+
+    def run_inference(self, blob: np.ndarray) -> np.ndarray:
+        return self.__session.run(None, {self.__input_name: blob})[0]
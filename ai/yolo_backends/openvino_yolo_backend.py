@@ -0,0 +1,51 @@
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import openvino
+import yaml
+
+from ai.inference_profile import InferenceProfile
+from ai.yolo_backends.exported_yolo_backend import ExportedYoloBackend
+
+
+class OpenVinoYoloBackend(ExportedYoloBackend):
+    """Runs an OpenVINO IR export, `model_path` is the export directory (with metadata.yaml) or the .xml file.
+
+    For int8 precision `model_path` has to be an int8 export (`yolo export format=openvino int8=True`).
+    """
+
+    def __init__(self, model_path: str, profile: InferenceProfile | None = None):
+        super().__init__(profile)
+        self.logger = logging.getLogger(__name__)
+        self.__compiled_model = None
+        self.__load_model(model_path, self.profile.intra_op_threads)
+
+    def __load_model(self, model_path: str, intra_op_threads: int):
+        model_dir = Path(model_path) if os.path.isdir(model_path) else Path(model_path).parent
+        model_xml = next(model_dir.glob("*.xml")) if os.path.isdir(model_path) else Path(model_path)
+
+        core = openvino.Core()
+        model = core.read_model(model_xml)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if self.profile.precision == 'fp32':
+            # Otherwise OpenVINO may silently switch to bf16 on CPUs that support it
+            config["INFERENCE_PRECISION_HINT"] = "f32"
+        if intra_op_threads > 0:
+            config["INFERENCE_NUM_THREADS"] = intra_op_threads
+        self.__compiled_model = core.compile_model(model, "CPU", config)
+
+        model_input = model.inputs[0].get_partial_shape()
+        if model_input[2].is_static and model_input[3].is_static:
+            self.input_size = (model_input[2].get_length(), model_input[3].get_length())
+            self.model_input_size = max(self.input_size)
+        self.supports_batching = model_input[0].is_dynamic or model_input[0].get_length() > 1
+
+        with open(model_dir / "metadata.yaml", "r") as file:
+            self.names = self.parse_names(yaml.safe_load(file)["names"])
+        self.apply_class_filter()
+        self.logger.info(f"Loaded OpenVINO YOLO model: {model_xml} (input {model_input}, {self.profile})")
+
+    def run_inference(self, blob: np.ndarray) -> np.ndarray:
+        return self.__compiled_model(blob)[0]
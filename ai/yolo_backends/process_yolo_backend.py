@@ -0,0 +1,210 @@
+import itertools
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from ai.yolo_backends.yolo_backend import YoloBackend
+
+
+def run_inference_worker(backend_factory: Callable[[], YoloBackend], shared_memory_name: str, slot_bytes: int,
+                         request_queue, response_queue):
+    """Entry point of the worker process: reads images from shared memory slots and answers with result arrays."""
+    # Shutdown is driven by the parent process, not by the terminal's Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The spawned worker shares the parent's resource tracker, so the segment is only unlinked by the parent
+    shared_memory = SharedMemory(name=shared_memory_name)
+
+    backend = backend_factory()
+    response_queue.put(("ready", (backend.names, backend.model_input_size, backend.stride), None))
+
+    while True:
+        request = request_queue.get()
+        if request is None:
+            break
+        request_id, slots, conf_th = request
+        try:
+            images = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared_memory.buf, offset=slot * slot_bytes)
+                      for slot, shape, dtype in slots]
+            results = backend.predict(images, conf_th)
+            del images
+            response_queue.put((request_id, [(result["boxes"], result["labels"], result["scores"])
+                                             for result in results], None))
+        except Exception as e:
+            response_queue.put((request_id, None, repr(e)))
+
+    backend.close()
+    shared_memory.close()
+
+
+class ProcessYoloBackend(YoloBackend):
+    """Hosts another backend in a separate worker process.
+
+    Images are written into fixed-size shared memory slots, so frame arrays are never pickled; only slot
+    descriptors go to the worker and only the small result arrays come back. If the worker dies, the requests
+    in flight fail and the worker is restarted; until the new worker has loaded its model, requests fail at once.
+    """
+    DEFAULT_SLOT_COUNT = 16
+    DEFAULT_SLOT_BYTES = 1280 * 1280 * 3
+    REQUEST_TIMEOUT_SECONDS = 30
+    RESTART_DELAY_SECONDS = 1
+    STARTUP_TIMEOUT_SECONDS = 120
+
+    def __init__(self, backend_factory: Callable[[], YoloBackend], name: str, slot_count: int = DEFAULT_SLOT_COUNT,
+                 slot_bytes: int = DEFAULT_SLOT_BYTES):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.slot_bytes = slot_bytes
+        self.restart_count = 0
+        self.__backend_factory = backend_factory
+        self.__context = multiprocessing.get_context("spawn")
+        self.__shared_memory = SharedMemory(create=True, size=slot_count * slot_bytes)
+        self.__free_slots = queue.Queue()
+        for slot in range(slot_count):
+            self.__free_slots.put(slot)
+
+        self.__pending = dict[int, tuple[Future, list[int]]]()
+        self.__pending_lock = threading.Lock()
+        # Held while the worker's queues are swapped, so no request is queued to a dead worker's queue
+        self.__worker_lock = threading.Lock()
+        self.__request_ids = itertools.count()
+        self.__closed = False
+        self.__ready = threading.Event()
+
+        self.__process = None
+        self.__request_queue = None
+        self.__response_queue = None
+        self.__start_worker()
+        self.__response_thread = threading.Thread(target=self.__read_responses, name=f"inference-worker-{name}",
+                                                  daemon=True)
+        self.__response_thread.start()
+        # The model input size decides how frames are preprocessed, so it has to be known before the first frame
+        if not self.__ready.wait(timeout=ProcessYoloBackend.STARTUP_TIMEOUT_SECONDS):
+            self.close()
+            raise RuntimeError(f"Inference worker [{name}] not ready after "
+                               f"{ProcessYoloBackend.STARTUP_TIMEOUT_SECONDS}s")
+
+    def predict(self, images: list, conf_th: float) -> list[dict]:
+        slots = []
+        try:
+            descriptors = []
+            for image in images:
+                image = np.ascontiguousarray(image)
+                if image.nbytes > self.slot_bytes:
+                    raise ValueError(f"Image of {image.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+                slot = self.__free_slots.get(timeout=ProcessYoloBackend.REQUEST_TIMEOUT_SECONDS)
+                slots.append(slot)
+                np.ndarray(image.shape, dtype=image.dtype, buffer=self.__shared_memory.buf,
+                           offset=slot * self.slot_bytes)[...] = image
+                descriptors.append((slot, image.shape, image.dtype.str))
+
+            future = Future()
+            request_id = next(self.__request_ids)
+            with self.__worker_lock:
+                if not self.__ready.is_set():
+                    raise RuntimeError(f"Inference worker [{self.name}] is not running")
+                with self.__pending_lock:
+                    self.__pending[request_id] = (future, slots)
+                self.__request_queue.put((request_id, descriptors, conf_th))
+        except BaseException:
+            self.__release_slots(slots)
+            raise
+
+        try:
+            return future.result(timeout=ProcessYoloBackend.REQUEST_TIMEOUT_SECONDS)
+        except TimeoutError:
+            # e.g. the request was queued to a worker that crashed before reading it
+            with self.__pending_lock:
+                _, slots = self.__pending.pop(request_id, (None, []))
+            self.__release_slots(slots)
+            raise
+
+    def close(self):
+        self.__closed = True
+        self.__ready.clear()
+        try:
+            self.__request_queue.put(None)
+            self.__process.join(timeout=5)
+        finally:
+            if self.__process.is_alive():
+                self.__process.terminate()
+            self.__fail_pending(RuntimeError(f"Inference worker [{self.name}] closed"))
+            self.__shared_memory.close()
+            self.__shared_memory.unlink()
+
+    def __start_worker(self):
+        # Fresh queues: a queue may be left locked or half-written by a worker that crashed
+        request_queue = self.__context.Queue()
+        response_queue = self.__context.Queue()
+        process = self.__context.Process(
+            target=run_inference_worker,
+            args=(self.__backend_factory, self.__shared_memory.name, self.slot_bytes, request_queue, response_queue),
+            name=f"inference-worker-{self.name}",
+            daemon=True)
+        process.start()
+        with self.__worker_lock:
+            self.__request_queue = request_queue
+            self.__response_queue = response_queue
+            self.__process = process
+        self.logger.info(f"Started inference worker [{self.name}] (pid {process.pid})")
+
+    def __read_responses(self):
+        while not self.__closed:
+            try:
+                request_id, results, error = self.__response_queue.get(timeout=1.0)
+            except queue.Empty:
+                if not self.__process.is_alive() and not self.__closed:
+                    self.__restart_worker()
+                continue
+            except (EOFError, OSError):
+                if not self.__closed:
+                    self.__restart_worker()
+                continue
+
+            if request_id == "ready":
+                self.names, self.model_input_size, self.stride = results
+                self.__ready.set()
+                continue
+
+            with self.__pending_lock:
+                future, slots = self.__pending.pop(request_id, (None, []))
+            self.__release_slots(slots)
+            if future is None or future.done():
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(f"Inference worker [{self.name}] failed: {error}"))
+            else:
+                future.set_result([{"boxes": boxes, "labels": labels, "scores": scores, "names": self.names}
+                                   for boxes, labels, scores in results])
+
+    def __restart_worker(self):
+        self.logger.error(f"Inference worker [{self.name}] died (exit code {self.__process.exitcode}), restarting")
+        with self.__worker_lock:
+            # Requests fail at once until the new worker reports ready
+            self.__ready.clear()
+            self.__fail_pending(RuntimeError(f"Inference worker [{self.name}] crashed"))
+            self.restart_count += 1
+        time.sleep(ProcessYoloBackend.RESTART_DELAY_SECONDS)
+        if not self.__closed:
+            self.__start_worker()
+
+    def __fail_pending(self, error: Exception):
+        with self.__pending_lock:
+            pending = list(self.__pending.values())
+            self.__pending.clear()
+        for future, slots in pending:
+            self.__release_slots(slots)
+            if not future.done():
+                future.set_exception(error)
+
+    def __release_slots(self, slots: list[int]):
+        for slot in slots:
+            self.__free_slots.put(slot)
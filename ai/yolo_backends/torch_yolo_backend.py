@@ -0,0 +1,72 @@
+import logging
+import threading
+from typing import Literal
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+
+from ai.inference_profile import InferenceProfile
+from ai.yolo_backends.yolo_backend import YoloBackend
+
+
+class TorchYoloBackend(YoloBackend):
+
+    def __init__(self, model_file_path: str, profile: InferenceProfile | None = None):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.yolo_model: YOLO | None = None
+        self.profile = profile if profile is not None else InferenceProfile()
+        self.__predict_args = {}
+        # The ultralytics predictor is not thread-safe, frames may arrive from several worker threads
+        self.__predict_lock = threading.Lock()
+        self.__load_yolo(model_file_path)
+
+    def __load_yolo(self, model_file_path: str):
+        self.yolo_model = YOLO(model_file_path, task='detect', verbose=False)
+        self.names = self.yolo_model.names
+        imgsz = self.yolo_model.overrides.get('imgsz', 640)
+        self.model_input_size = max(imgsz) if isinstance(imgsz, (list, tuple)) else int(imgsz)
+        self.stride = int(max(self.yolo_model.model.stride))
+        self.__apply_profile()
+        self.logger.info(f"Loaded YOLO model: {model_file_path} ({self.profile})")
+
+    def __apply_profile(self):
+        if self.profile.precision == 'int8':
+            self.logger.warning("int8 precision needs an exported backend (onnx/openvino), using fp32")
+        if self.profile.intra_op_threads > 0:
+            # Process-wide setting: per model only when the model runs in its own worker process
+            torch.set_num_threads(self.profile.intra_op_threads)
+
+        self.__predict_args = {
+            'iou': self.profile.iou_threshold,
+            'max_det': self.profile.max_detections,
+            'classes': self.profile.resolve_class_ids(self.names),
+        }
+        if self.profile.input_size:
+            self.__predict_args['imgsz'] = self.profile.input_size
+
+    def predict(self, images: list, conf_th: float) -> list[dict]:
+        with self.__predict_lock:
+            yolo_results = self.yolo_model.predict(images, conf=conf_th, verbose=False, **self.__predict_args)
+
+        # postprocessing output
+        return [self.__adjust_output(yolo_result) for yolo_result in yolo_results]
+
+    def __adjust_output(self, yolo_result: Results) -> dict[
+        Literal["boxes", "scores", "labels"], npt.NDArray[np.float32 | np.uint8]
+    ]:
+        """Returns detected objects as a dict of:
+        - denormalized bounding boxes in xyxy format (left top, right bottom),
+        - scores - values between 0-1,
+        - labels - classes assign to objects.
+        """
+        results = {
+            "boxes": yolo_result.boxes.xyxy.cpu().numpy(),
+            "labels": yolo_result.boxes.cls.cpu().numpy(),
+            "scores": yolo_result.boxes.conf.cpu().numpy(),
+            "names": yolo_result.names,
+        }
+        return results  # type: ignore[return-value]
@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+
+
+class YoloBackend(ABC):
+    """Runs a YOLO detector on a batch of preprocessed BGR images.
+
+    Every backend returns one dict per image in the format of `TorchYoloBackend` (boxes/labels/scores/names),
+    so `YoloModel` can pre- and postprocess independently of where and how inference runs.
+    """
+
+    def __init__(self):
+        self.names: dict[int, str] = {}
+        # Long side of the input the network was built for (None = unknown) and its largest stride
+        self.model_input_size: int | None = None
+        self.stride = 32
+
+    @abstractmethod
+    def predict(self, images: list, conf_th: float) -> list[dict]:
+        pass
+
+    def close(self):
+        pass
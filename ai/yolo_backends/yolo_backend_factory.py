@@ -0,0 +1,29 @@
+import os
+from functools import partial
+from typing import Callable
+
+from ai.inference_profile import InferenceProfile
+from ai.yolo_backends.torch_yolo_backend import TorchYoloBackend
+from ai.yolo_backends.yolo_backend import YoloBackend
+
+
+def create_yolo_backend_factory(model_config: dict, root_path: str,
+                                profile: InferenceProfile) -> Callable[[], YoloBackend]:
+    """Returns a picklable factory for the backend configured in a model-config.json entry.
+
+    `backend` is one of "torch" (default, ultralytics), "onnx" (onnxruntime) or "openvino"; for the exported
+    backends `path` points to the `yolo export` output.
+    """
+    backend = model_config.get('backend', 'torch')
+    model_path = os.path.join(root_path, model_config['path'])
+
+    if backend == 'torch':
+        return partial(TorchYoloBackend, model_path, profile)
+    # Optional dependencies, only needed when an exported model is configured
+    if backend == 'onnx':
+        from ai.yolo_backends.onnx_yolo_backend import OnnxYoloBackend
+        return partial(OnnxYoloBackend, model_path, profile)
+    if backend == 'openvino':
+        from ai.yolo_backends.openvino_yolo_backend import OpenVinoYoloBackend
+        return partial(OpenVinoYoloBackend, model_path, profile)
+    raise ValueError(f"Unknown YOLO backend [{backend}] for model [{model_config['id']}]")
@@ -1,74 +1,140 @@
 import asyncio
+import time
 from functools import partial
-from typing import Literal
 
 import cv2
 import numpy as np
-import numpy.typing as npt
-from ultralytics import YOLO
-from ultralytics.engine.results import Results
+from av import VideoFrame
 
 from ai.ai_model import AiModel
+from ai.inference_profile import InferenceProfile
+from ai.letterbox import LetterboxGeometry, letterbox, letterbox_frame
+from ai.yolo_backends.torch_yolo_backend import TorchYoloBackend
+from ai.yolo_backends.yolo_backend import YoloBackend
+from services.metrics import LATENCY_BUCKETS_MS, REGISTRY
+from video.batching_queue import BatchingQueue
+from video.detection_overlay import DetectionOverlay
+
+INFERENCE_LATENCY_MS = REGISTRY.histogram("inference_latency_ms", "Backend predict time, a batch counts once",
+                                          LATENCY_BUCKETS_MS, ("model",))
 
 
 class YoloModel(AiModel):
 
-    def __init__(self, model_id: str, model_name: str, model_file_path: str, conf_th: float = 0.5):
+    def __init__(self, model_id: str, model_name: str, model_file_path: str, profile: InferenceProfile | None = None,
+                 backend: YoloBackend | None = None):
         super().__init__(model_id, model_name, 'yolo')
-        self.yolo_model: YOLO | None = None
-        self.conf_th = conf_th
-        self.__load_yolo(model_file_path)
-
-    def __load_yolo(self, model_file_path: str):
-        self.yolo_model = YOLO(model_file_path, task='detect', verbose=False)
-        self.logger.info(f"Loaded YOLO model: {model_file_path}")
+        self.profile = profile if profile is not None else InferenceProfile()
+        self.backend: YoloBackend = backend if backend is not None else TorchYoloBackend(model_file_path, self.profile)
+        self.conf_th = self.profile.confidence_threshold
+        self.batching_queue: BatchingQueue | None = None
+        self.__overlays = dict[tuple, DetectionOverlay]()
+        self.__inference_latency = INFERENCE_LATENCY_MS.labels(model_id)
 
     def detect_yolo(self, image, conf_th):
-        yolo_result = self.yolo_model.predict(image, conf=conf_th, verbose=False)[0]
-
-        # postprocessing output
-        results = self.__adjust_output(yolo_result)
-        return results
-
-    def __adjust_output(self, yolo_result: Results) -> dict[
-        Literal["boxes", "scores", "labels"], npt.NDArray[np.float32 | np.uint8]
-    ]:
-        """Returns detected objects as a dict of:
-        - denormalized bounding boxes in xyxy format (left top, right bottom),
-        - scores - values between 0-1,
-        - labels - classes assign to objects.
+        return self.detect_yolo_batch([image], conf_th)[0]
+
+    def detect_yolo_batch(self, images, conf_th):
+        start = time.perf_counter()
+        detection_results = self.backend.predict(images, conf_th)
+        self.__inference_latency.observe((time.perf_counter() - start) * 1000)
+        return detection_results
+
+    @property
+    def preprocess_size(self) -> int:
+        """Long side of the preprocessed image.
+
+        Letterboxing straight to the network's input size means the backend does not resize a second time.
         """
-        results = {
-            "boxes": yolo_result.boxes.xyxy.cpu().numpy(),
-            "labels": yolo_result.boxes.cls.cpu().numpy(),
-            "scores": yolo_result.boxes.conf.cpu().numpy(),
-            "names": yolo_result.names,
-        }
-        return results  # type: ignore[return-value]
+        if self.profile.preprocessing == 'stretch':
+            return self.profile.preprocess_size
+        return self.profile.input_size or self.backend.model_input_size or InferenceProfile.DEFAULT_PREPROCESS_SIZE
 
-    async def detect_yolo_as_image(self, img, font_scale=1, thickness=2):
-        resized_img = cv2.resize(img, (960, 960))
-        detection_result = await asyncio.to_thread(
+    def preprocess(self, img):
+        if self.profile.preprocessing == 'stretch':
+            return cv2.resize(img, (self.preprocess_size, self.preprocess_size))
+        resized_img, _ = letterbox(img, self.preprocess_size, stride=self.backend.stride)
+        return resized_img
+
+    def preprocess_frame(self, frame: VideoFrame):
+        """Same as `preprocess` for a decoded frame, scaled and converted to BGR by libswscale in one pass."""
+        if self.profile.preprocessing == 'stretch':
+            return frame.reformat(width=self.preprocess_size, height=self.preprocess_size, format="bgr24").to_ndarray()
+        resized_img, _ = letterbox_frame(frame, self.preprocess_size, stride=self.backend.stride)
+        return resized_img
+
+    def postprocess(self, detection_result, img, resized_img):
+        """Maps the boxes from the model input back to the original image."""
+        return self.postprocess_to_size(detection_result, img.shape[0], img.shape[1], resized_img)
+
+    def postprocess_to_size(self, detection_result, height: int, width: int, resized_img):
+        """Maps the boxes from the model input back to a `height` x `width` image, e.g. the decoded frame."""
+        if self.profile.preprocessing == 'letterbox':
+            geometry = LetterboxGeometry.compute(height, width, self.preprocess_size, self.backend.stride)
+            detection_result["boxes"] = geometry.to_original(detection_result["boxes"], height, width)
+            return detection_result
+
+        width_factor = width / resized_img.shape[1]
+        height_factor = height / resized_img.shape[0]
+        detection_result["boxes"] = detection_result["boxes"] * np.array(
+            [width_factor, height_factor, width_factor, height_factor], dtype=np.float32)
+        return detection_result
+
+    async def detect(self, img):
+        """Runs the model on a BGR image and returns the detections with boxes scaled to the image size."""
+        resized_img = self.preprocess(img)
+        detection_result = await self.infer(resized_img)
+        return self.postprocess(detection_result, img, resized_img)
+
+    async def detect_frame(self, frame: VideoFrame):
+        """Same as `detect` for a decoded frame, the frame is never converted at full resolution."""
+        resized_img = self.preprocess_frame(frame)
+        detection_result = await self.infer(resized_img)
+        return self.postprocess_to_size(detection_result, frame.height, frame.width, resized_img)
+
+    async def infer(self, resized_img):
+        """Runs the model on an already preprocessed image, boxes are in model input coordinates."""
+        if self.batching_queue is not None:
+            return await self.batching_queue.submit(resized_img)
+        return await asyncio.to_thread(
             partial(self.detect_yolo, image=resized_img, conf_th=self.conf_th)
         )
-        # detection_result = await self.detect_yolo(image=resized_img, conf_th=self.conf_th)
 
-        boxes = detection_result["boxes"]
-        for index, box in enumerate(boxes):
-            label = detection_result["names"][detection_result["labels"][index]]
+    def detect_blocking(self, img, loop: asyncio.AbstractEventLoop | None = None):
+        """Same as `detect`, for callers running in a worker thread.
+
+        With batching enabled the request is still submitted to the batching queue on `loop`, so frames
+        processed by several threads end up in the same batch.
+        """
+        resized_img = self.preprocess(img)
+        if self.batching_queue is not None and loop is not None:
+            detection_result = self.batching_queue.submit_threadsafe(resized_img, loop)
+        else:
+            detection_result = self.detect_yolo(resized_img, self.conf_th)
+        return self.postprocess(detection_result, img, resized_img)
+
+    def detect_frame_blocking(self, frame: VideoFrame, loop: asyncio.AbstractEventLoop | None = None):
+        """Same as `detect_blocking` for a decoded frame."""
+        resized_img = self.preprocess_frame(frame)
+        if self.batching_queue is not None and loop is not None:
+            detection_result = self.batching_queue.submit_threadsafe(resized_img, loop)
+        else:
+            detection_result = self.detect_yolo(resized_img, self.conf_th)
+        return self.postprocess_to_size(detection_result, frame.height, frame.width, resized_img)
+
+    async def detect_yolo_as_image(self, img, font_scale=1, thickness=2):
+        detection_result = await self.detect(img)
+        self.log_detections(detection_result)
+        return self.get_overlay(font_scale, thickness).draw(img, detection_result)
+
+    def log_detections(self, detection_result):
+        for index in range(len(detection_result["boxes"])):
+            label = detection_result["names"][int(detection_result["labels"][index])]
             score = round(detection_result['scores'][index] * 100.0)
             self.logger.info(f"Detected: {label} - {score}")
 
-            width_factor = img.shape[1] / resized_img.shape[1]
-            height_factor = img.shape[0] / resized_img.shape[0]
-
-            cv2.rectangle(img,
-                          (int(box[0] * width_factor), int(box[1] * height_factor)),
-                          (int(box[2] * width_factor), int(box[3] * height_factor)),
-                          (0, 255, 0), thickness)
-            cv2.putText(img,
-                        f"{label} - {score}%",
-                        (int(box[0] * width_factor), int(box[1] * height_factor) - 10), cv2.FONT_HERSHEY_SIMPLEX,
-                        font_scale,
-                        (0, 255, 0), thickness)
-        return img
+    def get_overlay(self, font_scale=1, thickness=2) -> DetectionOverlay:
+        key = (font_scale, thickness)
+        if key not in self.__overlays:
+            self.__overlays[key] = DetectionOverlay(font_scale=font_scale, thickness=thickness)
+        return self.__overlays[key]
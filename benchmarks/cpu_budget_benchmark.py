@@ -0,0 +1,210 @@
+"""Searches a thread split between H.264 decoding, H.264 encoding, OpenCV and torch for this machine.
+
+All four workloads run at the same time, like in the server, each in its own thread with its share of the
+budget. Starting from one thread each, the next thread always goes to the slowest stage until the budget is
+used up; the split with the highest pipeline rate (the rate of its slowest stage) wins. Decoding and encoding
+go through aiortc's `H264Decoder` / `H264Encoder` with the budget applied, i.e. the codecs the server runs
+(stock aiortc, or the NVIDIA copy when it is installed).
+
+    python -m benchmarks.cpu_budget_benchmark --threads 16 --width 1920 --height 1080
+
+The printed spec can be passed to the server as --cpu-budget. The torch stage is a small convolution stack
+standing in for the detector; pass --model to use a real YOLO model instead.
+"""
+import argparse
+import fractions
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import av
+import cv2
+import numpy as np
+import torch
+from aiortc.codecs.h264 import H264Decoder, H264Encoder
+from aiortc.jitterbuffer import JitterFrame
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config.cpu_budget import CpuBudget  # noqa: E402
+
+VIDEO_CLOCK_RATE = 90000
+STAGES = ("decoder", "encoder", "opencv", "torch")
+
+
+def encode_sample(width: int, height: int, frame_count: int) -> tuple[list[av.Packet], list[av.VideoFrame]]:
+    """A synthetic moving pattern, encoded once so the decoder stage has real H.264 packets."""
+    codec = av.CodecContext.create("libx264", "w")
+    codec.width = width
+    codec.height = height
+    codec.pix_fmt = "yuv420p"
+    codec.time_base = fractions.Fraction(1, 30)
+    codec.options = {"tune": "zerolatency", "preset": "veryfast"}
+    frames = []
+    packets = []
+    for index in range(frame_count):
+        img = np.zeros((height, width, 3), dtype=np.uint8)
+        cv2.circle(img, ((index * 16) % width, height // 2), height // 6, (0, 200, 255), -1)
+        cv2.putText(img, str(index), (40, 120), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 6)
+        frame = av.VideoFrame.from_ndarray(img, format="bgr24").reformat(format="yuv420p")
+        frame.pts = index
+        frame.time_base = codec.time_base
+        frames.append(frame)
+        packets.extend(codec.encode(frame))
+    packets.extend(codec.encode(None))
+    return packets, frames
+
+
+class Stage(threading.Thread):
+    """Runs one workload in a loop until stopped and counts the frames it got through."""
+
+    def __init__(self, name: str, work):
+        super().__init__(name=name, daemon=True)
+        self.frames = 0
+        self.stopped = threading.Event()
+        self.__work = work
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.frames += self.__work()
+
+
+def decoder_work(packets: list[av.Packet]):
+    state = {"decoder": None, "index": 0}
+
+    def work() -> int:
+        # The sample starts with a keyframe, so every pass over it starts with a fresh decoder
+        if state["index"] == 0:
+            state["decoder"] = H264Decoder()
+        timestamp = state["index"] * VIDEO_CLOCK_RATE // 30
+        decoded = len(state["decoder"].decode(JitterFrame(data=bytes(packets[state["index"]]), timestamp=timestamp)))
+        state["index"] = (state["index"] + 1) % len(packets)
+        return decoded
+    return work
+
+
+def encoder_work(frames: list[av.VideoFrame]):
+    encoder = H264Encoder()
+    state = {"pts": 0}
+
+    def work() -> int:
+        frame = frames[state["pts"] % len(frames)]
+        frame.pts = state["pts"]
+        state["pts"] += 1
+        encoder.encode(frame)
+        return 1
+    return work
+
+
+def opencv_work(frames: list[av.VideoFrame]):
+    # What the frame path costs besides inference: letterbox resize, annotation and conversion back to YUV
+    images = [frame.to_ndarray(format="bgr24") for frame in frames[:10]]
+    state = {"index": 0}
+
+    def work() -> int:
+        img = images[state["index"] % len(images)]
+        state["index"] += 1
+        cv2.resize(img, (960, 544), interpolation=cv2.INTER_LINEAR)
+        annotated = img.copy()
+        cv2.rectangle(annotated, (100, 100), (600, 500), (0, 255, 0), 4)
+        cv2.cvtColor(annotated, cv2.COLOR_BGR2YUV_I420)
+        return 1
+    return work
+
+
+def torch_work(model_path: str | None, input_size: int):
+    if model_path:
+        from ultralytics import YOLO
+        model = YOLO(model_path, task='detect', verbose=False)
+        img = np.random.randint(0, 255, (input_size, input_size, 3), dtype=np.uint8)
+
+        def work() -> int:
+            model.predict(img, imgsz=input_size, verbose=False)
+            return 1
+        return work
+
+    network = torch.nn.Sequential(
+        torch.nn.Conv2d(3, 32, 3, stride=2, padding=1), torch.nn.SiLU(),
+        torch.nn.Conv2d(32, 64, 3, stride=2, padding=1), torch.nn.SiLU(),
+        torch.nn.Conv2d(64, 128, 3, stride=2, padding=1), torch.nn.SiLU(),
+        torch.nn.Conv2d(128, 256, 3, stride=2, padding=1), torch.nn.SiLU()).eval()
+    tensor = torch.rand(1, 3, input_size, input_size)
+
+    def work() -> int:
+        with torch.inference_mode():
+            network(tensor)
+        return 1
+    return work
+
+
+def measure(budget: CpuBudget, packets, frames, args) -> dict[str, float]:
+    """Frames per second of every stage while all of them run at the same time."""
+    budget.apply()
+    stages = {
+        "decoder": Stage("decoder", decoder_work(packets)),
+        "encoder": Stage("encoder", encoder_work(frames)),
+        "opencv": Stage("opencv", opencv_work(frames)),
+        "torch": Stage("torch", torch_work(args.model, args.input_size)),
+    }
+    for stage in stages.values():
+        stage.start()
+    time.sleep(args.warmup_seconds)
+    start_frames = {name: stage.frames for name, stage in stages.items()}
+    start = time.perf_counter()
+    time.sleep(args.seconds)
+    elapsed = time.perf_counter() - start
+    rates = {name: (stage.frames - start_frames[name]) / elapsed for name, stage in stages.items()}
+    for stage in stages.values():
+        stage.stopped.set()
+    for stage in stages.values():
+        stage.join()
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU thread budget search")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Threads to distribute")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--model", help="YOLO model for the torch stage, a synthetic network when omitted")
+    parser.add_argument("--input-size", type=int, default=640)
+    parser.add_argument("--encoder-preset", default=CpuBudget.DEFAULT_ENCODER_PRESET)
+    parser.add_argument("--thread-type", choices=CpuBudget.THREAD_TYPES, default=CpuBudget.DEFAULT_THREAD_TYPE)
+    parser.add_argument("--seconds", type=float, default=3.0, help="Measurement time per split")
+    parser.add_argument("--warmup-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.threads < len(STAGES):
+        parser.error(f"At least {len(STAGES)} threads are needed, one per stage")
+
+    packets, frames = encode_sample(args.width, args.height, frame_count=60)
+    threads = {stage: 1 for stage in STAGES}
+    best = None
+
+    print(f"{'decoder':>8} {'encoder':>8} {'opencv':>7} {'torch':>6} | "
+          f"{'dec fps':>8} {'enc fps':>8} {'cv fps':>8} {'torch fps':>9} | {'pipeline':>8}")
+    while True:
+        budget = CpuBudget(decoder_threads=threads["decoder"], decoder_thread_type=args.thread_type,
+                           encoder_threads=threads["encoder"], encoder_thread_type=args.thread_type,
+                           encoder_preset=args.encoder_preset, opencv_threads=threads["opencv"],
+                           torch_threads=threads["torch"])
+        rates = measure(budget, packets, frames, args)
+        pipeline_rate = min(rates.values())
+        print(f"{threads['decoder']:>8} {threads['encoder']:>8} {threads['opencv']:>7} {threads['torch']:>6} | "
+              f"{rates['decoder']:>8.1f} {rates['encoder']:>8.1f} {rates['opencv']:>8.1f} "
+              f"{rates['torch']:>9.1f} | {pipeline_rate:>8.1f}")
+        if best is None or pipeline_rate > best[0]:
+            best = (pipeline_rate, budget)
+
+        if sum(threads.values()) >= args.threads:
+            break
+        threads[min(rates, key=rates.get)] += 1
+
+    print(f"\nBest split ({best[0]:.1f} frames/s through the slowest stage):")
+    print(f"  --cpu-budget {best[1].to_spec()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compares the cost of turning a decoded YUV frame into the model input per source resolution.
+
+    bgr24 + cv2:  frame.to_ndarray(format="bgr24") at full resolution, then letterbox with cv2.resize
+    swscale:      frame.reformat(width, height, format="bgr24") straight to the letterboxed content size
+    full bgr24:   the full-resolution conversion alone, only paid when a frame is annotated
+
+    python -m benchmarks.frame_conversion_benchmark --input-size 960
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from av import VideoFrame
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai.letterbox import letterbox, letterbox_frame  # noqa: E402
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080), (2560, 1440), (3840, 2160)]
+
+
+def measure(function, iterations: int) -> float:
+    function()  # warm-up, creates the swscale context
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame to model input conversion benchmark")
+    parser.add_argument("--input-size", type=int, default=960, help="Model input size")
+    parser.add_argument("--stride", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'resolution':>12} {'bgr24 + cv2':>12} {'swscale':>9} {'speedup':>8} {'full bgr24':>11}")
+    for width, height in RESOLUTIONS:
+        yuv = np.random.randint(0, 255, (height * 3 // 2, width), dtype=np.uint8)
+        frame = VideoFrame.from_ndarray(yuv, format="yuv420p")
+
+        legacy_ms = measure(lambda: letterbox(frame.to_ndarray(format="bgr24"), args.input_size, args.stride),
+                            args.iterations)
+        swscale_ms = measure(lambda: letterbox_frame(frame, args.input_size, args.stride), args.iterations)
+        full_ms = measure(lambda: frame.to_ndarray(format="bgr24"), args.iterations)
+        print(f"{width}x{height:>7} {legacy_ms:>12.2f} {swscale_ms:>9.2f} {legacy_ms / swscale_ms:>7.1f}x "
+              f"{full_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compares per-frame YOLO time of the legacy square stretch against letterbox preprocessing.
+
+    python -m benchmarks.preprocessing_benchmark --model models/yolov8x.pt --image sample.jpg
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ai.inference_profile import InferenceProfile  # noqa: E402
+from ai.yolo_model import YoloModel  # noqa: E402
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080)]
+
+
+def benchmark(model: YoloModel, img: np.ndarray, iterations: int) -> tuple[float, tuple, int]:
+    resized_img = model.preprocess(img)
+    model.postprocess(model.detect_yolo(resized_img, model.conf_th), img, resized_img)  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        resized_img = model.preprocess(img)
+        detections = model.postprocess(model.detect_yolo(resized_img, model.conf_th), img, resized_img)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+    return elapsed_ms, resized_img.shape[:2], len(detections["boxes"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stretch vs letterbox preprocessing benchmark")
+    parser.add_argument("--model", required=True, help="Path of the YOLO .pt model")
+    parser.add_argument("--image", help="Sample image, random noise when omitted")
+    parser.add_argument("--input-size", type=int, default=None, help="Model input size, model default when omitted")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    source = cv2.imread(args.image) if args.image else np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    models = {mode: YoloModel("benchmark", "benchmark", args.model,
+                              profile=InferenceProfile(input_size=args.input_size, preprocessing=mode))
+              for mode in InferenceProfile.PREPROCESSING_MODES}
+
+    print(f"{'resolution':>12} {'mode':>10} {'model input':>12} {'pixels':>9} {'ms/frame':>9} {'boxes':>6}")
+    for width, height in RESOLUTIONS:
+        img = cv2.resize(source, (width, height))
+        for mode, model in models.items():
+            elapsed_ms, (input_height, input_width), boxes = benchmark(model, img, args.iterations)
+            print(f"{width}x{height:>7} {mode:>10} {f'{input_width}x{input_height}':>12} "
+                  f"{input_width * input_height:>9} {elapsed_ms:>9.1f} {boxes:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import fractions
 import logging
 import math
+import time
+import weakref
 from itertools import tee
 from struct import pack, unpack_from
-from typing import Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
 
 import av
 from av.frame import Frame
@@ -20,8 +22,11 @@ MIN_BITRATE = 500000  # 500 kbps
 MAX_BITRATE = 3000000  # 3 Mbps
 
 MAX_FRAME_RATE = 30
+VIDEO_CLOCK_RATE = 90000
 PACKET_MAX = 1300
 
+NAL_TYPE_SLICE = 1
+NAL_TYPE_IDR = 5
 NAL_TYPE_FU_A = 28
 NAL_TYPE_STAP_A = 24
 
@@ -103,12 +108,132 @@ class H264PayloadDescriptor:
 
 
 class H264Decoder(Decoder):
+    # CHANGED: Load-aware frame skipping. While decoding falls behind the RTP clock or the consumers of the
+    # decoded frames are backed up, non-reference and then all non-key frames are skipped instead of being
+    # decoded only to be dropped downstream. Levels are lowered again once the load is gone.
+    SKIP_LEVELS = ("DEFAULT", "NONREF", "NONKEY")
+    OVERLOAD_LAG_SECONDS = 0.3
+    RECOVERED_LAG_SECONDS = 0.1
+    OVERLOAD_QUEUE_RATIO = 0.75
+    RECOVERED_QUEUE_RATIO = 0.5
+    # A raised level needs time to show in the lag; levels are lowered only after a calm interval
+    RAISE_INTERVAL_SECONDS = 1.0
+    LOWER_INTERVAL_SECONDS = 3.0
+
+    # CHANGED: Thread budget set by the application, 0 keeps FFmpeg's default
+    thread_count = 0
+    thread_type = "SLICE"
+    # Set by the application: whether to skip at all, and the fill ratio (0..1) of the fullest queue downstream
+    skipping_enabled = False
+    downstream_load: Optional[Callable[[], float]] = None
+    instances: "weakref.WeakSet[H264Decoder]" = weakref.WeakSet()
 
     def __init__(self) -> None:
         # CHANGED: Use NVIDIA Decoder
         self.codec = av.CodecContext.create("h264_cuvid", "r")
+        if H264Decoder.thread_count > 0:
+            self.codec.thread_count = H264Decoder.thread_count
+            self.codec.thread_type = H264Decoder.thread_type
+        self.skip_level = 0
+        self.skipped_frames = 0
+        self.decoded_frames = 0
+        self.decode_lag = 0.0
+        self.__level_changed_at = 0.0
+        self.__recovered_since: Optional[float] = None
+        self.__awaiting_keyframe = False
+        self.__min_delay: Optional[float] = None
+        self.__last_timestamp: Optional[int] = None
+        self.__timestamp_offset = 0
+        H264Decoder.instances.add(self)
+
+    @classmethod
+    def get_all_statistics(cls) -> List[dict]:
+        return [decoder.get_statistics() for decoder in list(cls.instances)]
+
+    def get_statistics(self) -> dict:
+        return {
+            "skipLevel": H264Decoder.SKIP_LEVELS[self.skip_level],
+            "decodeLagMs": round(self.decode_lag * 1000),
+            "decodedFrames": self.decoded_frames,
+            "skippedFrames": self.skipped_frames,
+        }
+
+    def __update_decode_lag(self, timestamp: int) -> None:
+        # Lag = how much later than the earliest frame this frame arrives, measured against the RTP clock
+        if self.__last_timestamp is not None and timestamp < self.__last_timestamp - (1 << 31):
+            self.__timestamp_offset += 1 << 32
+        self.__last_timestamp = timestamp
+        delay = time.monotonic() - (timestamp + self.__timestamp_offset) / VIDEO_CLOCK_RATE
+        if self.__min_delay is None or delay < self.__min_delay:
+            self.__min_delay = delay
+        self.decode_lag = delay - self.__min_delay
+
+    def __update_skip_level(self) -> None:
+        now = time.monotonic()
+        queue_load = H264Decoder.downstream_load() if H264Decoder.downstream_load is not None else 0.0
+        overloaded = self.decode_lag > H264Decoder.OVERLOAD_LAG_SECONDS or \
+            queue_load >= H264Decoder.OVERLOAD_QUEUE_RATIO
+        recovered = self.decode_lag < H264Decoder.RECOVERED_LAG_SECONDS and \
+            queue_load < H264Decoder.RECOVERED_QUEUE_RATIO
+        if not recovered:
+            self.__recovered_since = None
+        elif self.__recovered_since is None:
+            self.__recovered_since = now
+
+        level = self.skip_level
+        if overloaded and level < len(H264Decoder.SKIP_LEVELS) - 1 and \
+                now - self.__level_changed_at >= H264Decoder.RAISE_INTERVAL_SECONDS:
+            level += 1
+        elif recovered and level > 0 and now - self.__recovered_since >= H264Decoder.LOWER_INTERVAL_SECONDS:
+            # Every lower level has to stay calm for the full interval again
+            level -= 1
+            self.__recovered_since = now
+        if level == self.skip_level:
+            return
+
+        if self.skip_level == H264Decoder.SKIP_LEVELS.index("NONKEY"):
+            # The frames after the skipped ones reference them, decoding resumes at the next keyframe
+            self.__awaiting_keyframe = True
+        logger.warning(f"H264Decoder() skip_frame {H264Decoder.SKIP_LEVELS[self.skip_level]} -> "
+                       f"{H264Decoder.SKIP_LEVELS[level]} (lag {self.decode_lag * 1000:.0f} ms, "
+                       f"queue load {queue_load:.2f})")
+        self.skip_level = level
+        self.__level_changed_at = now
+        try:
+            self.codec.skip_frame = H264Decoder.SKIP_LEVELS[level]
+        except (AttributeError, ValueError):
+            pass
+
+    def __is_skipped(self, data: bytes) -> bool:
+        """Whether the current level discards this frame.
+
+        The frame is withheld from the decoder as well, hardware decoders do not honour `skip_frame`.
+        """
+        if self.skip_level == 0 and not self.__awaiting_keyframe:
+            return False
+        keyframe = False
+        reference = False
+        for nal_unit in H264Encoder._split_bitstream(data):
+            nal_type = nal_unit[0] & 0x1F
+            if nal_type == NAL_TYPE_IDR:
+                keyframe = True
+            if NAL_TYPE_SLICE <= nal_type <= NAL_TYPE_IDR and nal_unit[0] & 0x60:
+                reference = True
+        if keyframe:
+            self.__awaiting_keyframe = False
+            return False
+        if self.__awaiting_keyframe or self.skip_level >= H264Decoder.SKIP_LEVELS.index("NONKEY"):
+            return True
+        return not reference
 
     def decode(self, encoded_frame: JitterFrame) -> List[Frame]:
+        self.__update_decode_lag(encoded_frame.timestamp)
+        if H264Decoder.skipping_enabled:
+            self.__update_skip_level()
+        if self.__is_skipped(encoded_frame.data):
+            self.skipped_frames += 1
+            return []
+
         try:
             packet = av.Packet(encoded_frame.data)
             packet.pts = encoded_frame.timestamp
@@ -120,11 +245,13 @@ class H264Decoder(Decoder):
             )
             return []
 
+        self.decoded_frames += len(frames)
         return frames
 
 
 def create_encoder_context(
-        codec_name: str, width: int, height: int, bitrate: int
+        codec_name: str, width: int, height: int, bitrate: int, thread_count: int = 0, thread_type: str = "SLICE",
+        preset: Optional[str] = None
 ) -> Tuple[av.CodecContext, bool]:
     codec = av.CodecContext.create(codec_name, "w")
     codec.width = width
@@ -141,12 +268,22 @@ def create_encoder_context(
         # CHANGED: Not working with NVIDIA ENCODER
         # "tune": "zerolatency",  # does nothing using h264_omx
     }
+    # CHANGED: Threads, preset and zerolatency for the software fallback
+    if thread_count > 0:
+        codec.thread_count = thread_count
+        codec.thread_type = thread_type
+    if codec_name == "libx264":
+        codec.options = {**codec.options, "tune": "zerolatency", **({"preset": preset} if preset else {})}
     codec.open()
     return codec, codec_name == "h264_omx"
 
 
 class H264Encoder(Encoder):
     DEBUG_ENCODING = dict()
+    # CHANGED: Thread budget and libx264 preset set by the application
+    thread_count = 0
+    thread_type = "SLICE"
+    preset: Optional[str] = None
 
     def __init__(self) -> None:
         self.buffer_data = b""
@@ -305,6 +442,9 @@ class H264Encoder(Encoder):
                     frame.width,
                     frame.height,
                     bitrate=self.target_bitrate,
+                    thread_count=H264Encoder.thread_count,
+                    thread_type=H264Encoder.thread_type,
+                    preset=H264Encoder.preset,
                 )
 
         data_to_send = b""
@@ -1,7 +1,9 @@
 from middleware.auth import Auth
 from services.connection_manager import ConnectionManager
+from services.loop_lag_monitor import LoopLagMonitor
 from services.telemetry_service import TelemetryService
 from video.detection_service import DetectionService
+from video.recorders.recording_store import RecordingStore
 
 
 class App:
@@ -9,3 +11,5 @@ class App:
     telemetry_service: TelemetryService | None = None
     connection_manager: ConnectionManager | None = None
     auth_service: Auth | None = None
+    loop_lag_monitor: LoopLagMonitor | None = None
+    recording_store: RecordingStore | None = None
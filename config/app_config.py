@@ -4,7 +4,40 @@ import os
 class AppConfig:
     root_path = ""
     damage_detection_model_file: str = ""
+    composite_detections: bool = False
+    motion_gate_threshold: float | None = None
+    track_objects: bool = False
+    frame_processing_workers: int = 4
+    # See CpuBudget.from_spec, empty keeps every library's default
+    cpu_budget: str = ''
+    pipelined_inference: bool = False
+    # No asyncio debug mode, its slow-callback logging and coroutine origin tracking cost every task
+    production: bool = False
+    uvloop: bool = False
+    loop_block_threshold_ms: float = 100
+    frame_trace_size: int = 1024
+    # getStats samples kept per peer connection, one per second
+    rtc_stats_history: int = 300
+    relay_queue_size: int = 4
+    relay_drop_policy: str = 'drop-oldest'
+    decode_skipping: bool = False
+    shared_encoder: bool = False
+    # height:max kbps per rendition, e.g. '1080:3000,540:1200,270:400'; empty = source resolution only
+    renditions: str = ''
+    passthrough: bool = False
+    recording_mode: str = 'encode'
+    recording_container: str = 'mp4'
+    recorder_queue_size: int = 30
+    segment_seconds: float = 60
+    recording_budget_mb: int = 10240
+    event_labels: list[str] = ['person']
+    event_pre_roll_seconds: float = 5
+    event_post_roll_seconds: float = 5
 
     @staticmethod
     def records_directory():
         return os.path.join(AppConfig.root_path, "records")
+
+    @staticmethod
+    def segments_directory():
+        return os.path.join(AppConfig.records_directory(), "videos", "segments")
@@ -0,0 +1,143 @@
+import fractions
+import logging
+
+import av
+import cv2
+
+
+class CpuBudget:
+    """How many threads each CPU consumer of the media pipeline may use.
+
+    Left alone, software H.264 decoding and encoding run single-threaded while OpenCV and torch each size
+    their pools to all cores and compete for them. 0 keeps a library's default. Written as a spec string,
+    e.g. "decoder=2,encoder=4,opencv=2,torch=8,encoder_preset=veryfast", so a split found by
+    `benchmarks/cpu_budget_benchmark.py` can be passed to `--cpu-budget` as is.
+
+    The NVIDIA copy of aiortc's H.264 codec reads the codec settings itself; with stock aiortc, `apply` hooks
+    the creation of the decoder and encoder contexts when they are set (see `install_stock_codec_hooks`). The
+    hardware decoder `h264_cuvid` ignores thread options.
+    """
+    THREAD_TYPES = ("SLICE", "FRAME", "AUTO")
+    # Frame threading delays every frame by one frame per thread, slices keep the latency of a single thread
+    DEFAULT_THREAD_TYPE = "SLICE"
+    DEFAULT_ENCODER_PRESET = "veryfast"
+
+    def __init__(self, decoder_threads: int = 0, decoder_thread_type: str = DEFAULT_THREAD_TYPE,
+                 encoder_threads: int = 0, encoder_thread_type: str = DEFAULT_THREAD_TYPE,
+                 encoder_preset: str = DEFAULT_ENCODER_PRESET, opencv_threads: int = 0, torch_threads: int = 0):
+        for thread_type in (decoder_thread_type, encoder_thread_type):
+            if thread_type not in CpuBudget.THREAD_TYPES:
+                raise ValueError(f"Unsupported thread type [{thread_type}], use one of {CpuBudget.THREAD_TYPES}")
+        self.decoder_threads = decoder_threads
+        self.decoder_thread_type = decoder_thread_type
+        self.encoder_threads = encoder_threads
+        self.encoder_thread_type = encoder_thread_type
+        self.encoder_preset = encoder_preset
+        self.opencv_threads = opencv_threads
+        self.torch_threads = torch_threads
+
+    @staticmethod
+    def from_spec(spec: str) -> 'CpuBudget':
+        """Parses "decoder=2,encoder=4,...", the keys are `decoder`, `encoder`, `opencv`, `torch` (thread
+        counts), `decoder_thread_type`, `encoder_thread_type` and `encoder_preset`."""
+        values = {}
+        for entry in spec.split(","):
+            if not entry.strip():
+                continue
+            key, _, value = entry.partition("=")
+            key = key.strip()
+            if key in ("decoder", "encoder", "opencv", "torch"):
+                values[f"{key}_threads"] = int(value)
+            elif key in ("decoder_thread_type", "encoder_thread_type"):
+                values[key] = value.strip().upper()
+            elif key == "encoder_preset":
+                values[key] = value.strip()
+            else:
+                raise ValueError(f"Unknown CPU budget entry [{key}]")
+        return CpuBudget(**values)
+
+    def to_spec(self) -> str:
+        return (f"decoder={self.decoder_threads},decoder_thread_type={self.decoder_thread_type},"
+                f"encoder={self.encoder_threads},encoder_thread_type={self.encoder_thread_type},"
+                f"encoder_preset={self.encoder_preset},opencv={self.opencv_threads},torch={self.torch_threads}")
+
+    def apply(self):
+        """Process-wide; models that set `intra_op_threads` still override the torch setting when loaded."""
+        if self.opencv_threads > 0:
+            cv2.setNumThreads(self.opencv_threads)
+        if self.torch_threads > 0:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+
+        from aiortc.codecs.h264 import H264Decoder, H264Encoder
+        if hasattr(H264Decoder, 'thread_count'):
+            H264Decoder.thread_count = self.decoder_threads
+            H264Decoder.thread_type = self.decoder_thread_type
+            H264Encoder.thread_count = self.encoder_threads
+            H264Encoder.thread_type = self.encoder_thread_type
+            H264Encoder.preset = self.encoder_preset
+        else:
+            install_stock_codec_hooks(self)
+        logging.getLogger(__name__).info(f"CPU budget: {self.to_spec()}")
+
+
+# The budget the stock codec hooks read, and the hooks already installed
+_stock_codec_budget: CpuBudget | None = None
+_stock_codec_hooks = set[str]()
+# `create_encoder_context` is replaced by a copy of this version's setup
+STOCK_ENCODER_CONTEXT_VERSION = "1.9."
+
+
+def install_stock_codec_hooks(budget: CpuBudget):
+    """Makes stock aiortc's H.264 codec use the codec settings of `budget`.
+
+    A hook is only installed once a setting differs from aiortc's behaviour, an empty budget leaves aiortc as it
+    is. The decoder context is opened on the first packet, so its thread options are set right after `__init__`.
+    The encoder context is opened inside `create_encoder_context`, which is replaced by the setup of aiortc 1.9
+    with the thread options and preset added; other aiortc versions keep their encoder settings.
+    """
+    global _stock_codec_budget
+    import aiortc
+    from aiortc.codecs import h264
+    _stock_codec_budget = budget
+
+    if budget.decoder_threads > 0 and "decoder" not in _stock_codec_hooks:
+        decoder_init = h264.H264Decoder.__init__
+
+        def __init__(decoder, *args, **kwargs):
+            decoder_init(decoder, *args, **kwargs)
+            if _stock_codec_budget.decoder_threads > 0:
+                decoder.codec.thread_count = _stock_codec_budget.decoder_threads
+                decoder.codec.thread_type = _stock_codec_budget.decoder_thread_type
+        h264.H264Decoder.__init__ = __init__
+        _stock_codec_hooks.add("decoder")
+
+    if (budget.encoder_threads > 0 or budget.encoder_preset != CpuBudget.DEFAULT_ENCODER_PRESET) and \
+            "encoder" not in _stock_codec_hooks:
+        if not aiortc.__version__.startswith(STOCK_ENCODER_CONTEXT_VERSION):
+            logging.getLogger(__name__).warning(f"Encoder threads and preset are not applied to aiortc "
+                                                f"{aiortc.__version__}, only to {STOCK_ENCODER_CONTEXT_VERSION}x")
+            return
+
+        def create_encoder_context(codec_name: str, width: int, height: int, bitrate: int):
+            codec = av.CodecContext.create(codec_name, "w")
+            codec.width = width
+            codec.height = height
+            codec.bit_rate = bitrate
+            codec.pix_fmt = "yuv420p"
+            codec.framerate = fractions.Fraction(h264.MAX_FRAME_RATE, 1)
+            codec.time_base = fractions.Fraction(1, h264.MAX_FRAME_RATE)
+            codec.options = {
+                "profile": "baseline",
+                "level": "31",
+                "tune": "zerolatency",  # does nothing using h264_omx
+            }
+            if _stock_codec_budget.encoder_threads > 0:
+                codec.thread_count = _stock_codec_budget.encoder_threads
+                codec.thread_type = _stock_codec_budget.encoder_thread_type
+            if codec_name == "libx264":
+                codec.options = {**codec.options, "preset": _stock_codec_budget.encoder_preset}
+            codec.open()
+            return codec, codec_name == "h264_omx"
+        h264.create_encoder_context = create_encoder_context
+        _stock_codec_hooks.add("encoder")
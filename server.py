@@ -4,8 +4,10 @@ import base64
 import json
 import logging
 import os
+import re
 import ssl
 import time
+from functools import partial
 from pathlib import Path
 
 import aiohttp_jinja2
@@ -21,10 +23,22 @@ from aiortc.contrib.media import MediaBlackhole, MediaRecorder
 
 from config.app_config import AppConfig
 from config.app import App
+from config.cpu_budget import CpuBudget
 from middleware.auth import Auth
 from services.connection_manager import ConnectionManager
+from services.loop_lag_monitor import LoopLagMonitor
+from services.metrics import REGISTRY
 from services.telemetry_service import TelemetryService
 from video.detection_service import DetectionService
+from video.motion_gate import MotionGate
+from video.object_tracker import ObjectTracker
+from video.frame_tracer import FRAME_TRACER
+from video.passthrough_track import EncodedStreamTap, PassthroughTrack
+from video.recorders.event_clip_recorder import EventClipRecorder
+from video.recorders.packet_recorder import PacketRecorder
+from video.recorders.recording_store import RecordingStore
+from video.recorders.segmented_recorder import SegmentedRecorder
+from video.recorders.threaded_encode_recorder import ThreadedEncodeRecorder
 from video.transformers.yolo_transformer import YoloTransformer
 from video.video_transform_track import VideoTransformTrack
 
@@ -52,7 +66,7 @@ def rescale_image(image, max_width, max_height):
 
 
 def init_detection_module():
-    detection_service = DetectionService()
+    detection_service = DetectionService(frame_processing_workers=AppConfig.frame_processing_workers)
     detection_service.load_models()
     # detection_service.load_yolo(os.path.join(AppConfig.root_path, "models", AppConfig.damage_detection_model_file))
     # detection_service.load_unet_detector(os.path.join(AppConfig.root_path, "models"))
@@ -127,6 +141,78 @@ async def models_api_endpoint(request):
     return web.json_response(models_json)
 
 
+async def detection_statistics_api_endpoint(request):
+    return web.json_response(App.detection_service.get_batching_statistics())
+
+
+async def loop_lag_api_endpoint(request):
+    return web.json_response(App.loop_lag_monitor.get_statistics())
+
+
+async def metrics_endpoint(request):
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+async def frame_trace_statistics_api_endpoint(request):
+    return web.json_response(FRAME_TRACER.get_statistics())
+
+
+async def frame_traces_api_endpoint(request):
+    return web.json_response(FRAME_TRACER.get_traces(int(request.query.get("limit", 50))))
+
+
+async def relay_statistics_api_endpoint(request):
+    return web.json_response(App.connection_manager.media_relay.get_statistics())
+
+
+async def rtc_stats_api_endpoint(request):
+    """getStats deltas per peer connection, ?connectionId= for one connection, ?limit= newest samples only."""
+    limit = int(request.query["limit"]) if "limit" in request.query else None
+    return web.json_response(App.connection_manager.rtc_stats_collector.get_statistics(
+        request.query.get("connectionId"), limit))
+
+
+async def telemetry_api_endpoint(request):
+    return web.json_response(App.telemetry_service.get_statistics())
+
+
+async def decoder_statistics_api_endpoint(request):
+    return web.json_response(App.connection_manager.get_decoder_statistics())
+
+
+async def encoder_statistics_api_endpoint(request):
+    return web.json_response(App.connection_manager.get_shared_encoder_statistics())
+
+
+async def recordings_api_endpoint(request):
+    return web.json_response({camera_id: App.recording_store.index(camera_id).get_statistics()
+                              for camera_id in App.recording_store.camera_ids()})
+
+
+async def recording_segments_api_endpoint(request):
+    """Segments of a camera overlapping ?start=&end= (unix seconds, default: everything)."""
+    camera_id = request.match_info["camera_id"]
+    if camera_id not in App.recording_store.camera_ids():
+        raise web.HTTPNotFound()
+    start_time = float(request.query.get("start", 0))
+    end_time = float(request.query.get("end", time.time()))
+    segments = App.recording_store.index(camera_id).find(start_time, end_time)
+    return web.json_response([{**segment.to_dict(), "url": f"/files/segments/{camera_id}/{segment.file_name}"}
+                              for segment in segments])
+
+
+def producer_camera_id(request, params: dict) -> str:
+    """Names a producer's recordings: the `cameraId` of its offer, or its address, usable as a directory name."""
+    camera_id = str(params.get("cameraId") or request.remote or "camera")
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", camera_id).strip(".") or "camera"
+
+
+def create_segmented_recorder(camera_id: str) -> SegmentedRecorder:
+    return SegmentedRecorder(App.recording_store.index(camera_id), App.recording_store.retention_manager(camera_id),
+                             container=AppConfig.recording_container, segment_seconds=AppConfig.segment_seconds,
+                             max_queue_size=AppConfig.recorder_queue_size)
+
+
 async def photos_api_endpoint(request):
     image_dir = os.path.join(AppConfig.root_path, "records/images")
     files = [f for f in os.listdir(image_dir) if os.path.isfile(os.path.join(image_dir, f))]
@@ -153,6 +239,7 @@ async def offer_producer(request):
 
     if "modelId" in params:
         model_id = params["modelId"]
+    camera_id = producer_camera_id(request, params)
 
     offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
 
@@ -167,20 +254,43 @@ async def offer_producer(request):
                 if message_json["type"] == "rtt-client":
                     channel.send(message)
                 if message_json["type"] == "rtt-client-result":
-                    App.telemetry_service.rtt_camera = message_json["rtt"]
+                    peer_connection.rtt_ms = message_json["rtt"]
 
     @peer_connection.on("track")
     async def on_track(track):
         logging.info("Track %s received", track.kind)
 
         if track.kind == "video":
-            track1 = VideoTransformTrackDebug(App.connection_manager.media_relay.subscribe(track, buffered=True),
+            receiver = next(receiver for receiver in peer_connection.getReceivers() if receiver.track is track)
+            if AppConfig.passthrough or AppConfig.recording_mode in ('remux', 'segmented', 'events'):
+                peer_connection.encoded_stream_tap = EncodedStreamTap(receiver, name='camera')
+            if FRAME_TRACER.capacity > 0:
+                FRAME_TRACER.attach_receiver(receiver)
+
+            # Relay subscribers are named and reported per producer stream
+            subscribe = partial(App.connection_manager.media_relay.subscribe, stream_id=peer_connection.id)
+
+            track1 = VideoTransformTrackDebug(subscribe(track, buffered=True, name='debug-track'),
                                               name='video_subscription')
 
-            track2 = VideoTransformTrack(App.connection_manager.media_relay.subscribe(track, buffered=True),
+            motion_gate = MotionGate(AppConfig.motion_gate_threshold) \
+                if AppConfig.motion_gate_threshold is not None else None
+            object_tracker = None
+            if AppConfig.track_objects:
+                # Tracks have to outlive the longest stretch the gate skips inference for
+                max_age_seconds = ObjectTracker.DEFAULT_MAX_AGE_SECONDS
+                if motion_gate is not None:
+                    max_age_seconds += motion_gate.max_skip_seconds
+                object_tracker = ObjectTracker(max_age_seconds=max_age_seconds)
+
+            track2 = VideoTransformTrack(subscribe(track, buffered=True, name='detection-track'),
                                          name='video_subscription_edge',
                                          video_transformer=YoloTransformer(model_id,
-                                                                           App.detection_service))
+                                                                           App.detection_service),
+                                         composite_detections=AppConfig.composite_detections,
+                                         motion_gate=motion_gate,
+                                         object_tracker=object_tracker,
+                                         pipelined=AppConfig.pipelined_inference)
 
             # video_subscription = VideoTransformTrack(*
             #     App.connection_manager.media_relay.subscribe(track, buffered=False),
@@ -240,23 +350,50 @@ async def offer_producer(request):
             video_records_dir = os.path.join(AppConfig.records_directory(), "videos")
             Path.mkdir(Path(video_records_dir), exist_ok=True, parents=True)
 
-            recorder1 = MediaRecorder(
-                os.path.join(video_records_dir, time.strftime('%Y%m%d-%H_%M_%S') + "-track-1.mp4"))
-            recorder1.addTrack(App.connection_manager.media_relay.subscribe(track1))
+            file_prefix = os.path.join(video_records_dir, time.strftime('%Y%m%d-%H_%M_%S'))
+            recorder2 = None
+            if AppConfig.recording_mode == 'events':
+                # Only clips of the camera track around matching detections, nothing is recorded continuously
+                events_dir = os.path.join(video_records_dir, "events", camera_id)
+                Path.mkdir(Path(events_dir), exist_ok=True, parents=True)
+                recorder1 = EventClipRecorder(events_dir, AppConfig.event_labels,
+                                              pre_roll_seconds=AppConfig.event_pre_roll_seconds,
+                                              post_roll_seconds=AppConfig.event_post_roll_seconds,
+                                              container=AppConfig.recording_container)
+                recorder1.addTrack(peer_connection.encoded_stream_tap.subscribe(name='event-clips'))
+                track2.video_transformer.add_detection_listener(recorder1.on_detections)
+                # Nothing else pulls the detection track without a viewer, keep it running so events are detected
+                recorder2 = MediaBlackhole()
+            elif AppConfig.recording_mode == 'segmented':
+                # Every camera has its own index and disk budget
+                recorder1 = create_segmented_recorder(f"{camera_id}-track-1")
+                recorder1.addTrack(peer_connection.encoded_stream_tap.subscribe(name='recorder-track-1'))
+                recorder2 = create_segmented_recorder(f"{camera_id}-track-2")
+            elif AppConfig.recording_mode == 'remux':
+                # Camera track: the received packets as they are; annotated track: encoded off the event loop
+                recorder1 = PacketRecorder(f"{file_prefix}-track-1.{AppConfig.recording_container}")
+                recorder1.addTrack(peer_connection.encoded_stream_tap.subscribe(name='recorder-track-1'))
+                recorder2 = ThreadedEncodeRecorder(f"{file_prefix}-track-2.{AppConfig.recording_container}",
+                                                   max_queue_size=AppConfig.recorder_queue_size)
+            else:
+                recorder1 = MediaRecorder(f"{file_prefix}-track-1.mp4")
+                recorder1.addTrack(subscribe(track1, name='recorder-track-1'))
+                recorder2 = MediaRecorder(f"{file_prefix}-track-2.mp4")
             await recorder1.start()
-
-            recorder2 = MediaRecorder(
-                os.path.join(video_records_dir, time.strftime('%Y%m%d-%H_%M_%S') + "-track-2.mp4"))
-            recorder2.addTrack(App.connection_manager.media_relay.subscribe(track2))
-            await recorder2.start()
+            if recorder2 is not None:
+                recorder2.addTrack(subscribe(track2, name='recorder-track-2'))
+                await recorder2.start()
 
             peer_connection.subscriptions.append(track1)
             peer_connection.subscriptions.append(track2)
 
         @track.on("ended")
         async def on_ended():
+            if peer_connection.encoded_stream_tap is not None:
+                peer_connection.encoded_stream_tap.close()
             await recorder1.stop()
-            await recorder2.stop()
+            if recorder2 is not None:
+                await recorder2.stop()
             logging.info("Track %s ended", track.kind)
 
     # handle offer
@@ -271,17 +408,34 @@ async def offer_consumer(request):
     consumer_peer_connection = App.connection_manager.create_peer_connection(connection_type="consumer")
 
     producer_peer_connection = App.connection_manager.get_primary_producer_connection()
+    consumer_peer_connection.source_connection_id = producer_peer_connection.id
 
     blackhole = MediaBlackhole()
     blackhole.addTrack(
-        App.connection_manager.media_relay.subscribe(producer_peer_connection.subscriptions[0], buffered=False))
+        App.connection_manager.media_relay.subscribe(producer_peer_connection.subscriptions[0], buffered=False,
+                                                     stream_id=producer_peer_connection.id))
     await blackhole.start()
 
     # track1 = App.connection_manager.media_relay.subscribe(producer_peer_connection.subscriptions[0], buffered=False)
-    track2 = App.connection_manager.media_relay.subscribe(producer_peer_connection.subscriptions[1], buffered=False)
-
     # consumer_peer_connection.addTrack(track1)
-    consumer_peer_connection.addTrack(track2)
+    if AppConfig.passthrough and producer_peer_connection.encoded_stream_tap is not None and \
+            params["sdp"].count("m=video") > 1:
+        # The camera view is forwarded as received, without decoding and re-encoding it for this viewer
+        App.connection_manager.add_passthrough_track(consumer_peer_connection,
+                                                     producer_peer_connection.encoded_stream_tap)
+    if AppConfig.shared_encoder:
+        App.connection_manager.add_shared_encoder_track(consumer_peer_connection,
+                                                        producer_peer_connection.subscriptions[1])
+    else:
+        track2 = App.connection_manager.media_relay.subscribe(producer_peer_connection.subscriptions[1],
+                                                              buffered=False, stream_id=producer_peer_connection.id)
+        consumer_peer_connection.addTrack(track2)
+    if FRAME_TRACER.capacity > 0:
+        for sender in consumer_peer_connection.getSenders():
+            # Forwarded camera packets share the pts of the frames they were decoded to, they would mark them
+            if sender.track is not None and sender.track.kind == "video" and \
+                    not isinstance(sender.track, PassthroughTrack):
+                FRAME_TRACER.attach_sender(sender)
     ConnectionManager.force_codec(consumer_peer_connection, "video/H264")
 
     await consumer_peer_connection.setRemoteDescription(offer)
@@ -290,6 +444,8 @@ async def offer_consumer(request):
 
 async def on_shutdown(app):
     App.telemetry_service.shutdown()
+    App.loop_lag_monitor.shutdown()
+    App.detection_service.shutdown()
     await App.connection_manager.shutdown()
     loop = asyncio.get_event_loop()
     pending = asyncio.all_tasks(loop=loop)
@@ -308,10 +464,27 @@ async def on_shutdown(app):
         await task
 
 
+def create_event_loop() -> asyncio.AbstractEventLoop:
+    if AppConfig.uvloop:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            logging.warning("uvloop is not installed, using the default event loop")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.set_debug(not AppConfig.production)
+    logging.info(f"Event loop: {type(loop).__module__}.{type(loop).__name__}, debug: {loop.get_debug()}")
+    return loop
+
+
 def init_app_services(stun_server):
     App.connection_manager = ConnectionManager(stun_server)
     App.telemetry_service = TelemetryService(App.connection_manager)
     App.auth_service = Auth(os.path.join(AppConfig.root_path, "auth.json"))
+    App.loop_lag_monitor = LoopLagMonitor(block_threshold_ms=AppConfig.loop_block_threshold_ms)
+    App.recording_store = RecordingStore(AppConfig.segments_directory(),
+                                         max_bytes_per_camera=AppConfig.recording_budget_mb * 1024 * 1024)
 
 
 def photo_index_page(request):
@@ -332,9 +505,6 @@ def init_web_app():
     else:
         logging.info("CUDA is not available 🐌🐌🐌")
 
-    loop = asyncio.get_event_loop()
-    loop.set_debug(True)
-
     app = web.Application()
     aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(os.path.join(AppConfig.root_path, "html-files/templates")))
 
@@ -350,6 +520,8 @@ def init_web_app():
     app.router.add_get("/image-files", photo_index_page)
 
     app.router.add_static(prefix="/files/images", path=os.path.join(AppConfig.root_path, "records/images"))
+    Path.mkdir(Path(AppConfig.segments_directory()), exist_ok=True, parents=True)
+    app.router.add_static(prefix="/files/segments", path=AppConfig.segments_directory())
 
     app.router.add_get("/image-analyzer", image_analyzer_html)
     app.router.add_post("/image-analyzer-upload", image_analyzer_upload_endpoint)
@@ -358,6 +530,18 @@ def init_web_app():
     app.router.add_get("/api/photo-files", photos_api_endpoint)
 
     app.router.add_get("/api/models", models_api_endpoint)
+    app.router.add_get("/api/detection-statistics", detection_statistics_api_endpoint)
+    app.router.add_get("/api/loop-lag", loop_lag_api_endpoint)
+    app.router.add_get("/metrics", metrics_endpoint)
+    app.router.add_get("/api/frame-trace-statistics", frame_trace_statistics_api_endpoint)
+    app.router.add_get("/api/frame-traces", frame_traces_api_endpoint)
+    app.router.add_get("/api/relay-statistics", relay_statistics_api_endpoint)
+    app.router.add_get("/api/telemetry", telemetry_api_endpoint)
+    app.router.add_get("/api/rtc-stats", rtc_stats_api_endpoint)
+    app.router.add_get("/api/decoder-statistics", decoder_statistics_api_endpoint)
+    app.router.add_get("/api/encoder-statistics", encoder_statistics_api_endpoint)
+    app.router.add_get("/api/recordings", recordings_api_endpoint)
+    app.router.add_get("/api/recordings/{camera_id}", recording_segments_api_endpoint)
 
     app.router.add_post("/offer", offer_producer)
     app.router.add_post("/viewonly", offer_consumer)
@@ -367,6 +551,8 @@ def init_web_app():
 
 async def on_startup(app):
     asyncio.create_task(App.telemetry_service.start())
+    await App.loop_lag_monitor.start()
+    await App.connection_manager.rtc_stats_collector.start()
 
 
 def check_if_user_mode():
@@ -440,16 +626,121 @@ def main():
     parser.add_argument("--username", help="Username", type=str)
     parser.add_argument("--password", help="password", type=str)
     parser.add_argument("--stun-server", help="STUN Server", type=str, default="stun:stun.l.google.com:19302")
+    parser.add_argument("--composite-detections",
+                        help="Draw the latest detections onto every frame (output at input fps)",
+                        action='store_true')
+    parser.add_argument("--motion-gate-threshold",
+                        help="Skip inference while the scene changes less than this (0-1, e.g. 0.02)",
+                        type=float)
+    parser.add_argument("--track-objects",
+                        help="Track detections between inference runs (implies --composite-detections)",
+                        action='store_true')
+    parser.add_argument("--frame-processing-workers",
+                        help="Threads for per-frame conversion/inference/annotation (0 = run on the event loop)",
+                        type=int, default=AppConfig.frame_processing_workers)
+    parser.add_argument("--cpu-budget",
+                        help="Threads per CPU consumer, e.g. decoder=2,encoder=4,opencv=2,torch=8,"
+                             "encoder_preset=veryfast (see benchmarks/cpu_budget_benchmark.py)",
+                        type=str, default=AppConfig.cpu_budget)
+    parser.add_argument("--production",
+                        help="Run the event loop without asyncio debug mode",
+                        action='store_true')
+    parser.add_argument("--uvloop", help="Use uvloop as event loop (pip install uvloop)", action='store_true')
+    parser.add_argument("--loop-block-threshold-ms",
+                        help="Log the stack of the event loop whenever it is blocked longer than this, 0 disables it",
+                        type=float, default=AppConfig.loop_block_threshold_ms)
+    parser.add_argument("--pipelined-inference",
+                        help="Overlap preprocessing, inference and postprocessing of consecutive frames",
+                        action='store_true')
+    parser.add_argument("--frame-trace-size",
+                        help="Recent frames whose per-stage timestamps are kept for /api/frame-traces, 0 disables it",
+                        type=int, default=AppConfig.frame_trace_size)
+    parser.add_argument("--rtc-stats-history",
+                        help="getStats samples (one per second) kept per peer connection for /api/rtc-stats, "
+                             "0 disables the collector",
+                        type=int, default=AppConfig.rtc_stats_history)
+    parser.add_argument("--relay-queue-size",
+                        help="Frames buffered per relay subscriber before frames are dropped",
+                        type=int, default=AppConfig.relay_queue_size)
+    parser.add_argument("--relay-drop-policy",
+                        help="Frame dropped when a relay subscriber falls behind",
+                        choices=['drop-oldest', 'drop-newest'], default=AppConfig.relay_drop_policy)
+    parser.add_argument("--recording-mode",
+                        help="encode: re-encode both tracks on the event loop; remux: write the camera's packets "
+                             "as received and encode the annotated track in a background thread; segmented: like "
+                             "remux, but as rolling segments within --recording-budget-mb per camera; events: "
+                             "only clips of the camera track around detections of --event-labels",
+                        choices=['encode', 'remux', 'segmented', 'events'], default=AppConfig.recording_mode)
+    parser.add_argument("--event-labels", help="Comma separated labels that trigger an event clip",
+                        type=str, default=",".join(AppConfig.event_labels))
+    parser.add_argument("--event-pre-roll-seconds", help="Video kept before the first detection of a clip",
+                        type=float, default=AppConfig.event_pre_roll_seconds)
+    parser.add_argument("--event-post-roll-seconds", help="Video kept after the last detection of a clip",
+                        type=float, default=AppConfig.event_post_roll_seconds)
+    parser.add_argument("--segment-seconds", help="Length of a recording segment",
+                        type=float, default=AppConfig.segment_seconds)
+    parser.add_argument("--recording-budget-mb", help="Disk space for the segments of one camera",
+                        type=int, default=AppConfig.recording_budget_mb)
+    parser.add_argument("--recording-container", help="Container of remuxed recordings",
+                        choices=['mp4', 'mkv'], default=AppConfig.recording_container)
+    parser.add_argument("--recorder-queue-size",
+                        help="Frames waiting for the background recording encoder before frames are dropped",
+                        type=int, default=AppConfig.recorder_queue_size)
+    parser.add_argument("--decode-skipping",
+                        help="Skip decoding non-reference, then non-key camera frames while the server is overloaded "
+                             "(needs the NVIDIA H.264 codec, see enable-h264-nvidia-cuda-support.sh)",
+                        action='store_true')
+    parser.add_argument("--passthrough",
+                        help="Forward the camera's H.264 packets to viewers asking for a second video track",
+                        action='store_true')
+    parser.add_argument("--shared-encoder",
+                        help="Encode the annotated stream once and send the same packets to every viewer",
+                        action='store_true')
+    parser.add_argument("--renditions",
+                        help="Resolution ladder of the shared encoder as height:max kbps, e.g. "
+                             "1080:3000,540:1200,270:400; viewers get a rendition by their bandwidth estimate",
+                        type=str, default=AppConfig.renditions)
 
     global args
     args = parser.parse_args()
-
+    AppConfig.composite_detections = args.composite_detections
+    AppConfig.motion_gate_threshold = args.motion_gate_threshold
+    AppConfig.track_objects = args.track_objects
+    AppConfig.frame_processing_workers = args.frame_processing_workers
+    AppConfig.pipelined_inference = args.pipelined_inference
+    AppConfig.production = args.production
+    AppConfig.uvloop = args.uvloop
+    AppConfig.loop_block_threshold_ms = args.loop_block_threshold_ms
+    AppConfig.cpu_budget = args.cpu_budget
+    AppConfig.frame_trace_size = args.frame_trace_size
+    FRAME_TRACER.set_capacity(AppConfig.frame_trace_size)
+    AppConfig.rtc_stats_history = args.rtc_stats_history
+    AppConfig.relay_queue_size = args.relay_queue_size
+    AppConfig.relay_drop_policy = args.relay_drop_policy
+    AppConfig.decode_skipping = args.decode_skipping
+    # A ladder is only served by the shared encoder
+    AppConfig.shared_encoder = args.shared_encoder or bool(args.renditions)
+    AppConfig.renditions = args.renditions
+    AppConfig.passthrough = args.passthrough
+    AppConfig.recording_mode = args.recording_mode
+    AppConfig.recording_container = args.recording_container
+    AppConfig.recorder_queue_size = args.recorder_queue_size
+    AppConfig.segment_seconds = args.segment_seconds
+    AppConfig.recording_budget_mb = args.recording_budget_mb
+    AppConfig.event_labels = [label.strip() for label in args.event_labels.split(",") if label.strip()]
+    AppConfig.event_pre_roll_seconds = args.event_pre_roll_seconds
+    AppConfig.event_post_roll_seconds = args.event_post_roll_seconds
+
+    # Before the models are loaded, a model's own intra_op_threads wins over the torch budget
+    CpuBudget.from_spec(AppConfig.cpu_budget).apply()
     init_app_services(args.stun_server)
     logging.info(f"Using STUN SERVER: {args.stun_server}")
     check_if_user_mode()
 
     # AppConfig.damage_detection_model_file = args.damage_model_file
     init_detection_module()
+    # Created here and handed to run_app, which would otherwise run the app on a loop of its own
+    loop = create_event_loop()
     app = init_web_app()
 
     if args.verbose:
@@ -466,7 +757,7 @@ def main():
     app.on_startup.append(on_startup)
 
     web.run_app(
-        app, access_log=None, host=args.host, port=args.port, ssl_context=ssl_context
+        app, access_log=None, host=args.host, port=args.port, ssl_context=ssl_context, loop=loop
     )
 
 
@@ -2,14 +2,21 @@ import asyncio
 import json
 import logging
 import uuid
+from functools import partial
 from typing import Literal
 
 from aiohttp import web
-from aiortc import RTCPeerConnection, RTCConfiguration, RTCIceServer, RTCDataChannel, RTCRtpSender
-from aiortc.contrib.media import MediaRelay
+from aiortc import RTCPeerConnection, RTCConfiguration, RTCIceServer, RTCDataChannel, RTCRtpSender, MediaStreamTrack
+from aiortc.codecs.h264 import H264Decoder
 from memory_profiler import memory_usage
 
+from config.app_config import AppConfig
 from services.custom_rtc_peer_connection import CustomRTCPeerConnection
+from services.metrics import REGISTRY
+from services.rtc_stats_collector import RtcStatsCollector
+from video.bounded_media_relay import BoundedMediaRelay
+from video.passthrough_track import EncodedStreamTap, PassthroughTrack
+from video.shared_video_encoder import FanOutTrack, Rendition, SharedVideoEncoder
 
 
 class ConnectionManager:
@@ -20,7 +27,15 @@ class ConnectionManager:
         self.__stun_server = stun_server
         self.__peer_connections_producer = list[CustomRTCPeerConnection]()
         self.__peer_connections_consumer = list[CustomRTCPeerConnection]()
-        self.media_relay: MediaRelay = MediaRelay()
+        self.media_relay = BoundedMediaRelay(max_queue_size=AppConfig.relay_queue_size,
+                                             drop_policy=AppConfig.relay_drop_policy)
+        self.__shared_encoders = dict[MediaStreamTrack, SharedVideoEncoder]()
+        self.rtc_stats_collector = RtcStatsCollector(self.get_all_connections, history_size=AppConfig.rtc_stats_history)
+        # Only the NVIDIA copy of aiortc's H.264 codec skips frames under load
+        if hasattr(H264Decoder, 'skipping_enabled'):
+            H264Decoder.skipping_enabled = AppConfig.decode_skipping
+            H264Decoder.downstream_load = lambda: self.media_relay.load
+        self.__register_metrics()
 
     def get_consumer_peer_connections(self):
         return self.__peer_connections_consumer
@@ -40,9 +55,69 @@ class ConnectionManager:
             self.__peer_connections_consumer.remove(peer_connection)
         elif peer_connection.connection_type == "producer":
             self.__peer_connections_producer.remove(peer_connection)
+        # Senders do not stop their tracks, a forgotten fan-out track would keep receiving encoded frames
+        for sender in peer_connection.getSenders():
+            if isinstance(sender.track, (FanOutTrack, PassthroughTrack)):
+                sender.track.stop()
+        self.rtc_stats_collector.forget(peer_connection.id)
         self.__print_connections_info()
 
+    def add_shared_encoder_track(self, peer_connection: CustomRTCPeerConnection,
+                                 track: MediaStreamTrack) -> RTCRtpSender:
+        """Sends `track` to a consumer through the track's shared encoder, so it is encoded once for all consumers."""
+        shared_encoder = self.__shared_encoders.get(track)
+        if shared_encoder is None:
+            name = getattr(track, 'name', track.kind)
+            source = self.media_relay.subscribe(track, buffered=False, name=f"shared-encoder-{name}",
+                                                stream_id=peer_connection.source_connection_id)
+            shared_encoder = SharedVideoEncoder(source, name=name, renditions=Rendition.parse_ladder(AppConfig.renditions),
+                                                on_closed=partial(self.__on_shared_encoder_closed, track))
+            self.__shared_encoders[track] = shared_encoder
+
+        fan_out_track = shared_encoder.subscribe(name=peer_connection.id)
+        sender = peer_connection.addTrack(fan_out_track)
+        shared_encoder.attach(sender, fan_out_track)
+        return sender
+
+    @staticmethod
+    def add_passthrough_track(peer_connection: CustomRTCPeerConnection, tap: EncodedStreamTap) -> RTCRtpSender:
+        """Sends the packets of `tap` to a consumer as received, keyframe requests go to the producer."""
+        passthrough_track = tap.subscribe(name=peer_connection.id)
+        sender = peer_connection.addTrack(passthrough_track)
+        tap.attach(sender, passthrough_track)
+        return sender
+
+    @staticmethod
+    def get_decoder_statistics() -> list[dict]:
+        return H264Decoder.get_all_statistics() if hasattr(H264Decoder, 'get_all_statistics') else []
+
+    def __register_metrics(self):
+        REGISTRY.callback("active_producers", "Connected camera peer connections",
+                          lambda: len(self.__peer_connections_producer))
+        REGISTRY.callback("active_consumers", "Connected viewer peer connections",
+                          lambda: len(self.__peer_connections_consumer))
+        REGISTRY.callback("relay_dropped_frames_total", "Frames dropped because a relay subscriber fell behind",
+                          self.__relay_dropped_frames, ("subscriber",), metric_type="counter")
+        REGISTRY.callback("decoder_skipped_frames_total", "Frames not decoded because of overload",
+                          lambda: sum(decoder["skippedFrames"] for decoder in self.get_decoder_statistics()),
+                          metric_type="counter")
+
+    def __relay_dropped_frames(self) -> dict[tuple, int]:
+        dropped = dict[tuple, int]()
+        for subscriber in self.media_relay.get_statistics():
+            key = (subscriber["name"],)
+            dropped[key] = dropped.get(key, 0) + subscriber["dropped"]
+        return dropped
+
+    def get_shared_encoder_statistics(self) -> list[dict]:
+        return [shared_encoder.get_statistics() for shared_encoder in self.__shared_encoders.values()]
+
+    def __on_shared_encoder_closed(self, track: MediaStreamTrack, shared_encoder: SharedVideoEncoder):
+        if self.__shared_encoders.get(track) is shared_encoder:
+            del self.__shared_encoders[track]
+
     async def shutdown(self):
+        self.rtc_stats_collector.shutdown()
         all_connections = self.__peer_connections_consumer + self.__peer_connections_producer
         await asyncio.gather(*[peer_connection.close() for peer_connection in all_connections])
         self.__peer_connections_producer.clear()
@@ -16,6 +16,10 @@ class CustomRTCPeerConnection(RTCPeerConnection):
         self.subscriptions = list()
         self.data_channels = dict[str, RTCDataChannel]()
         self.rtt_ms: int | None = None
+        # Consumer only: id of the producer connection whose stream this consumer watches
+        self.source_connection_id: str | None = None
+        # Producer only: forwards the received H.264 packets without decoding (passthrough mode)
+        self.encoded_stream_tap = None
 
         self.createDataChannel('telemetry')
 
@@ -46,20 +50,24 @@ class CustomRTCPeerConnection(RTCPeerConnection):
             elapsed_ms = self.__current_timestamp_millis() - message.payload["timestamp"]
             self.rtt_ms = elapsed_ms
 
-    async def send_statistics(self, rtt_producer, fps_decoding, fps_detection, detection_time):
-        payload = {
-            'type': 'telemetry',
-            'rttProducer': rtt_producer,
-            'rttConsumer': self.rtt_ms,
-            'fpsDecoding': fps_decoding,
-            'fpsDetection': fps_detection,
-            'detectionTime': detection_time
-        }
-        self.__send_on_telemetry_channel(Message(payload))
+    def send_telemetry(self, stream_telemetry: dict, link_statistics: dict | None = None):
+        """Sends the telemetry of a producer stream, completed with this connection's fields.
+
+        `link_statistics` is the latest getStats sample of this connection.
+        """
+        telemetry_data_channel = self.__open_telemetry_channel()
+        if telemetry_data_channel is not None:
+            telemetry_data_channel.send(Message({**stream_telemetry, 'rttConsumer': self.rtt_ms,
+                                                 'connectionId': self.id, 'link': link_statistics}).to_json())
 
     def __send_on_telemetry_channel(self, message: Message):
-        if 'telemetry' in self.data_channels:
-            telemetry_data_channel = self.data_channels['telemetry']
-            if telemetry_data_channel is not None and telemetry_data_channel.readyState == 'open':
-                message.payload['connectionId'] = self.id
-                telemetry_data_channel.send(message.to_json())
+        telemetry_data_channel = self.__open_telemetry_channel()
+        if telemetry_data_channel is not None:
+            message.payload['connectionId'] = self.id
+            telemetry_data_channel.send(message.to_json())
+
+    def __open_telemetry_channel(self) -> RTCDataChannel | None:
+        telemetry_data_channel = self.data_channels.get('telemetry')
+        if telemetry_data_channel is not None and telemetry_data_channel.readyState == 'open':
+            return telemetry_data_channel
+        return None
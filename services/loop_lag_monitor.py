@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from services.metrics import REGISTRY
+
+
+class LoopLagMonitor:
+    """Measures event-loop scheduling delay: how late a periodic sleep wakes up compared to when it should.
+
+    A late wakeup only shows after the blocking callback returned, so a watchdog thread checks the pending wakeup
+    and logs the stack of the event-loop thread while it is still blocked longer than `block_threshold_ms`.
+    """
+    SAMPLE_INTERVAL_SECONDS = 0.1
+    PRINT_INTERVAL_SECONDS = 10
+    LAG_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500]
+    DEFAULT_BLOCK_THRESHOLD_MS = 100
+
+    def __init__(self, block_threshold_ms: float = DEFAULT_BLOCK_THRESHOLD_MS):
+        self.logger = logging.getLogger(__name__)
+        self.lag_histogram = REGISTRY.histogram("event_loop_lag_ms",
+                                                "How late a periodic sleep on the event loop wakes up",
+                                                LoopLagMonitor.LAG_BUCKETS_MS).labels()
+        self.blocked_counter = REGISTRY.counter("event_loop_blocked_total",
+                                                "Callbacks that blocked the event loop longer than the threshold"
+                                                ).labels()
+        self.block_threshold_ms = block_threshold_ms
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.__window_sum_ms = 0.0
+        self.__window_samples = 0
+        self.__task: asyncio.Task | None = None
+        self.__expected_wakeup = 0.0
+        self.__loop_thread_id: int | None = None
+        self.__watchdog: threading.Thread | None = None
+        self.__watchdog_stopped = threading.Event()
+
+    async def start(self):
+        self.__expected_wakeup = time.perf_counter() + LoopLagMonitor.SAMPLE_INTERVAL_SECONDS
+        self.__task = asyncio.create_task(self.__run(), name="loop-lag-monitor")
+        if self.block_threshold_ms > 0:
+            self.__loop_thread_id = threading.get_ident()
+            self.__watchdog = threading.Thread(target=self.__watch, name="loop-block-watchdog", daemon=True)
+            self.__watchdog.start()
+
+    def shutdown(self):
+        if self.__task:
+            self.__task.cancel()
+        self.__watchdog_stopped.set()
+
+    def get_statistics(self):
+        return {
+            'lastLagMs': self.last_lag_ms,
+            'maxLagMs': self.max_lag_ms,
+            'lagMs': self.lag_histogram.to_dict(),
+            'blockThresholdMs': self.block_threshold_ms,
+            'blockedCount': self.blocked_counter.value,
+        }
+
+    async def __run(self):
+        last_print = time.perf_counter()
+        while True:
+            expected_wakeup = time.perf_counter() + LoopLagMonitor.SAMPLE_INTERVAL_SECONDS
+            self.__expected_wakeup = expected_wakeup
+            await asyncio.sleep(LoopLagMonitor.SAMPLE_INTERVAL_SECONDS)
+            now = time.perf_counter()
+
+            self.last_lag_ms = max(now - expected_wakeup, 0.0) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+            self.lag_histogram.observe(self.last_lag_ms)
+            self.__window_sum_ms += self.last_lag_ms
+            self.__window_samples += 1
+
+            if now - last_print >= LoopLagMonitor.PRINT_INTERVAL_SECONDS:
+                self.logger.info(f"Event loop lag: avg {self.__window_sum_ms / self.__window_samples:.1f} ms, "
+                                 f"max {self.max_lag_ms:.1f} ms (last {LoopLagMonitor.PRINT_INTERVAL_SECONDS} s)")
+                self.__window_sum_ms = 0.0
+                self.__window_samples = 0
+                self.max_lag_ms = 0.0
+                last_print = now
+
+    def __watch(self):
+        """Runs in its own thread; reports every blocking episode once, with the stack at the time of detection."""
+        reported_wakeup = None
+        threshold_seconds = self.block_threshold_ms / 1000
+        while not self.__watchdog_stopped.wait(threshold_seconds / 2):
+            expected_wakeup = self.__expected_wakeup
+            blocked_seconds = time.perf_counter() - expected_wakeup
+            if blocked_seconds <= threshold_seconds or expected_wakeup == reported_wakeup:
+                continue
+            reported_wakeup = expected_wakeup
+            self.blocked_counter.inc()
+            frame = sys._current_frames().get(self.__loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(no frame)\n"
+            self.logger.warning(f"Event loop blocked for {blocked_seconds * 1000:.0f} ms so far "
+                                f"(threshold {self.block_threshold_ms:.0f} ms), loop thread stack:\n{stack}")
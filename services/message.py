@@ -11,3 +11,4 @@ class Message:
 
     def to_json(self):
         return json.dumps(self.payload)
+
@@ -0,0 +1,215 @@
+import bisect
+import threading
+from typing import Callable
+
+
+class _ThreadShards:
+    """Per-thread value cells of one metric.
+
+    Every thread only ever writes its own cells, so recording needs no lock and cannot lose updates; readers
+    sum the cells of all threads. Cells of finished threads are kept, their counts still belong to the total.
+    """
+
+    def __init__(self, size: int):
+        self.__size = size
+        self.__local = threading.local()
+        self.__shards = list[list[float]]()
+
+    def cells(self) -> list[float]:
+        try:
+            return self.__local.cells
+        except AttributeError:
+            cells = [0] * self.__size
+            self.__local.cells = cells
+            self.__shards.append(cells)
+            return cells
+
+    def totals(self) -> list[float]:
+        totals = [0] * self.__size
+        for cells in list(self.__shards):
+            for index, value in enumerate(cells):
+                totals[index] += value
+        return totals
+
+
+class Counter:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__shards = _ThreadShards(1)
+
+    def inc(self, amount: float = 1):
+        self.__shards.cells()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self.__shards.totals()[0]
+
+
+class Histogram:
+    """Cumulative bucket histogram (Prometheus semantics: a value falls into every bucket with le >= value)."""
+
+    def __init__(self, name: str, buckets: list[float]):
+        self.name = name
+        self.buckets = sorted(buckets)
+        # One cell per bucket plus +Inf, then count and sum
+        self.__shards = _ThreadShards(len(self.buckets) + 3)
+
+    def observe(self, value: float):
+        cells = self.__shards.cells()
+        cells[bisect.bisect_left(self.buckets, value)] += 1
+        cells[-2] += 1
+        cells[-1] += value
+
+    @property
+    def bucket_counts(self) -> list[int]:
+        return self.__shards.totals()[:-2]
+
+    @property
+    def count(self) -> int:
+        return self.__shards.totals()[-2]
+
+    @property
+    def sum(self) -> float:
+        return self.__shards.totals()[-1]
+
+    def cumulative_buckets(self) -> list[tuple[float, int]]:
+        totals = self.__shards.totals()
+        cumulative = 0
+        buckets = []
+        for bound, bucket_count in zip(self.buckets + [float("inf")], totals[:-2]):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        return buckets
+
+    def to_dict(self):
+        totals = self.__shards.totals()
+        return {
+            'name': self.name,
+            'buckets': {_format_bound(bound): count for bound, count in self.cumulative_buckets()},
+            'count': totals[-2],
+            'sum': totals[-1],
+        }
+
+
+class MetricFamily:
+    """A named metric with labels; `labels()` returns the child of one label combination.
+
+    Look the child up once and keep it where it is recorded on a hot path, the lookup is a dict access.
+    """
+
+    def __init__(self, name: str, documentation: str, metric_type: str, label_names: tuple[str, ...],
+                 create_child: Callable[[], Counter | Histogram]):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = label_names
+        self.__create_child = create_child
+        self.__children = dict[tuple[str, ...], Counter | Histogram]()
+
+    def labels(self, *label_values) -> Counter | Histogram:
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {label_values}")
+        key = tuple(str(value) for value in label_values)
+        child = self.__children.get(key)
+        if child is None:
+            child = self.__children.setdefault(key, self.__create_child())
+        return child
+
+    def remove(self, *label_values):
+        self.__children.pop(tuple(str(value) for value in label_values), None)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, child in list(self.__children.items()):
+            labels = list(zip(self.label_names, key))
+            if isinstance(child, Histogram):
+                for bound, count in child.cumulative_buckets():
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_bound(bound))])} "
+                                 f"{count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {child.sum}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {child.count}")
+            else:
+                lines.append(f"{self.name}{_format_labels(labels)} {child.value}")
+        return lines
+
+
+class CallbackMetric:
+    """A gauge or counter whose values are read from existing state when scraped, e.g. relay drop counters.
+
+    `callback` returns the value, or a dict of label values tuple -> value.
+    """
+
+    def __init__(self, name: str, documentation: str, metric_type: str, label_names: tuple[str, ...],
+                 callback: Callable[[], float | dict[tuple, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = label_names
+        self.__callback = callback
+
+    def render(self) -> list[str]:
+        values = self.__callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(list(zip(self.label_names, key)))} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """All metrics of the process, rendered in the Prometheus text format by `/metrics`."""
+
+    def __init__(self):
+        self.__metrics = dict[str, MetricFamily | CallbackMetric]()
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> MetricFamily:
+        return self.__register(MetricFamily(name, documentation, "counter", label_names, lambda: Counter(name)))
+
+    def histogram(self, name: str, documentation: str, buckets: list[float],
+                  label_names: tuple[str, ...] = ()) -> MetricFamily:
+        return self.__register(MetricFamily(name, documentation, "histogram", label_names,
+                                            lambda: Histogram(name, buckets)))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], float | dict[tuple, float]],
+                 label_names: tuple[str, ...] = (), metric_type: str = "gauge") -> CallbackMetric:
+        # Replaced on re-registration, e.g. when the services are created again
+        metric = CallbackMetric(name, documentation, metric_type, label_names, callback)
+        self.__metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.__metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+    def __register(self, family: MetricFamily) -> MetricFamily:
+        existing = self.__metrics.get(family.name)
+        if isinstance(existing, MetricFamily):
+            return existing
+        self.__metrics[family.name] = family
+        return family
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else str(bound)
+
+
+def _format_labels(labels: list[tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500, 1000, 2500]
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+from typing import Callable
+
+from aiortc import RTCRtpReceiver, RTCRtpSender
+from aiortc.rtp import RTCP_PSFB_PLI, RTCP_RTPFB_NACK, RtcpPsfbPacket, RtcpRtpfbPacket
+
+from services.custom_rtc_peer_connection import CustomRTCPeerConnection
+
+
+class RtcStatsCollector:
+    """Samples `getStats()` of every peer connection and keeps the per-interval deltas as a time series.
+
+    aiortc reports cumulative RTCP-derived counters; a sample holds what changed since the previous one: bitrate,
+    lost packets and loss ratio, jitter, round trip time and the NACK/PLI feedback of each RTP stream. aiortc
+    counts neither NACKs nor PLIs, so senders and receivers are wrapped to count the feedback they send and get.
+    Samples are kept in a bounded deque per connection, the oldest one is dropped first.
+    """
+    SAMPLE_INTERVAL_SECONDS = 1
+    DEFAULT_HISTORY_SIZE = 300
+    # RTP clock rates of WebRTC video and Opus, jitter is reported in RTP timestamp units
+    CLOCK_RATES = {'video': 90_000, 'audio': 48_000}
+
+    def __init__(self, get_connections: Callable[[], list[CustomRTCPeerConnection]],
+                 history_size: int = DEFAULT_HISTORY_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.history_size = history_size
+        self.__get_connections = get_connections
+        self.__history = dict[str, deque[dict]]()
+        # Connection id -> (sample time, stats by id, feedback counts) of the previous sample
+        self.__previous = dict[str, tuple[float, dict, dict]]()
+        # Connection id -> ssrc -> [NACKs, PLIs] sent (remote streams) or received (local streams)
+        self.__feedback = dict[str, dict[int, list[int]]]()
+        self.__instrumented = weakref.WeakSet()
+        self.__task: asyncio.Task | None = None
+
+    async def start(self):
+        if self.history_size > 0:
+            self.__task = asyncio.create_task(self.__run(), name="rtc-stats-collector")
+
+    def shutdown(self):
+        if self.__task:
+            self.__task.cancel()
+
+    def forget(self, connection_id: str):
+        self.__history.pop(connection_id, None)
+        self.__previous.pop(connection_id, None)
+        self.__feedback.pop(connection_id, None)
+
+    def latest(self, connection_id: str) -> dict | None:
+        history = self.__history.get(connection_id)
+        return history[-1] if history else None
+
+    def get_statistics(self, connection_id: str | None = None, limit: int | None = None) -> dict[str, list[dict]]:
+        """Connection id -> samples, oldest first, the newest `limit` of them."""
+        return {id: list(history)[-limit:] if limit else list(history)
+                for id, history in self.__history.items() if connection_id is None or id == connection_id}
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(RtcStatsCollector.SAMPLE_INTERVAL_SECONDS)
+            for connection in self.__get_connections():
+                try:
+                    await self.__sample(connection)
+                except Exception as e:
+                    # Connections are registered before they are negotiated
+                    self.logger.debug(f"Peer Connection: {connection.id} - getStats failed: {e}")
+
+    async def __sample(self, connection: CustomRTCPeerConnection):
+        self.__instrument(connection)
+        report = await connection.getStats()
+        now = time.time()
+        stats = {stat.id: stat for stat in report.values()}
+        previous = self.__previous.get(connection.id)
+        self.__previous[connection.id] = (now, stats, self.__copy_feedback(connection.id))
+        if previous is None:
+            return
+
+        previous_time, previous_stats, previous_feedback = previous
+        elapsed = max(now - previous_time, 1e-6)
+        feedback = self.__feedback.get(connection.id, {})
+        sample = {'time': now, 'inboundKbps': 0.0, 'outboundKbps': 0.0, 'inbound': [], 'outbound': []}
+        remote_inbound = {stat.ssrc: stat for stat in stats.values() if stat.type == 'remote-inbound-rtp'}
+
+        for stat in stats.values():
+            previous_stat = previous_stats.get(stat.id)
+            feedback_delta = self.__feedback_delta(feedback, previous_feedback, stat.ssrc) \
+                if stat.type in ('inbound-rtp', 'outbound-rtp') else None
+            if stat.type == 'transport' and previous_stat is not None:
+                sample['inboundKbps'] = self.__kbps(stat.bytesReceived - previous_stat.bytesReceived, elapsed)
+                sample['outboundKbps'] = self.__kbps(stat.bytesSent - previous_stat.bytesSent, elapsed)
+            elif stat.type == 'inbound-rtp':
+                received = stat.packetsReceived - (previous_stat.packetsReceived if previous_stat else 0)
+                lost = stat.packetsLost - (previous_stat.packetsLost if previous_stat else 0)
+                sample['inbound'].append({
+                    'ssrc': stat.ssrc,
+                    'kind': stat.kind,
+                    'packetsReceived': received,
+                    'packetsLost': lost,
+                    'lossRatio': self.__loss_ratio(lost, received + lost),
+                    'jitterMs': self.__jitter_ms(stat.jitter, stat.kind),
+                    'nackSent': feedback_delta[0],
+                    'pliSent': feedback_delta[1],
+                })
+            elif stat.type == 'outbound-rtp':
+                sent = stat.packetsSent - (previous_stat.packetsSent if previous_stat else 0)
+                remote = remote_inbound.get(stat.ssrc)
+                previous_remote = previous_stats.get(remote.id) if remote is not None else None
+                lost = remote.packetsLost - (previous_remote.packetsLost if previous_remote else 0) \
+                    if remote is not None else 0
+                sample['outbound'].append({
+                    'ssrc': stat.ssrc,
+                    'kind': stat.kind,
+                    'bitrateKbps': self.__kbps(stat.bytesSent - (previous_stat.bytesSent if previous_stat else 0),
+                                               elapsed),
+                    'packetsSent': sent,
+                    'packetsLost': lost,
+                    'lossRatio': self.__loss_ratio(lost, sent),
+                    'jitterMs': self.__jitter_ms(remote.jitter, stat.kind) if remote is not None else None,
+                    'roundTripTimeMs': round(remote.roundTripTime * 1000, 1) if remote is not None else None,
+                    'nackReceived': feedback_delta[0],
+                    'pliReceived': feedback_delta[1],
+                })
+
+        self.__history.setdefault(connection.id, deque(maxlen=self.history_size)).append(sample)
+
+    def __instrument(self, connection: CustomRTCPeerConnection):
+        """Transceivers are added while a connection is negotiated, new senders and receivers are wrapped once."""
+        feedback = self.__feedback.setdefault(connection.id, {})
+        for transceiver in connection.getTransceivers():
+            for endpoint in (transceiver.sender, transceiver.receiver):
+                if endpoint in self.__instrumented:
+                    continue
+                self.__instrumented.add(endpoint)
+                if isinstance(endpoint, RTCRtpSender):
+                    self.__instrument_sender(endpoint, feedback)
+                elif isinstance(endpoint, RTCRtpReceiver):
+                    self.__instrument_receiver(endpoint, feedback)
+
+    @staticmethod
+    def __instrument_sender(sender: RTCRtpSender, feedback: dict[int, list[int]]):
+        handle_rtcp_packet = sender._handle_rtcp_packet
+
+        async def counting_handle_rtcp_packet(packet):
+            if isinstance(packet, RtcpRtpfbPacket) and packet.fmt == RTCP_RTPFB_NACK:
+                feedback.setdefault(sender._ssrc, [0, 0])[0] += 1
+            elif isinstance(packet, RtcpPsfbPacket) and packet.fmt == RTCP_PSFB_PLI:
+                feedback.setdefault(sender._ssrc, [0, 0])[1] += 1
+            await handle_rtcp_packet(packet)
+        sender._handle_rtcp_packet = counting_handle_rtcp_packet
+
+    @staticmethod
+    def __instrument_receiver(receiver: RTCRtpReceiver, feedback: dict[int, list[int]]):
+        send_rtcp_nack = receiver._send_rtcp_nack
+        send_rtcp_pli = receiver._send_rtcp_pli
+
+        async def counting_send_rtcp_nack(media_ssrc, lost):
+            feedback.setdefault(media_ssrc, [0, 0])[0] += 1
+            await send_rtcp_nack(media_ssrc, lost)
+
+        async def counting_send_rtcp_pli(media_ssrc):
+            feedback.setdefault(media_ssrc, [0, 0])[1] += 1
+            await send_rtcp_pli(media_ssrc)
+        receiver._send_rtcp_nack = counting_send_rtcp_nack
+        receiver._send_rtcp_pli = counting_send_rtcp_pli
+
+    def __copy_feedback(self, connection_id: str) -> dict[int, list[int]]:
+        return {ssrc: list(counts) for ssrc, counts in self.__feedback.get(connection_id, {}).items()}
+
+    @staticmethod
+    def __feedback_delta(feedback: dict[int, list[int]], previous_feedback: dict[int, list[int]],
+                         ssrc: int) -> list[int]:
+        current = feedback.get(ssrc, [0, 0])
+        previous = previous_feedback.get(ssrc, [0, 0])
+        return [current[0] - previous[0], current[1] - previous[1]]
+
+    @staticmethod
+    def __kbps(byte_count: int, elapsed: float) -> float:
+        return round(byte_count * 8 / elapsed / 1000, 1)
+
+    @staticmethod
+    def __loss_ratio(lost: int, expected: int) -> float:
+        return round(max(lost, 0) / expected, 4) if expected > 0 else 0.0
+
+    @staticmethod
+    def __jitter_ms(jitter: int, kind: str) -> float:
+        return round(jitter * 1000 / RtcStatsCollector.CLOCK_RATES.get(kind, 90_000), 2)
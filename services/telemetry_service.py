@@ -5,18 +5,23 @@ import logging
 from memory_profiler import memory_usage
 
 from services.connection_manager import ConnectionManager
+from services.custom_rtc_peer_connection import CustomRTCPeerConnection
 from video.video_track_with_telemetry import VideoTrackWithTelemetry
 from video.video_transform_track import VideoTransformTrack
 
 
 class TelemetryService:
+    """Sends every connection the telemetry of the producer stream it belongs to, once per second.
+
+    Each producer's telemetry is built once per tick; producers get their own, consumers the one of the producer
+    they watch, with their own fields (RTT and getStats link sample) added per connection.
+    """
+
     def __init__(self, connection_manager: ConnectionManager):
         self.logger = logging.getLogger(__name__)
         self.__connection_manager = connection_manager
-        self.rtt_camera = 0
-        self.fps_decoded = 0
-        self.fps_detection = 0
-        self.detection_time = 0
+        # Producer connection id -> latest telemetry payload
+        self.stream_telemetry = dict[str, dict]()
         self.send_telemetry_task: asyncio.Task | None = None
 
     async def start(self):
@@ -26,37 +31,59 @@ class TelemetryService:
         if self.send_telemetry_task:
             self.send_telemetry_task.cancel()
 
+    def get_statistics(self) -> list[dict]:
+        return list(self.stream_telemetry.values())
+
     async def __send_statistics(self):
         count = 0
         while True:
             count += 1
-            producer_connection = self.__connection_manager.get_primary_producer_connection()
-            if producer_connection is not None:
-                self.rtt_camera = producer_connection.rtt_ms
+            connections = self.__connection_manager.get_all_connections()
 
+            rtc_stats_collector = self.__connection_manager.rtc_stats_collector
+            self.stream_telemetry = {
+                connection.id: self.__build_stream_telemetry(
+                    connection, self.__connection_manager.media_relay.get_statistics(stream_id=connection.id),
+                    rtc_stats_collector.latest(connection.id))
+                for connection in connections if connection.connection_type == 'producer'
+            }
             coros = []
-            for connection in self.__connection_manager.get_all_connections():
-
-                # Update statistics
-                if connection.connection_type == 'producer':
-                    for subscription in connection.subscriptions:
-                        if isinstance(subscription, VideoTrackWithTelemetry):
-                            self.fps_decoded = subscription.fps_decoded
-                        if isinstance(subscription, VideoTransformTrack):
-                            self.detection_time = subscription.detection_time
-
-                # Send statistics
-                coros.append(
-                    asyncio.create_task(
-                        connection.send_statistics(self.rtt_camera,
-                                                   self.fps_decoded,
-                                                   self.fps_decoded,
-                                                   self.detection_time)
-                    )
-                )
+            for connection in connections:
+                stream_id = connection.id if connection.connection_type == 'producer' \
+                    else connection.source_connection_id
+                if stream_id in self.stream_telemetry:
+                    connection.send_telemetry(self.stream_telemetry[stream_id],
+                                              rtc_stats_collector.latest(connection.id))
                 coros.append(asyncio.create_task(connection.send_rtt_packet()))
 
             await asyncio.gather(*coros)
             if count % 100 == 0:
                 gc.collect()
             await asyncio.sleep(1)
+
+    @staticmethod
+    def __build_stream_telemetry(producer_connection: CustomRTCPeerConnection, relay_subscribers: list[dict],
+                                 producer_link: dict | None) -> dict:
+        decoding_track = None
+        transform_track = None
+        for subscription in producer_connection.subscriptions:
+            if isinstance(subscription, VideoTransformTrack):
+                transform_track = subscription
+            elif isinstance(subscription, VideoTrackWithTelemetry):
+                decoding_track = subscription
+        # The transform track skips frames while busy, the decoding rate is the one of the track reading every frame
+        decoding_track = decoding_track or transform_track
+
+        return {
+            'type': 'telemetry',
+            'producerId': producer_connection.id,
+            'rttProducer': producer_connection.rtt_ms,
+            'fpsDecoding': decoding_track.fps_decoded if decoding_track else 0,
+            'fpsDetection': transform_track.fps_detection if transform_track else 0,
+            'detectionTime': transform_track.detection_time if transform_track else 0,
+            'inferenceExecuted': transform_track.inference_executed_count if transform_track else 0,
+            'inferenceSkipped': transform_track.inference_skipped_count if transform_track else 0,
+            'relaySubscribers': relay_subscribers,
+            # The camera's uplink, so viewers can relate the stream's latency to its link quality
+            'producerLink': producer_link,
+        }
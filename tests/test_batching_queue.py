@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import unittest
+
+from video.batching_queue import BatchingQueue
+
+
+class BatchingQueueTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.batches = []
+
+    def predict_batch(self, images):
+        self.batches.append(list(images))
+        return [image * 10 for image in images]
+
+    async def test_concurrent_requests_share_one_batch(self):
+        queue = BatchingQueue("test-shared-batch", self.predict_batch, max_batch_size=8, window_ms=50)
+
+        results = await asyncio.gather(*(queue.submit(image) for image in range(5)))
+
+        self.assertEqual(results, [0, 10, 20, 30, 40])
+        self.assertEqual(self.batches, [[0, 1, 2, 3, 4]])
+        queue.shutdown()
+
+    async def test_full_batch_is_dispatched_before_the_window_ends(self):
+        queue = BatchingQueue("test-full-batch", self.predict_batch, max_batch_size=2, window_ms=10_000)
+
+        results = await asyncio.wait_for(asyncio.gather(*(queue.submit(image) for image in range(4))), 5)
+
+        self.assertEqual(results, [0, 10, 20, 30])
+        self.assertEqual(self.batches, [[0, 1], [2, 3]])
+        statistics = queue.get_statistics()
+        self.assertEqual(statistics['batchSize']['count'], 2)
+        self.assertEqual(statistics['batchSize']['sum'], 4)
+        queue.shutdown()
+
+    async def test_failed_predict_fails_every_request_of_the_batch(self):
+        failures = [ValueError("model failed")]
+
+        def failing_once_predict(images):
+            if failures:
+                raise failures.pop()
+            return self.predict_batch(images)
+
+        queue = BatchingQueue("test-failed-batch", failing_once_predict, max_batch_size=4, window_ms=20)
+
+        results = await asyncio.gather(queue.submit(1), queue.submit(2), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        # The worker survives the failure
+        self.assertEqual(await queue.submit(3), 30)
+        queue.shutdown()
+
+    async def test_shutdown_fails_waiting_requests(self):
+        release = threading.Event()
+
+        def blocking_predict(images):
+            release.wait(5)
+            return images
+
+        queue = BatchingQueue("test-shutdown", blocking_predict, max_batch_size=1, window_ms=0)
+        first = asyncio.ensure_future(queue.submit(1))
+        await asyncio.sleep(0.05)
+        # Still queued behind the running batch
+        second = asyncio.ensure_future(queue.submit(2))
+        await asyncio.sleep(0)
+
+        queue.shutdown()
+        release.set()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        with self.assertRaises(RuntimeError):
+            await second
+
+    async def test_submit_threadsafe_joins_the_batch_on_the_loop(self):
+        queue = BatchingQueue("test-threadsafe", self.predict_batch, max_batch_size=8, window_ms=50)
+        loop = asyncio.get_running_loop()
+
+        results = await asyncio.gather(*(loop.run_in_executor(None, queue.submit_threadsafe, image, loop)
+                                         for image in range(3)))
+
+        self.assertEqual(sorted(results), [0, 10, 20])
+        self.assertEqual(sum(len(batch) for batch in self.batches), 3)
+        queue.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from video.bounded_media_relay import BoundedMediaRelay
+
+
+class ListTrack(MediaStreamTrack):
+    """Source that returns the given frames and then ends."""
+    kind = "video"
+
+    def __init__(self, frames):
+        super().__init__()
+        self.frames = list(frames)
+
+    async def recv(self):
+        await asyncio.sleep(0)
+        if not self.frames:
+            raise MediaStreamError
+        return self.frames.pop(0)
+
+
+class BoundedMediaRelayTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_drop_oldest_keeps_the_latest_frames(self):
+        relay = BoundedMediaRelay()
+        proxy = relay.subscribe(ListTrack([]), max_queue_size=3, drop_policy='drop-oldest')
+
+        for frame in range(5):
+            proxy.push(frame)
+
+        self.assertEqual([await proxy.recv() for _ in range(3)], [2, 3, 4])
+        self.assertEqual(proxy.dropped_count, 2)
+
+    async def test_drop_newest_keeps_the_buffered_frames(self):
+        relay = BoundedMediaRelay()
+        proxy = relay.subscribe(ListTrack([]), max_queue_size=3, drop_policy='drop-newest')
+
+        for frame in range(5):
+            proxy.push(frame)
+
+        self.assertEqual([await proxy.recv() for _ in range(3)], [0, 1, 2])
+        self.assertEqual(proxy.dropped_count, 2)
+
+    async def test_unbuffered_subscriber_only_sees_the_latest_frame(self):
+        relay = BoundedMediaRelay()
+        proxy = relay.subscribe(ListTrack([]), buffered=False, drop_policy='drop-newest')
+
+        for frame in range(5):
+            proxy.push(frame)
+
+        self.assertEqual(await proxy.recv(), 4)
+        self.assertEqual(proxy.queue_depth, 0)
+        self.assertEqual(proxy.dropped_count, 0)
+
+    async def test_end_of_source_is_delivered_after_a_full_buffer(self):
+        relay = BoundedMediaRelay()
+        proxy = relay.subscribe(ListTrack([]), max_queue_size=2, drop_policy='drop-newest')
+
+        for frame in (0, 1, 2, None):
+            proxy.push(frame)
+
+        self.assertEqual([await proxy.recv() for _ in range(2)], [0, 1])
+        with self.assertRaises(MediaStreamError):
+            await proxy.recv()
+        self.assertEqual(proxy.readyState, "ended")
+
+    def test_unknown_drop_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            BoundedMediaRelay().subscribe(ListTrack([]), drop_policy='drop-all')
+
+    async def test_every_subscriber_receives_the_source_frames(self):
+        relay = BoundedMediaRelay(max_queue_size=10)
+        source = ListTrack(range(5))
+        first = relay.subscribe(source, name="first", stream_id="producer-1")
+        second = relay.subscribe(source, name="second", stream_id="producer-1")
+
+        async def read_all(proxy):
+            frames = []
+            try:
+                while True:
+                    frames.append(await proxy.recv())
+            except MediaStreamError:
+                return frames
+
+        results = await asyncio.wait_for(asyncio.gather(read_all(first), read_all(second)), 5)
+
+        self.assertEqual(results, [[0, 1, 2, 3, 4], [0, 1, 2, 3, 4]])
+
+    def test_statistics_are_filtered_by_stream(self):
+        relay = BoundedMediaRelay()
+        relay.subscribe(ListTrack([]), name="recorder", stream_id="producer-1")
+        relay.subscribe(ListTrack([]), name="recorder", stream_id="producer-2")
+
+        statistics = relay.get_statistics(stream_id="producer-2")
+
+        self.assertEqual([subscriber["name"] for subscriber in statistics], ["producer-2/recorder"])
+        self.assertEqual(len(relay.get_statistics()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
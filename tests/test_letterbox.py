@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+from av import VideoFrame
+
+from ai.letterbox import LetterboxGeometry, letterbox, letterbox_frame
+
+
+class LetterboxGeometryTest(unittest.TestCase):
+
+    def test_auto_pads_to_the_stride(self):
+        geometry = LetterboxGeometry.compute(720, 1280, 640)
+
+        self.assertEqual(geometry.ratio, 0.5)
+        self.assertEqual((geometry.output_height, geometry.output_width), (384, 640))
+        self.assertEqual((geometry.pad_x, geometry.pad_y), (0, 12))
+
+    def test_fixed_size_pads_to_the_target(self):
+        geometry = LetterboxGeometry.compute(720, 1280, 640, auto=False)
+
+        self.assertEqual((geometry.output_height, geometry.output_width), (640, 640))
+        self.assertEqual((geometry.pad_x, geometry.pad_y), (0, 140))
+
+    def test_rectangular_target(self):
+        geometry = LetterboxGeometry.compute(480, 480, (320, 640), auto=False)
+
+        self.assertAlmostEqual(geometry.ratio, 320 / 480)
+        self.assertEqual((geometry.pad_x, geometry.pad_y), (160, 0))
+
+    def test_boxes_map_back_to_the_original_image(self):
+        height, width = 720, 1280
+        original = np.array([[100, 50, 300, 400], [0, 0, 1280, 720]], dtype=np.float32)
+
+        for auto in (True, False):
+            geometry = LetterboxGeometry.compute(height, width, 640, auto=auto)
+            offset = np.array([geometry.pad_x, geometry.pad_y] * 2, dtype=np.float32)
+            letterboxed = original * geometry.ratio + offset
+
+            np.testing.assert_allclose(geometry.to_original(letterboxed, height, width), original, atol=1e-3)
+
+    def test_boxes_in_the_padding_are_clipped(self):
+        geometry = LetterboxGeometry.compute(720, 1280, 640, auto=False)
+
+        boxes = geometry.to_original(np.array([[-10, 0, 650, 640]], dtype=np.float32), 720, 1280)
+
+        np.testing.assert_allclose(boxes, [[0, 0, 1280, 720]])
+        self.assertEqual(boxes.dtype, np.float32)
+
+
+class LetterboxTest(unittest.TestCase):
+
+    def test_image_content_lands_inside_the_padding(self):
+        img = np.full((720, 1280, 3), 255, dtype=np.uint8)
+
+        padded, geometry = letterbox(img, 640, auto=False)
+
+        self.assertEqual(padded.shape, (640, 640, 3))
+        self.assertTrue((padded[:geometry.pad_y] == 114).all())
+        self.assertTrue((padded[geometry.pad_y:640 - geometry.pad_y] == 255).all())
+        self.assertTrue((padded[640 - geometry.pad_y:] == 114).all())
+
+    def test_frame_matches_the_image_geometry(self):
+        frame = VideoFrame.from_ndarray(np.zeros((360, 640, 3), dtype=np.uint8), format="bgr24")
+
+        padded, geometry = letterbox_frame(frame.reformat(format="yuv420p"), 320)
+
+        self.assertEqual(padded.shape, (geometry.output_height, geometry.output_width, 3))
+        self.assertEqual(vars(geometry), vars(LetterboxGeometry.compute(360, 640, 320)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import unittest
+
+from services.metrics import Histogram, MetricsRegistry
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("latency", [10, 1, 5])
+        for value in (0.5, 1, 3, 7, 20):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.cumulative_buckets(), [(1, 2), (5, 3), (10, 4), (float("inf"), 5)])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 31.5)
+        self.assertEqual(histogram.to_dict()["buckets"], {"1": 2, "5": 3, "10": 4, "+Inf": 5})
+
+    def test_observations_from_threads_are_summed(self):
+        histogram = Histogram("latency", [1])
+
+        threads = [threading.Thread(target=lambda: [histogram.observe(2) for _ in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(histogram.count, 4000)
+        self.assertEqual(histogram.bucket_counts, [0, 4000])
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_counter_rendering(self):
+        registry = MetricsRegistry()
+        frames = registry.counter("frames_total", "Frames received", ("camera",))
+        frames.labels("front").inc()
+        frames.labels("front").inc(2)
+        frames.labels("back").inc()
+
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP frames_total Frames received",
+            "# TYPE frames_total counter",
+            'frames_total{camera="front"} 3',
+            'frames_total{camera="back"} 1',
+        ]) + "\n")
+
+    def test_histogram_rendering(self):
+        registry = MetricsRegistry()
+        registry.histogram("wait_ms", "Queue wait", [1, 10], ("model",)).labels("yolo").observe(5)
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP wait_ms Queue wait",
+            "# TYPE wait_ms histogram",
+            'wait_ms_bucket{model="yolo",le="1"} 0',
+            'wait_ms_bucket{model="yolo",le="10"} 1',
+            'wait_ms_bucket{model="yolo",le="+Inf"} 1',
+            'wait_ms_sum{model="yolo"} 5',
+            'wait_ms_count{model="yolo"} 1',
+        ])
+
+    def test_callback_rendering(self):
+        registry = MetricsRegistry()
+        registry.callback("queue_depth", "Buffered frames", lambda: {("a",): 2, ("b",): 0}, ("subscriber",))
+        registry.callback("uptime_seconds", "Uptime", lambda: 12.5, metric_type="counter")
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP queue_depth Buffered frames",
+            "# TYPE queue_depth gauge",
+            'queue_depth{subscriber="a"} 2',
+            'queue_depth{subscriber="b"} 0',
+            "# HELP uptime_seconds Uptime",
+            "# TYPE uptime_seconds counter",
+            "uptime_seconds 12.5",
+        ])
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("errors_total", "Errors", ("message",)).labels('bad "path"\\\n').inc()
+
+        self.assertIn('errors_total{message="bad \\"path\\"\\\\\\n"} 1', registry.render())
+
+    def test_failing_callback_does_not_break_the_scrape(self):
+        registry = MetricsRegistry()
+        registry.callback("broken", "Broken", lambda: 1 / 0)
+        registry.counter("requests_total", "Requests").labels().inc()
+
+        rendered = registry.render()
+
+        self.assertIn("# broken failed: division by zero", rendered)
+        self.assertIn("requests_total 1", rendered)
+
+    def test_registration_returns_the_existing_family(self):
+        registry = MetricsRegistry()
+        first = registry.counter("frames_total", "Frames", ("camera",))
+
+        self.assertIs(registry.counter("frames_total", "Frames", ("camera",)), first)
+        self.assertIs(first.labels("front"), first.labels("front"))
+        with self.assertRaises(ValueError):
+            first.labels("front", "extra")
+
+    def test_removed_children_are_not_rendered(self):
+        registry = MetricsRegistry()
+        frames = registry.counter("frames_total", "Frames", ("camera",))
+        frames.labels("front").inc()
+        frames.remove("front")
+
+        self.assertNotIn("front", registry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
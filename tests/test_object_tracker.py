@@ -0,0 +1,104 @@
+import unittest
+
+import numpy as np
+
+from ai.box_geometry import iou_matrix
+from video.object_tracker import ObjectTracker
+
+NAMES = {0: "person", 1: "car"}
+
+
+def detections(boxes, labels, scores) -> dict:
+    return {
+        "boxes": np.array(boxes, dtype=np.float32).reshape(-1, 4),
+        "labels": np.array(labels),
+        "scores": np.array(scores, dtype=np.float32),
+        "names": NAMES,
+    }
+
+
+class IouMatrixTest(unittest.TestCase):
+
+    def test_pairwise_iou(self):
+        boxes_a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+        boxes_b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [100, 100, 110, 110]], dtype=np.float32)
+
+        ious = iou_matrix(boxes_a, boxes_b)
+
+        self.assertEqual(ious.shape, (2, 3))
+        np.testing.assert_allclose(ious[0], [1.0, 50 / 150, 0.0], atol=1e-6)
+        np.testing.assert_allclose(ious[1], [0.0, 0.0, 0.0], atol=1e-6)
+
+    def test_empty_input(self):
+        boxes = np.array([[0, 0, 10, 10]], dtype=np.float32)
+
+        self.assertEqual(iou_matrix(np.zeros((0, 4), dtype=np.float32), boxes).shape, (0, 1))
+        self.assertEqual(iou_matrix(boxes, np.zeros((0, 4), dtype=np.float32)).shape, (1, 0))
+
+
+class ObjectTrackerTest(unittest.TestCase):
+
+    def test_moving_object_keeps_its_track_id(self):
+        tracker = ObjectTracker()
+
+        for step in range(5):
+            x = 100 + step * 5
+            tracker.update(detections([[x, 100, x + 50, 200]], [0], [0.9]), step / 10)
+
+        tracked = tracker.predict(0.4)
+        self.assertEqual(tracked["track_ids"].tolist(), [1])
+        self.assertEqual(tracked["names"], NAMES)
+
+    def test_prediction_extrapolates_the_velocity(self):
+        tracker = ObjectTracker()
+        for step in range(10):
+            x = 100 + step * 10
+            tracker.update(detections([[x, 100, x + 50, 200]], [0], [0.9]), step / 10)
+
+        tracked = tracker.predict(1.0)
+
+        # 100 px/s, the last measurement was at x=190 at 0.9 s
+        self.assertAlmostEqual(float(tracked["boxes"][0][0]), 200, delta=3)
+
+    def test_different_classes_are_not_matched(self):
+        tracker = ObjectTracker()
+        tracker.update(detections([[0, 0, 50, 50]], [0], [0.9]), 0.0)
+        tracker.update(detections([[0, 0, 50, 50]], [1], [0.9]), 0.1)
+
+        tracked = tracker.predict(0.1)
+
+        self.assertEqual(sorted(tracked["track_ids"].tolist()), [1, 2])
+
+    def test_low_score_detections_only_keep_tracks_alive(self):
+        tracker = ObjectTracker(high_score_threshold=0.6, max_age_seconds=0.5)
+        tracker.update(detections([[0, 0, 50, 50]], [0], [0.9]), 0.0)
+
+        # Matched low-score detections update the track, unmatched ones never start a new one
+        tracker.update(detections([[0, 0, 50, 50], [300, 300, 350, 350]], [0, 0], [0.3, 0.3]), 0.4)
+        tracker.update(detections([[0, 0, 50, 50]], [0], [0.3]), 0.8)
+
+        tracked = tracker.predict(0.8)
+        self.assertEqual(tracked["track_ids"].tolist(), [1])
+
+    def test_tracks_expire_after_max_age(self):
+        tracker = ObjectTracker(max_age_seconds=0.5)
+        tracker.update(detections([[0, 0, 50, 50]], [0], [0.9]), 0.0)
+
+        self.assertEqual(len(tracker.predict(0.4)["boxes"]), 1)
+        self.assertEqual(len(tracker.predict(0.6)["boxes"]), 0)
+
+        tracker.update(detections([], [], []), 0.6)
+        tracker.update(detections([[0, 0, 50, 50]], [0], [0.9]), 0.7)
+        self.assertEqual(tracker.predict(0.7)["track_ids"].tolist(), [2])
+
+    def test_min_hits_hides_new_tracks(self):
+        tracker = ObjectTracker(min_hits=2)
+        tracker.update(detections([[0, 0, 50, 50]], [0], [0.9]), 0.0)
+        self.assertEqual(len(tracker.predict(0.0)["boxes"]), 0)
+
+        tracker.update(detections([[2, 0, 52, 50]], [0], [0.9]), 0.1)
+        self.assertEqual(tracker.predict(0.1)["track_ids"].tolist(), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+from video.recorders.h264_stream import RTP_TIMESTAMP_MODULO, RtpTimestampUnwrapper
+from video.recorders.segment_index import Segment, SegmentIndex
+
+
+class SegmentIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = self.temporary_directory.name
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def add_segment(self, index: SegmentIndex, start_time: float, end_time: float, size_bytes: int = 100):
+        segment = Segment(f"{start_time:.0f}.mp4", start_time, end_time, size_bytes)
+        with open(index.path(segment), "wb") as file:
+            file.write(b"\0" * size_bytes)
+        index.add(segment)
+        return segment
+
+    def test_find_returns_overlapping_segments_in_order(self):
+        index = SegmentIndex(self.directory)
+        # Added out of order, e.g. a writer finishing late
+        for start_time in (20, 0, 10, 30):
+            self.add_segment(index, start_time, start_time + 10)
+
+        self.assertEqual([segment.start_time for segment in index.find(15, 25)], [10, 20])
+        self.assertEqual([segment.start_time for segment in index.find(0, 5)], [0])
+        self.assertEqual([segment.start_time for segment in index.find(41, 50)], [])
+
+    def test_pop_oldest_updates_the_total(self):
+        index = SegmentIndex(self.directory)
+        self.add_segment(index, 10, 20, size_bytes=50)
+        self.add_segment(index, 0, 10, size_bytes=30)
+
+        self.assertEqual(index.total_bytes, 80)
+        self.assertEqual(index.pop_oldest().start_time, 0)
+        self.assertEqual(index.total_bytes, 50)
+        self.assertEqual(index.get_statistics()["segments"], 1)
+
+    def test_index_is_reloaded_without_deleted_files(self):
+        index = SegmentIndex(self.directory)
+        self.add_segment(index, 0, 10)
+        deleted = self.add_segment(index, 10, 20)
+        self.add_segment(index, 20, 30)
+        os.remove(index.path(deleted))
+
+        reloaded = SegmentIndex(self.directory)
+
+        self.assertEqual([segment.start_time for segment in reloaded.find(0, 30)], [0, 20])
+        self.assertEqual(reloaded.total_bytes, 200)
+
+    def test_unreadable_index_starts_empty(self):
+        with open(os.path.join(self.directory, SegmentIndex.INDEX_FILE_NAME), "w") as file:
+            file.write("{not json")
+
+        index = SegmentIndex(self.directory)
+
+        self.assertEqual(index.get_statistics()["segments"], 0)
+
+
+class RtpTimestampUnwrapperTest(unittest.TestCase):
+
+    def test_ticks_start_at_the_first_timestamp(self):
+        unwrapper = RtpTimestampUnwrapper()
+
+        self.assertEqual([unwrapper.unwrap(timestamp) for timestamp in (1000, 4000, 7000)], [0, 3000, 6000])
+
+    def test_wraparound_keeps_counting_up(self):
+        unwrapper = RtpTimestampUnwrapper()
+        first = RTP_TIMESTAMP_MODULO - 3000
+
+        ticks = [unwrapper.unwrap(timestamp % RTP_TIMESTAMP_MODULO)
+                 for timestamp in range(first, first + 4 * 3000, 3000)]
+
+        self.assertEqual(ticks, [0, 3000, 6000, 9000])
+
+    def test_multiple_wraps(self):
+        unwrapper = RtpTimestampUnwrapper()
+        step = RTP_TIMESTAMP_MODULO // 4
+
+        ticks = [unwrapper.unwrap((step * count) % RTP_TIMESTAMP_MODULO) for count in range(10)]
+
+        self.assertEqual(ticks, [step * count for count in range(10)])
+
+    def test_reordered_timestamp_before_a_wrap(self):
+        unwrapper = RtpTimestampUnwrapper()
+        unwrapper.unwrap(RTP_TIMESTAMP_MODULO - 3000)
+        unwrapper.unwrap(3000)
+
+        # A late packet from before the wrap maps back, not a full modulo ahead
+        self.assertEqual(unwrapper.unwrap(RTP_TIMESTAMP_MODULO - 1000), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import concurrent.futures
+import logging
+import time
+from typing import Any, Callable
+
+from services.metrics import REGISTRY
+
+
+class BatchingQueue:
+    """Collects inference requests from all callers of one model and runs them as a single batched predict.
+
+    A batch is dispatched as soon as `max_batch_size` requests are waiting or `window_ms` has passed since the
+    first request of the batch arrived, whichever comes first.
+    """
+    BATCH_SIZE_BUCKETS = [1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 24, 32]
+    QUEUE_WAIT_BUCKETS_MS = [1, 2, 5, 10, 15, 20, 30, 50, 100, 250, 500, 1000]
+    # How long a caller in a worker thread waits for its result, e.g. while the event loop is shutting down
+    REQUEST_TIMEOUT_SECONDS = 30
+
+    def __init__(self, name: str, predict_batch: Callable[[list], list], max_batch_size: int = 8,
+                 window_ms: float = 15):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_ms = max(0.0, window_ms)
+        self.batch_size_histogram = REGISTRY.histogram(
+            "inference_batch_size", "Requests per batched predict", BatchingQueue.BATCH_SIZE_BUCKETS,
+            ("model",)).labels(name)
+        self.queue_wait_histogram = REGISTRY.histogram(
+            "inference_queue_wait_ms", "Time a request waits for its batch to be dispatched",
+            BatchingQueue.QUEUE_WAIT_BUCKETS_MS, ("model",)).labels(name)
+        self.__predict_batch = predict_batch
+        self.__pending: asyncio.Queue | None = None
+        self.__worker_task: asyncio.Task | None = None
+
+    async def submit(self, image) -> Any:
+        self.__ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.__pending.put_nowait((image, future, time.perf_counter_ns()))
+        return await future
+
+    def submit_threadsafe(self, image, loop: asyncio.AbstractEventLoop) -> Any:
+        """`submit` for callers in worker threads, the request joins the batches collected on `loop`."""
+        future = asyncio.run_coroutine_threadsafe(self.submit(image), loop)
+        try:
+            return future.result(timeout=BatchingQueue.REQUEST_TIMEOUT_SECONDS)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        if self.__worker_task:
+            self.__worker_task.cancel()
+            self.__worker_task = None
+        self.__fail_pending(RuntimeError(f"Batching queue [{self.name}] shut down"))
+
+    def get_statistics(self):
+        return {
+            'maxBatchSize': self.max_batch_size,
+            'windowMs': self.window_ms,
+            'batchSize': self.batch_size_histogram.to_dict(),
+            'queueWaitMs': self.queue_wait_histogram.to_dict(),
+        }
+
+    def __ensure_started(self):
+        # The queue is bound to the running loop, which does not exist yet when models are loaded
+        if self.__worker_task is None or self.__worker_task.done():
+            # Requests left in the queue of a dead worker would never be answered
+            self.__fail_pending(RuntimeError(f"Batching queue [{self.name}] worker stopped"))
+            self.__pending = asyncio.Queue()
+            self.__worker_task = asyncio.create_task(self.__run(), name=f"batching-queue-{self.name}")
+
+    def __fail_pending(self, error: Exception):
+        if self.__pending is None:
+            return
+        while not self.__pending.empty():
+            _, future, _ = self.__pending.get_nowait()
+            if not future.done():
+                future.get_loop().call_soon_threadsafe(BatchingQueue.__set_exception, future, error)
+
+    @staticmethod
+    def __set_exception(future: asyncio.Future, error: Exception):
+        if not future.done():
+            future.set_exception(error)
+
+    async def __collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.__pending.get()]
+        deadline = loop.time() + self.window_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.__pending.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def __run(self):
+        while True:
+            batch = await self.__collect_batch()
+            # Callers that gave up while waiting (e.g. track ended) do not need a prediction
+            batch = [request for request in batch if not request[1].done()]
+            if len(batch) == 0:
+                continue
+
+            dispatched_ns = time.perf_counter_ns()
+            for _, _, enqueued_ns in batch:
+                self.queue_wait_histogram.observe((dispatched_ns - enqueued_ns) / 1_000_000)
+            self.batch_size_histogram.observe(len(batch))
+
+            try:
+                results = await asyncio.to_thread(self.__predict_batch, [image for image, _, _ in batch])
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.logger.error(f"Batched prediction [{self.name}] failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
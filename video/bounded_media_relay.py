@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Literal
+
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+DropPolicy = Literal['drop-oldest', 'drop-newest']
+
+
+class BoundedRelayStreamTrack(MediaStreamTrack):
+    """Subscriber of a `BoundedMediaRelay`.
+
+    Buffered subscribers hold at most `max_queue_size` frames; when a slow consumer lets the buffer fill up,
+    either the oldest buffered frame ('drop-oldest', keeps latency low) or the incoming frame ('drop-newest',
+    keeps the buffered sequence intact) is dropped and counted. Unbuffered subscribers only see the latest frame.
+    """
+    DROP_POLICIES = ('drop-oldest', 'drop-newest')
+
+    def __init__(self, relay: 'BoundedMediaRelay', source: MediaStreamTrack, name: str, buffered: bool,
+                 max_queue_size: int, drop_policy: DropPolicy, stream_id: str | None = None):
+        super().__init__()
+        if drop_policy not in BoundedRelayStreamTrack.DROP_POLICIES:
+            raise ValueError(f"Unsupported drop policy [{drop_policy}], "
+                             f"use one of {BoundedRelayStreamTrack.DROP_POLICIES}")
+        self.kind = source.kind
+        self.name = name
+        self.stream_id = stream_id
+        self.buffered = buffered
+        self.max_queue_size = max_queue_size if buffered else 1
+        self.drop_policy = drop_policy if buffered else 'drop-oldest'
+        self.dropped_count = 0
+        self.__relay = relay
+        self.__source = source
+        self.__frames = deque()
+        self.__frame_available = asyncio.Event()
+
+    @property
+    def source(self) -> MediaStreamTrack | None:
+        return self.__source
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.__frames)
+
+    def push(self, frame):
+        """Called by the relay for every source frame, None signals the end of the source."""
+        if frame is not None and len(self.__frames) >= self.max_queue_size:
+            # Unbuffered subscribers only ever want the latest frame, replacing it is not a drop
+            if self.buffered:
+                self.dropped_count += 1
+            if self.drop_policy == 'drop-newest':
+                return
+            self.__frames.popleft()
+        self.__frames.append(frame)
+        self.__frame_available.set()
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        self.__relay.start(self)
+        while not self.__frames:
+            self.__frame_available.clear()
+            await self.__frame_available.wait()
+        frame = self.__frames.popleft()
+
+        if frame is None:
+            self.stop()
+            raise MediaStreamError
+        return frame
+
+    def stop(self):
+        super().stop()
+        if self.__relay is not None:
+            self.__relay.stop(self)
+            self.__relay = None
+            self.__source = None
+            self.__frames.clear()
+
+    def get_statistics(self) -> dict:
+        return {
+            "name": self.name,
+            "streamId": self.stream_id,
+            "buffered": self.buffered,
+            "dropPolicy": self.drop_policy,
+            "maxQueueSize": self.max_queue_size,
+            "queueDepth": self.queue_depth,
+            "dropped": self.dropped_count,
+        }
+
+
+class BoundedMediaRelay:
+    """Drop-in replacement for aiortc's `MediaRelay` whose subscriber buffers are bounded.
+
+    aiortc backs buffered subscribers with an unbounded queue, so a stalled recorder or transform track keeps
+    every decoded frame alive. Here each subscriber is a ring buffer with its own drop policy and drop counter.
+    """
+    DEFAULT_MAX_QUEUE_SIZE = 4
+    DEFAULT_DROP_POLICY: DropPolicy = 'drop-oldest'
+
+    def __init__(self, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE, drop_policy: DropPolicy = DEFAULT_DROP_POLICY):
+        self.logger = logging.getLogger(__name__)
+        self.max_queue_size = max_queue_size
+        self.drop_policy = drop_policy
+        self.__proxies = dict[MediaStreamTrack, set[BoundedRelayStreamTrack]]()
+        self.__tasks = dict[MediaStreamTrack, asyncio.Task]()
+        # Kept after a subscriber stopped, so its drops still show up in the statistics
+        self.__subscribers = list[BoundedRelayStreamTrack]()
+        self.__loads = dict[MediaStreamTrack, float]()
+        self.__load = 0.0
+
+    @property
+    def load(self) -> float:
+        """Fill ratio (0..1) of the fullest buffered subscriber after the last frame, safe to read from any thread."""
+        return self.__load
+
+    def subscribe(self, track: MediaStreamTrack, buffered: bool = True, name: str | None = None,
+                  max_queue_size: int | None = None, drop_policy: DropPolicy | None = None,
+                  stream_id: str | None = None) -> BoundedRelayStreamTrack:
+        """`stream_id`: the producer connection the frames come from, prefixes the name of the subscriber."""
+        name = name or f"{getattr(track, 'name', track.kind)}-{len(self.__subscribers)}"
+        proxy = BoundedRelayStreamTrack(self, track,
+                                        name=f"{stream_id}/{name}" if stream_id is not None else name,
+                                        buffered=buffered,
+                                        max_queue_size=max_queue_size or self.max_queue_size,
+                                        drop_policy=drop_policy or self.drop_policy,
+                                        stream_id=stream_id)
+        self.__proxies.setdefault(track, set())
+        self.__subscribers.append(proxy)
+        return proxy
+
+    def start(self, proxy: BoundedRelayStreamTrack):
+        track = proxy.source
+        if track is None or track not in self.__proxies:
+            return
+        self.__proxies[track].add(proxy)
+        if track not in self.__tasks:
+            self.__tasks[track] = asyncio.create_task(self.__run_track(track), name=f"relay-{id(track)}")
+
+    def stop(self, proxy: BoundedRelayStreamTrack):
+        track = proxy.source
+        if track is not None and track in self.__proxies:
+            self.__proxies[track].discard(proxy)
+
+    def get_statistics(self, stream_id: str | None = None) -> list[dict]:
+        """All subscribers, or only those of the producer stream `stream_id`."""
+        self.__subscribers = [proxy for proxy in self.__subscribers
+                              if proxy.readyState == "live" or proxy.dropped_count > 0]
+        return [proxy.get_statistics() for proxy in self.__subscribers
+                if stream_id is None or proxy.stream_id == stream_id]
+
+    async def __run_track(self, track: MediaStreamTrack):
+        self.logger.info(f"Start reading source {id(track)}")
+        while True:
+            try:
+                frame = await track.recv()
+            except MediaStreamError:
+                frame = None
+            for proxy in self.__proxies[track]:
+                proxy.push(frame)
+            if frame is None:
+                break
+            self.__update_load(track)
+        self.logger.info(f"Stop reading source {id(track)}")
+        del self.__proxies[track]
+        del self.__tasks[track]
+        self.__loads.pop(track, None)
+        self.__load = max(self.__loads.values(), default=0.0)
+
+    def __update_load(self, track: MediaStreamTrack):
+        self.__loads[track] = max((proxy.queue_depth / proxy.max_queue_size for proxy in self.__proxies[track]
+                                   if proxy.buffered), default=0.0)
+        self.__load = max(self.__loads.values())
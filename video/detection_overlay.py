@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class DetectionOverlay:
+    """Draws detection results (boxes in image coordinates) onto BGR images.
+
+    Label text is rasterized once into a mask and cached, so drawing the same labels on every frame only costs
+    a rectangle and a masked copy per box.
+    """
+    BOX_COLOR = (0, 255, 0)
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+    LABEL_OFFSET_Y = 10
+    MAX_CACHED_LABELS = 512
+
+    def __init__(self, font_scale=1, thickness=2):
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.__label_cache = OrderedDict[str, tuple[np.ndarray, int]]()
+        # Frame processing workers draw concurrently
+        self.__label_cache_lock = threading.Lock()
+
+    def draw(self, img, detections):
+        track_ids = detections.get("track_ids")
+        for index, box in enumerate(detections["boxes"]):
+            label = detections["names"][int(detections["labels"][index])]
+            score = round(detections["scores"][index] * 100.0)
+            text = f"{label} - {score}%" if track_ids is None else f"#{track_ids[index]} {label} - {score}%"
+            left, top, right, bottom = (int(value) for value in box[:4])
+
+            cv2.rectangle(img, (left, top), (right, bottom), DetectionOverlay.BOX_COLOR, self.thickness)
+            self.__draw_label(img, text, left, top - DetectionOverlay.LABEL_OFFSET_Y)
+        return img
+
+    def __draw_label(self, img, text, x, baseline_y):
+        mask, ascent = self.__get_label_mask(text)
+        top = baseline_y - ascent
+
+        # Clip the label to the image, it may start above or left of the frame
+        img_top, img_left = max(top, 0), max(x, 0)
+        img_bottom, img_right = min(top + mask.shape[0], img.shape[0]), min(x + mask.shape[1], img.shape[1])
+        if img_top >= img_bottom or img_left >= img_right:
+            return
+
+        visible_mask = mask[img_top - top:img_bottom - top, img_left - x:img_right - x]
+        img[img_top:img_bottom, img_left:img_right][visible_mask] = DetectionOverlay.BOX_COLOR
+
+    def __get_label_mask(self, text) -> tuple[np.ndarray, int]:
+        with self.__label_cache_lock:
+            cached = self.__label_cache.get(text)
+            if cached is not None:
+                self.__label_cache.move_to_end(text)
+                return cached
+
+        (width, height), baseline = cv2.getTextSize(text, DetectionOverlay.FONT, self.font_scale, self.thickness)
+        ascent = height + self.thickness
+        canvas = np.zeros((ascent + baseline + self.thickness, width + self.thickness), dtype=np.uint8)
+        cv2.putText(canvas, text, (0, ascent), DetectionOverlay.FONT, self.font_scale, 255, self.thickness)
+
+        cached = (canvas > 0, ascent)
+        with self.__label_cache_lock:
+            self.__label_cache[text] = cached
+            if len(self.__label_cache) > DetectionOverlay.MAX_CACHED_LABELS:
+                self.__label_cache.popitem(last=False)
+        return cached
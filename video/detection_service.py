@@ -12,19 +12,32 @@ import torch
 from ultralytics import YOLO
 from ultralytics.engine.results import Results
 
+from ai.inference_profile import InferenceProfile
 from ai.unet_model import UnetModel
+from ai.yolo_backends.process_yolo_backend import ProcessYoloBackend
+from ai.yolo_backends.backend_validation import compare_detections
+from ai.yolo_backends.torch_yolo_backend import TorchYoloBackend
+from ai.yolo_backends.yolo_backend import YoloBackend
+from ai.yolo_backends.yolo_backend_factory import create_yolo_backend_factory
 from ai.yolo_model import YoloModel
 from config.app_config import AppConfig
 from detector import DetectionModule
+from video.batching_queue import BatchingQueue
+from video.frame_processing_executor import FrameProcessingExecutor
 
 
 class DetectionService:
+    DEFAULT_MAX_BATCH_SIZE = 8
+    DEFAULT_BATCH_WINDOW_MS = 15
+    MIN_BACKEND_AGREEMENT_F1 = 0.9
 
-    def __init__(self):
+    def __init__(self, frame_processing_workers: int = FrameProcessingExecutor.DEFAULT_MAX_WORKERS):
         self.logger = logging.getLogger(__name__)
         self.device = "cpu"
+        self.frame_processing_executor = FrameProcessingExecutor(frame_processing_workers)
         self.unet_detector: DetectionModule | None = None
         self.models = []
+        self.batching_queues = dict[str, BatchingQueue]()
 
     def get_model_by_id(self, model_id: str):
         return next((model for model in self.models if model.model_id == model_id), None)
@@ -33,21 +46,84 @@ class DetectionService:
         with open(os.path.join(AppConfig.root_path, 'model-config.json'), 'r') as file:
             data = json.load(file)
             for model_config in data:
+                profile = InferenceProfile.from_config(model_config)
                 if model_config['type'] == 'yolo':
-                    self.models.append(
-                        YoloModel(
-                            model_config['id'],
-                            model_config['name'],
-                            os.path.join(AppConfig.root_path, model_config['path']))
-                    )
+                    model = YoloModel(
+                        model_config['id'],
+                        model_config['name'],
+                        os.path.join(AppConfig.root_path, model_config['path']),
+                        profile=profile,
+                        backend=self.__create_yolo_backend(model_config, profile))
+                    self.__validate_backend(model, model_config)
+                    self.__create_batching_queue(model, model_config)
+                    self.models.append(model)
                 elif model_config['type'] == 'unet':
                     self.models.append(
                         UnetModel(
                             model_config['id'],
                             model_config['name'],
-                            os.path.join(AppConfig.root_path, model_config['path']))
+                            os.path.join(AppConfig.root_path, model_config['path']),
+                            profile=profile)
                     )
 
+    def __create_yolo_backend(self, model_config: dict, profile: InferenceProfile) -> YoloBackend:
+        backend_factory = create_yolo_backend_factory(model_config, AppConfig.root_path, profile)
+        if model_config.get('worker_process', False):
+            # Keeps inference (and its GIL use) out of the process that handles the WebRTC traffic
+            return ProcessYoloBackend(backend_factory, model_config['id'],
+                                      slot_bytes=(profile.input_size ** 2 * 3 if profile.input_size
+                                                  else ProcessYoloBackend.DEFAULT_SLOT_BYTES))
+        return backend_factory()
+
+    def __validate_backend(self, model: YoloModel, model_config: dict):
+        """Compares an exported backend against the torch model it was exported from on a sample image."""
+        if 'validate_against' not in model_config or 'validation_image' not in model_config:
+            return
+        img = cv2.imread(os.path.join(AppConfig.root_path, model_config['validation_image']), cv2.IMREAD_COLOR)
+        if img is None:
+            self.logger.warning(f"[{model.model_id}] validation image not found, skipping backend check")
+            return
+
+        resized_img = model.preprocess(img)
+        reference_backend = TorchYoloBackend(os.path.join(AppConfig.root_path, model_config['validate_against']),
+                                             model.profile)
+        reference = reference_backend.predict([resized_img], model.conf_th)[0]
+        candidate = model.detect_yolo(resized_img, model.conf_th)
+        comparison = compare_detections(reference, candidate)
+
+        message = f"[{model.model_id}] {model_config.get('backend', 'torch')} backend vs torch: {comparison}"
+        if comparison['f1'] < DetectionService.MIN_BACKEND_AGREEMENT_F1:
+            self.logger.warning(message)
+        else:
+            self.logger.info(message)
+
+    def __create_batching_queue(self, model: YoloModel, model_config: dict):
+        max_batch_size = model_config.get('max_batch_size', DetectionService.DEFAULT_MAX_BATCH_SIZE)
+        if max_batch_size <= 1:
+            return
+        batching_queue = BatchingQueue(
+            model.model_id,
+            partial(model.detect_yolo_batch, conf_th=model.conf_th),
+            max_batch_size=max_batch_size,
+            window_ms=model_config.get('batch_window_ms', DetectionService.DEFAULT_BATCH_WINDOW_MS))
+        model.batching_queue = batching_queue
+        self.batching_queues[model.model_id] = batching_queue
+        self.logger.info(
+            f"Batching enabled for [{model.model_id}]: max {batching_queue.max_batch_size} frames / "
+            f"{batching_queue.window_ms} ms")
+
+    def get_batching_statistics(self):
+        return {model_id: batching_queue.get_statistics()
+                for model_id, batching_queue in self.batching_queues.items()}
+
+    def shutdown(self):
+        for batching_queue in self.batching_queues.values():
+            batching_queue.shutdown()
+        self.frame_processing_executor.shutdown()
+        for model in self.models:
+            if isinstance(model, YoloModel):
+                model.backend.close()
+
     def load_unet_detector(self, model_dir_path, config_file_name="cfg.yaml"):
         self.unet_detector = DetectionModule.load_unet_detector(model_dir_path, config_file_name)
         if torch.cuda.is_available():
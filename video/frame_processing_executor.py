@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import LATENCY_BUCKETS_MS, REGISTRY
+
+QUEUE_WAIT_MS = REGISTRY.histogram("frame_processing_queue_wait_ms", "Time a frame job waits for a worker thread",
+                                   LATENCY_BUCKETS_MS)
+
+
+class FrameProcessingExecutor:
+    """Thread pool that runs complete per-frame jobs (convert, preprocess, infer, annotate, rebuild frame).
+
+    Keeping the whole chain in one job means none of the numpy/OpenCV/swscale work happens on the event loop
+    that also drives RTP, DTLS and the data channels. With `max_workers=0` jobs run inline on the loop.
+    """
+    DEFAULT_MAX_WORKERS = 4
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.__executor: ThreadPoolExecutor | None = None
+        self.__queue_wait = QUEUE_WAIT_MS.labels()
+        if max_workers > 0:
+            self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame-processing")
+        self.logger.info(f"Frame processing executor: {max_workers if max_workers > 0 else 'inline'} workers")
+
+    @property
+    def is_inline(self) -> bool:
+        return self.__executor is None
+
+    async def run(self, fn, *args, **kwargs):
+        if self.__executor is None:
+            return fn(*args, **kwargs)
+        submitted = time.perf_counter()
+
+        def job():
+            self.__queue_wait.observe((time.perf_counter() - submitted) * 1000)
+            return fn(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, job)
+
+    def shutdown(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
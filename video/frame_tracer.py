@@ -0,0 +1,156 @@
+import threading
+import time
+
+import numpy as np
+from aiortc import RTCRtpReceiver, RTCRtpSender
+
+
+class FrameTrace:
+    """Stage timestamps (perf_counter_ns, 0 = not reached) of one frame."""
+    __slots__ = ("pts", "created_at", "timestamps")
+
+    def __init__(self, pts: int, stage_count: int):
+        self.pts = pts
+        self.created_at = time.time()
+        self.timestamps = [0] * stage_count
+
+
+class FrameTracer:
+    """Follows frames through the pipeline by their pts, the RTP timestamp they arrived with.
+
+    Stages are marked where a frame passes them; only the first mark of a stage counts, so with several
+    consumers `encoded` and `sent` belong to the first one. Frames that skip a stage (e.g. no inference on
+    that frame) simply have no timestamp for it. Traces live in a fixed-size ring buffer, the oldest trace
+    is replaced by the next new frame. Marking is an attribute lookup and a list store, cheap enough for
+    every frame; only creating a trace takes a lock, because frames can first be seen by worker threads.
+    """
+    STAGES = ("received", "decoded", "dequeued", "inference_start", "inference_end", "annotated", "encoded", "sent")
+    DEFAULT_CAPACITY = 1024
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.__stage_indexes = {stage: index for index, stage in enumerate(FrameTracer.STAGES)}
+        self.__lock = threading.Lock()
+        self.set_capacity(capacity)
+
+    def set_capacity(self, capacity: int):
+        """Drops all traces, 0 disables tracing."""
+        with self.__lock:
+            self.capacity = capacity
+            self.__ring = list[FrameTrace | None]([None] * max(capacity, 1))
+            self.__next_slot = 0
+            self.__traces = dict[int, FrameTrace]()
+
+    def mark(self, pts: int | None, stage: str):
+        if pts is None or self.capacity <= 0:
+            return
+        trace = self.__traces.get(pts)
+        if trace is None:
+            trace = self.__create(pts)
+        index = self.__stage_indexes[stage]
+        if trace.timestamps[index] == 0:
+            trace.timestamps[index] = time.perf_counter_ns()
+
+    def attach_receiver(self, receiver: RTCRtpReceiver):
+        """Marks `received` when a depacketized frame is handed to the receiver's decoder and `decoded` when the
+        decoded frame is read from the receiver's track."""
+        decoder_queue = receiver._RTCRtpReceiver__decoder_queue
+        decoder_queue_put = decoder_queue.put
+
+        def put(item, *args, **kwargs):
+            if item is not None:
+                self.mark(item[1].timestamp, "received")
+            decoder_queue_put(item, *args, **kwargs)
+        decoder_queue.put = put
+
+        track = receiver.track
+        track_recv = track.recv
+
+        async def recv():
+            frame = await track_recv()
+            self.mark(frame.pts, "decoded")
+            return frame
+        track.recv = recv
+
+    def attach_sender(self, sender: RTCRtpSender):
+        """Marks `encoded` when the sender got a frame's payloads and `sent` once all its packets went out.
+
+        The sender fetches the next frame only after sending every packet of the previous one.
+        """
+        next_encoded_frame = sender._next_encoded_frame
+        last_timestamp = None
+
+        async def traced_next_encoded_frame(codec):
+            nonlocal last_timestamp
+            if last_timestamp is not None:
+                self.mark(last_timestamp, "sent")
+            encoded_frame = await next_encoded_frame(codec)
+            last_timestamp = encoded_frame.timestamp if encoded_frame is not None else None
+            self.mark(last_timestamp, "encoded")
+            return encoded_frame
+        sender._next_encoded_frame = traced_next_encoded_frame
+
+    def get_traces(self, limit: int = 50) -> list[dict]:
+        """The newest traces, stage times in ms after the first stage the frame was seen at."""
+        return [self.__to_dict(trace) for trace in self.__recent()[-limit:]]
+
+    def get_statistics(self) -> dict:
+        """p50/p95/p99 per stage, in ms since the previous stage the frame reached, and end to end."""
+        traces = self.__recent()
+        durations = {stage: [] for stage in FrameTracer.STAGES[1:]}
+        totals = []
+        for trace in traces:
+            previous = 0
+            for stage, timestamp in zip(FrameTracer.STAGES, trace.timestamps):
+                if timestamp == 0:
+                    continue
+                if previous:
+                    durations[stage].append((timestamp - previous) / 1_000_000)
+                previous = timestamp
+            if trace.timestamps[0] and trace.timestamps[-1]:
+                totals.append((trace.timestamps[-1] - trace.timestamps[0]) / 1_000_000)
+        return {
+            "traces": len(traces),
+            "stagesMs": {stage: self.__percentiles(values) for stage, values in durations.items()},
+            "receivedToSentMs": self.__percentiles(totals),
+        }
+
+    def __create(self, pts: int) -> FrameTrace:
+        with self.__lock:
+            trace = self.__traces.get(pts)
+            if trace is not None:
+                return trace
+            trace = FrameTrace(pts, len(FrameTracer.STAGES))
+            evicted = self.__ring[self.__next_slot]
+            if evicted is not None and self.__traces.get(evicted.pts) is evicted:
+                del self.__traces[evicted.pts]
+            self.__ring[self.__next_slot] = trace
+            self.__next_slot = (self.__next_slot + 1) % len(self.__ring)
+            self.__traces[pts] = trace
+            return trace
+
+    def __recent(self) -> list[FrameTrace]:
+        """Oldest first."""
+        slot = self.__next_slot
+        return [trace for trace in self.__ring[slot:] + self.__ring[:slot] if trace is not None]
+
+    @staticmethod
+    def __percentiles(values: list[float]) -> dict:
+        if not values:
+            return {"count": 0}
+        results = np.percentile(values, FrameTracer.PERCENTILES)
+        return {"count": len(values), **{f"p{percentile}": round(float(result), 2)
+                                         for percentile, result in zip(FrameTracer.PERCENTILES, results)}}
+
+    @staticmethod
+    def __to_dict(trace: FrameTrace) -> dict:
+        start = next((timestamp for timestamp in trace.timestamps if timestamp), 0)
+        return {
+            "pts": trace.pts,
+            "time": trace.created_at,
+            "stagesMs": {stage: round((timestamp - start) / 1_000_000, 2)
+                         for stage, timestamp in zip(FrameTracer.STAGES, trace.timestamps) if timestamp},
+        }
+
+
+FRAME_TRACER = FrameTracer()
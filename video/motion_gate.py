@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+from av import VideoFrame
+
+
+class MotionGate:
+    """Decides whether a frame differs enough from the last inferred frame to be worth running inference on.
+
+    Frames are compared as tiny grayscale thumbnails (scaled by swscale in one pass), using the mean absolute
+    pixel difference normalized to 0-1. After `max_skip_seconds` inference runs regardless, so slow changes
+    (lighting, objects creeping in) are still picked up.
+    """
+    THUMBNAIL_WIDTH = 64
+    THUMBNAIL_HEIGHT = 36
+
+    def __init__(self, threshold: float = 0.02, max_skip_seconds: float = 5.0):
+        self.threshold = threshold
+        self.max_skip_seconds = max_skip_seconds
+        self.last_difference = 0.0
+        self.__reference: np.ndarray | None = None
+        self.__reference_time = 0.0
+
+    def should_infer(self, frame: VideoFrame) -> bool:
+        thumbnail = frame.reformat(width=MotionGate.THUMBNAIL_WIDTH, height=MotionGate.THUMBNAIL_HEIGHT,
+                                   format="gray").to_ndarray().astype(np.int16)
+
+        now = time.monotonic()
+        if self.__reference is None or self.__reference.shape != thumbnail.shape \
+                or now - self.__reference_time >= self.max_skip_seconds:
+            self.__set_reference(thumbnail, now)
+            return True
+
+        self.last_difference = float(np.abs(thumbnail - self.__reference).mean()) / 255.0
+        if self.last_difference < self.threshold:
+            return False
+
+        self.__set_reference(thumbnail, now)
+        return True
+
+    def __set_reference(self, thumbnail: np.ndarray, now: float):
+        self.__reference = thumbnail
+        self.__reference_time = now
@@ -0,0 +1,164 @@
+import numpy as np
+
+from ai.box_geometry import iou_matrix
+
+
+def xyxy_to_cxcywh(box) -> np.ndarray:
+    return np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box[2] - box[0], box[3] - box[1]],
+                    dtype=np.float64)
+
+
+def cxcywh_to_xyxy(state) -> np.ndarray:
+    half_width, half_height = state[2] / 2, state[3] / 2
+    return np.array([state[0] - half_width, state[1] - half_height, state[0] + half_width, state[1] + half_height],
+                    dtype=np.float32)
+
+
+class KalmanBoxTrack:
+    """Constant-velocity Kalman filter over (cx, cy, w, h), time measured in seconds.
+
+    Noise weights are the usual per-frame ones (relative to box height), scaled to the reference frame rate.
+    """
+    STD_WEIGHT_POSITION = 1.0 / 20
+    STD_WEIGHT_VELOCITY = 1.0 / 160
+    REFERENCE_FPS = 30
+
+    def __init__(self, track_id: int, box, label, score, timestamp: float):
+        self.track_id = track_id
+        self.label = label
+        self.score = score
+        self.hits = 1
+        self.last_update_time = timestamp
+        self.__time = timestamp
+
+        measurement = xyxy_to_cxcywh(box)
+        self.__mean = np.concatenate([measurement, np.zeros(4)])
+        size = max(measurement[3], 1.0)
+        std = np.array([2 * KalmanBoxTrack.STD_WEIGHT_POSITION * size] * 4
+                       + [10 * KalmanBoxTrack.STD_WEIGHT_VELOCITY * KalmanBoxTrack.REFERENCE_FPS * size] * 4)
+        self.__covariance = np.diag(np.square(std))
+
+    def predict_box(self, timestamp: float) -> np.ndarray:
+        """Extrapolated box at `timestamp`, without changing the filter state."""
+        dt = max(timestamp - self.__time, 0.0)
+        state = self.__mean[:4] + self.__mean[4:] * dt
+        state[2:] = np.maximum(state[2:], 1.0)
+        return cxcywh_to_xyxy(state)
+
+    def predict(self, timestamp: float):
+        dt = max(timestamp - self.__time, 0.0)
+        if dt == 0.0:
+            return
+        transition = np.eye(8)
+        transition[:4, 4:] = np.eye(4) * dt
+
+        size = max(self.__mean[3], 1.0)
+        std = np.array([KalmanBoxTrack.STD_WEIGHT_POSITION * size] * 4
+                       + [KalmanBoxTrack.STD_WEIGHT_VELOCITY * KalmanBoxTrack.REFERENCE_FPS * size] * 4)
+        # Process noise grows with the number of reference frames elapsed since the last step
+        process_noise = np.diag(np.square(std)) * max(dt * KalmanBoxTrack.REFERENCE_FPS, 1.0)
+        self.__mean = transition @ self.__mean
+        self.__covariance = transition @ self.__covariance @ transition.T + process_noise
+        self.__time = timestamp
+
+    def update(self, box, label, score, timestamp: float):
+        self.predict(timestamp)
+        measurement = xyxy_to_cxcywh(box)
+        observation = np.eye(4, 8)
+        size = max(self.__mean[3], 1.0)
+        noise = np.diag(np.square([KalmanBoxTrack.STD_WEIGHT_POSITION * size] * 4))
+
+        innovation_covariance = observation @ self.__covariance @ observation.T + noise
+        gain = self.__covariance @ observation.T @ np.linalg.inv(innovation_covariance)
+        self.__mean = self.__mean + gain @ (measurement - observation @ self.__mean)
+        self.__covariance = (np.eye(8) - gain @ observation) @ self.__covariance
+
+        self.label = label
+        self.score = score
+        self.hits += 1
+        self.last_update_time = timestamp
+
+
+class ObjectTracker:
+    """Associates detections across inference runs and predicts box positions for every decoded frame.
+
+    Association is ByteTrack-style: confident detections are matched first, low-score detections are only used
+    to keep existing tracks alive. Matching is greedy by IoU and restricted to the same class.
+    """
+
+    DEFAULT_MAX_AGE_SECONDS = 1.0
+
+    def __init__(self, iou_threshold: float = 0.3, high_score_threshold: float = 0.6,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS, min_hits: int = 1):
+        self.iou_threshold = iou_threshold
+        self.high_score_threshold = high_score_threshold
+        self.max_age_seconds = max_age_seconds
+        self.min_hits = min_hits
+        self.__tracks: list[KalmanBoxTrack] = []
+        self.__next_track_id = 1
+        self.__names = {}
+
+    def update(self, detections: dict, timestamp: float):
+        """Feeds the detections of the frame at `timestamp` (seconds) into the tracker."""
+        self.__names = detections["names"]
+        boxes = np.asarray(detections["boxes"], dtype=np.float32).reshape(-1, 4)
+        labels = np.asarray(detections["labels"])
+        scores = np.asarray(detections["scores"])
+
+        for track in self.__tracks:
+            track.predict(timestamp)
+
+        high_indices = np.flatnonzero(scores >= self.high_score_threshold)
+        low_indices = np.flatnonzero(scores < self.high_score_threshold)
+
+        unmatched_tracks = list(range(len(self.__tracks)))
+        unmatched_high = self.__associate(high_indices, unmatched_tracks, boxes, labels, scores, timestamp)
+        self.__associate(low_indices, unmatched_tracks, boxes, labels, scores, timestamp)
+
+        for index in unmatched_high:
+            self.__tracks.append(
+                KalmanBoxTrack(self.__next_track_id, boxes[index], labels[index], scores[index], timestamp))
+            self.__next_track_id += 1
+
+        self.__tracks = [track for track in self.__tracks
+                         if timestamp - track.last_update_time <= self.max_age_seconds]
+
+    def predict(self, timestamp: float) -> dict:
+        """Returns the tracked boxes extrapolated to `timestamp`, in the detection dict format plus track_ids."""
+        tracks = [track for track in self.__tracks
+                  if track.hits >= self.min_hits and timestamp - track.last_update_time <= self.max_age_seconds]
+        return {
+            "boxes": np.array([track.predict_box(timestamp) for track in tracks], dtype=np.float32).reshape(-1, 4),
+            "labels": np.array([track.label for track in tracks]),
+            "scores": np.array([track.score for track in tracks], dtype=np.float32),
+            "names": self.__names,
+            "track_ids": np.array([track.track_id for track in tracks], dtype=np.int64),
+        }
+
+    def __associate(self, detection_indices, unmatched_tracks: list[int], boxes, labels, scores, timestamp):
+        """Greedily matches detections to the still unmatched tracks, returns the unmatched detection indices."""
+        if len(detection_indices) == 0 or len(unmatched_tracks) == 0:
+            return list(detection_indices)
+
+        track_boxes = np.array([self.__tracks[i].predict_box(timestamp) for i in unmatched_tracks])
+        ious = iou_matrix(boxes[detection_indices], track_boxes)
+        track_labels = np.array([self.__tracks[i].label for i in unmatched_tracks])
+        ious[labels[detection_indices][:, None] != track_labels[None, :]] = 0.0
+
+        unmatched_detections = set(range(len(detection_indices)))
+        matched_track_positions = set()
+        for flat_index in np.argsort(-ious, axis=None):
+            detection_position, track_position = np.unravel_index(flat_index, ious.shape)
+            if ious[detection_position, track_position] < self.iou_threshold:
+                break
+            if detection_position not in unmatched_detections or track_position in matched_track_positions:
+                continue
+            index = detection_indices[detection_position]
+            self.__tracks[unmatched_tracks[track_position]].update(boxes[index], labels[index], scores[index],
+                                                                   timestamp)
+            unmatched_detections.discard(detection_position)
+            matched_track_positions.add(track_position)
+
+        unmatched_tracks[:] = [track_index for position, track_index in enumerate(unmatched_tracks)
+                               if position not in matched_track_positions]
+        return [detection_indices[position] for position in sorted(unmatched_detections)]
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from collections import deque
+
+import av
+from aiortc import MediaStreamTrack, RTCRtpReceiver, RTCRtpSender
+from aiortc.codecs.h264 import H264Encoder
+from aiortc.mediastreams import VIDEO_TIME_BASE, MediaStreamError
+
+NAL_TYPE_IDR = 5
+NAL_TYPE_SPS = 7
+
+
+def is_h264_keyframe(data: bytes) -> bool:
+    """Whether an Annex B access unit starts a decodable sequence (contains an SPS or IDR NAL unit)."""
+    position = data.find(b"\x00\x00\x01")
+    while position != -1 and position + 3 < len(data):
+        if data[position + 3] & 0x1F in (NAL_TYPE_IDR, NAL_TYPE_SPS):
+            return True
+        position = data.find(b"\x00\x00\x01", position + 3)
+    return False
+
+
+class PassthroughTrack(MediaStreamTrack):
+    """Yields the producer's H.264 access units as `av.Packet`s, without decoding them.
+
+    An `RTCRtpSender` sends packets through `PassthroughPackHandle.pack`, i.e. they are only re-packetized.
+    Packets are queued in order; a subscriber starts at a keyframe and, if it falls `MAX_QUEUED_PACKETS` behind,
+    it is resynchronised at the next keyframe.
+    """
+    kind = "video"
+    MAX_QUEUED_PACKETS = 60
+
+    def __init__(self, tap: 'EncodedStreamTap', name: str):
+        super().__init__()
+        self.name = name
+        self.dropped_count = 0
+        self.__tap = tap
+        self.__packets = deque[av.Packet | None]()
+        self.__packet_available = asyncio.Event()
+        self.__awaiting_keyframe = True
+
+    def push(self, packet: av.Packet | None, keyframe: bool = False):
+        if packet is not None:
+            if self.__awaiting_keyframe and not keyframe:
+                self.dropped_count += 1
+                return
+            if len(self.__packets) >= PassthroughTrack.MAX_QUEUED_PACKETS:
+                self.dropped_count += len(self.__packets) + 1
+                self.__packets.clear()
+                self.__awaiting_keyframe = True
+                self.__tap.request_keyframe()
+                return
+            self.__awaiting_keyframe = False
+        self.__packets.append(packet)
+        self.__packet_available.set()
+
+    def request_keyframe(self):
+        if self.__tap is not None:
+            self.__tap.request_keyframe()
+
+    async def recv(self) -> av.Packet:
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        while not self.__packets:
+            self.__packet_available.clear()
+            await self.__packet_available.wait()
+        packet = self.__packets.popleft()
+
+        if packet is None:
+            self.stop()
+            raise MediaStreamError
+        return packet
+
+    def stop(self):
+        super().stop()
+        if self.__tap is not None:
+            self.__tap.unsubscribe(self)
+            self.__tap = None
+            self.__packets.clear()
+
+
+class PassthroughPackHandle(H264Encoder):
+    """Stands in for the per-sender encoder of an `RTCRtpSender` that sends a `PassthroughTrack`.
+
+    Packets are re-packetized by `H264Encoder.pack`; PLI/FIR requests of the receiver, which the sender would only
+    act on when it encodes itself, are forwarded to the producer through the tap.
+    """
+
+    def __init__(self, sender: RTCRtpSender, track: PassthroughTrack):
+        super().__init__()
+        self.__sender = sender
+        self.__track = track
+
+    def pack(self, packet: av.Packet) -> tuple[list[bytes], int]:
+        if getattr(self.__sender, "_RTCRtpSender__force_keyframe", False):
+            self.__sender._RTCRtpSender__force_keyframe = False
+            self.__track.request_keyframe()
+        return super().pack(packet)
+
+
+class EncodedStreamTap:
+    """Taps the depacketized H.264 frames of a producer's `RTCRtpReceiver` before they reach its decoder.
+
+    The receiver keeps decoding for the track that feeds inference; everything that only relays the camera
+    image (consumers, recorders) subscribes here and gets the original access units instead of re-encoding
+    decoded frames.
+    """
+
+    def __init__(self, receiver: RTCRtpReceiver, name: str):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.forwarded_packets = 0
+        self.__receiver = receiver
+        self.__tracks = set[PassthroughTrack]()
+        self.__keyframe_task: asyncio.Task | None = None
+
+        # The decoder thread owns the queue object, so its `put` is wrapped instead of replacing the queue
+        decoder_queue = receiver._RTCRtpReceiver__decoder_queue
+        self.__decoder_queue_put = decoder_queue.put
+        decoder_queue.put = self.__tee
+
+    def subscribe(self, name: str) -> PassthroughTrack:
+        track = PassthroughTrack(self, name)
+        self.__tracks.add(track)
+        self.request_keyframe()
+        return track
+
+    def attach(self, sender: RTCRtpSender, track: PassthroughTrack) -> PassthroughPackHandle:
+        """Makes `sender`, which sends `track`, forward the keyframe requests of its receiver to the producer."""
+        handle = PassthroughPackHandle(sender, track)
+        sender._RTCRtpSender__encoder = handle
+        return handle
+
+    def unsubscribe(self, track: PassthroughTrack):
+        self.__tracks.discard(track)
+
+    def close(self):
+        for track in list(self.__tracks):
+            track.push(None)
+
+    def request_keyframe(self):
+        """Asks the producer for a keyframe (PLI), requests made while one is in flight are coalesced."""
+        if self.__keyframe_task is not None and not self.__keyframe_task.done():
+            return
+        remote_streams = getattr(self.__receiver, "_RTCRtpReceiver__remote_streams", {})
+        if remote_streams:
+            self.__keyframe_task = asyncio.create_task(self.__receiver._send_rtcp_pli(next(iter(remote_streams))))
+
+    def get_statistics(self) -> dict:
+        return {
+            "name": self.name,
+            "subscribers": len(self.__tracks),
+            "forwardedPackets": self.forwarded_packets,
+            "droppedPackets": {track.name: track.dropped_count for track in self.__tracks},
+        }
+
+    def __tee(self, item, *args, **kwargs):
+        self.__decoder_queue_put(item, *args, **kwargs)
+        if item is None:
+            self.close()
+            return
+        if not self.__tracks:
+            return
+
+        codec, encoded_frame = item
+        if codec.mimeType.lower() != "video/h264":
+            return
+        keyframe = is_h264_keyframe(encoded_frame.data)
+        for track in list(self.__tracks):
+            # Each subscriber gets its own packet, muxers and senders may change pts / time base / stream
+            packet = av.Packet(encoded_frame.data)
+            packet.pts = encoded_frame.timestamp
+            packet.dts = encoded_frame.timestamp
+            packet.time_base = VIDEO_TIME_BASE
+            packet.is_keyframe = keyframe
+            track.push(packet, keyframe)
+        self.forwarded_packets += 1
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import VIDEO_TIME_BASE, MediaStreamError
+
+from video.recorders.h264_stream import RtpTimestampUnwrapper, add_remux_stream
+
+
+class GroupOfPictures:
+    """Packets from one keyframe up to the next, the unit the pre-roll buffer is trimmed by."""
+
+    def __init__(self, start_time: float):
+        self.start_time = start_time
+        self.packets = list[av.Packet]()
+        self.size_bytes = 0
+
+
+class EventClip:
+
+    def __init__(self, path: str, start_time: float):
+        self.path = path
+        self.start_time = start_time
+        self.end_time = start_time
+        self.events = list[dict]()
+
+    def metadata(self) -> dict:
+        return {
+            "file": os.path.basename(self.path),
+            "startTime": self.start_time,
+            "endTime": self.end_time,
+            "labels": sorted({event["label"] for event in self.events}),
+            "events": self.events,
+        }
+
+
+class EventClipRecorder:
+    """Writes short clips around detections instead of recording continuously.
+
+    The camera's H.264 packets (a `PassthroughTrack`) are kept in memory for `pre_roll_seconds`, in whole groups
+    of pictures so a clip always starts at a keyframe. When a detection of one of `labels` arrives, the pre-roll
+    and everything up to `post_roll_seconds` after the last matching detection is remuxed into a clip, capped at
+    `max_clip_seconds`. Each clip gets a `.json` sidecar with its detections. Files are written by a background
+    thread; nothing is encoded.
+    """
+    DEFAULT_PRE_ROLL_SECONDS = 5.0
+    DEFAULT_POST_ROLL_SECONDS = 5.0
+    DEFAULT_MAX_CLIP_SECONDS = 120.0
+    # Upper bound of the pre-roll buffer for producers with very long keyframe intervals
+    MAX_PRE_ROLL_BYTES = 64 * 1024 * 1024
+    MAX_WRITE_QUEUE_SIZE = 600
+
+    def __init__(self, directory: str, labels: list[str], min_score: float = 0.5,
+                 pre_roll_seconds: float = DEFAULT_PRE_ROLL_SECONDS,
+                 post_roll_seconds: float = DEFAULT_POST_ROLL_SECONDS,
+                 max_clip_seconds: float = DEFAULT_MAX_CLIP_SECONDS, container: str = "mp4"):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.labels = set(labels)
+        self.min_score = min_score
+        self.pre_roll_seconds = pre_roll_seconds
+        self.post_roll_seconds = post_roll_seconds
+        self.max_clip_seconds = max_clip_seconds
+        self.container = container
+        self.written_clips = 0
+        self.dropped_packets = 0
+        self.__track: MediaStreamTrack | None = None
+        self.__pre_roll = deque[GroupOfPictures]()
+        self.__pre_roll_bytes = 0
+        self.__keyframe_requested = False
+        self.__clip: EventClip | None = None
+        self.__clip_deadline = 0.0
+        self.__awaiting_keyframe = False
+        # Unbounded so open/close always get through, packets are bounded by MAX_WRITE_QUEUE_SIZE in __write
+        self.__writes = queue.Queue()
+        self.__task: asyncio.Task | None = None
+        self.__thread: threading.Thread | None = None
+
+    def addTrack(self, track: MediaStreamTrack):
+        if track.kind != "video":
+            raise ValueError("EventClipRecorder only records video")
+        self.__track = track
+
+    async def start(self):
+        if self.__task is None and self.__track is not None:
+            self.__thread = threading.Thread(target=self.__write_clips, name=f"event-clips-{self.directory}",
+                                             daemon=True)
+            self.__thread.start()
+            self.__task = asyncio.create_task(self.__run_track(), name=f"event-clip-recorder-{id(self)}")
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__clip is not None:
+            self.__finish_clip()
+        if self.__thread is not None:
+            self.__writes.put(None)
+            await asyncio.to_thread(self.__thread.join)
+            self.__thread = None
+
+    def on_detections(self, detections: dict):
+        """Detection listener of the transformer that analyses this camera."""
+        now = time.time()
+        events = []
+        for box, label_id, score in zip(detections["boxes"], detections["labels"], detections["scores"]):
+            label = detections["names"][int(label_id)]
+            if label in self.labels and score >= self.min_score:
+                events.append({"time": now, "label": label, "score": round(float(score), 3),
+                               "box": [round(float(value), 1) for value in box]})
+        if not events:
+            return
+
+        if self.__clip is None:
+            self.__start_clip(now)
+            if self.__clip is None:
+                return
+        self.__clip.events.extend(events)
+        self.__clip_deadline = min(now + self.post_roll_seconds, self.__clip.start_time + self.max_clip_seconds)
+
+    async def __run_track(self):
+        while True:
+            try:
+                packet: av.Packet = await self.__track.recv()
+            except MediaStreamError:
+                return
+
+            now = time.time()
+            self.__buffer(packet, now)
+            if self.__clip is not None:
+                if now > self.__clip_deadline:
+                    self.__finish_clip()
+                else:
+                    self.__write(("packet", packet))
+                    self.__clip.end_time = now
+
+    def __buffer(self, packet: av.Packet, now: float):
+        if packet.is_keyframe:
+            self.__pre_roll.append(GroupOfPictures(now))
+            self.__keyframe_requested = False
+        elif not self.__pre_roll:
+            return
+        group = self.__pre_roll[-1]
+        group.packets.append(packet)
+        group.size_bytes += packet.size
+        self.__pre_roll_bytes += packet.size
+
+        # Drop the oldest group once the next one alone covers the pre-roll
+        cutoff = now - self.pre_roll_seconds
+        while len(self.__pre_roll) > 1 and (self.__pre_roll[1].start_time <= cutoff or
+                                            self.__pre_roll_bytes > EventClipRecorder.MAX_PRE_ROLL_BYTES):
+            self.__pre_roll_bytes -= self.__pre_roll.popleft().size_bytes
+        # Without a keyframe within the pre-roll the buffer would grow up to the producer's keyframe interval
+        if group.start_time < cutoff and not self.__keyframe_requested and \
+                hasattr(self.__track, "request_keyframe"):
+            self.__keyframe_requested = True
+            self.__track.request_keyframe()
+
+    def __start_clip(self, now: float):
+        if not self.__pre_roll:
+            return
+        start_time = self.__pre_roll[0].start_time
+        # Milliseconds, so a clip starting in the second another one finished does not overwrite it
+        file_name = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + \
+            f"-{int(now * 1000) % 1000:03d}-event.{self.container}"
+        self.__clip = EventClip(os.path.join(self.directory, file_name), start_time)
+        self.__awaiting_keyframe = False
+        self.__write(("open", self.__clip.path))
+        for group in self.__pre_roll:
+            for packet in group.packets:
+                self.__write(("packet", packet))
+        self.logger.info(f"Event clip started: {file_name}")
+
+    def __finish_clip(self):
+        self.__write(("close", self.__clip.metadata()))
+        self.logger.info(f"Event clip finished: {os.path.basename(self.__clip.path)}")
+        self.__clip = None
+
+    def __write(self, operation: tuple):
+        if operation[0] == "packet":
+            # A packet after a dropped one is undecodable until the next keyframe
+            if self.__awaiting_keyframe and not operation[1].is_keyframe:
+                self.dropped_packets += 1
+                return
+            if self.__writes.qsize() >= EventClipRecorder.MAX_WRITE_QUEUE_SIZE:
+                self.dropped_packets += 1
+                self.__awaiting_keyframe = True
+                return
+            self.__awaiting_keyframe = False
+        self.__writes.put_nowait(operation)
+
+    def __write_clips(self):
+        container = None
+        stream = None
+        timestamps = None
+        while True:
+            operation = self.__writes.get()
+            if operation is None:
+                break
+            try:
+                if operation[0] == "open":
+                    if container is not None:
+                        container.close()
+                    container = av.open(operation[1], mode="w")
+                    stream = None
+                    timestamps = RtpTimestampUnwrapper()
+                elif operation[0] == "packet" and container is not None:
+                    packet = operation[1]
+                    if stream is None:
+                        stream = add_remux_stream(container, packet)
+                    # The pre-roll packets are shared with the buffer, so they are copied before being retimed
+                    copy = av.Packet(bytes(packet))
+                    copy.pts = copy.dts = timestamps.unwrap(packet.pts)
+                    copy.time_base = VIDEO_TIME_BASE
+                    copy.is_keyframe = packet.is_keyframe
+                    copy.stream = stream
+                    container.mux(copy)
+                elif operation[0] == "close" and container is not None:
+                    metadata = operation[1]
+                    container.close()
+                    container = None
+                    sidecar_path = os.path.join(self.directory, os.path.splitext(metadata["file"])[0] + ".json")
+                    with open(sidecar_path, "w") as file:
+                        json.dump(metadata, file, indent=2)
+                    self.written_clips += 1
+            except Exception as e:
+                self.logger.error(f"Writing event clip failed: {e}")
+        if container is not None:
+            container.close()
@@ -0,0 +1,95 @@
+import fractions
+import io
+import logging
+
+import av
+
+RECORDING_FRAME_RATE = 30
+# Tried in this order, the first one that opens on this machine is used
+H264_ENCODERS = ("h264_nvenc", "libx264")
+RTP_TIMESTAMP_MODULO = 1 << 32
+NAL_TYPE_SPS = 7
+NAL_TYPE_PPS = 8
+
+logger = logging.getLogger(__name__)
+
+
+def select_h264_encoder(width: int, height: int) -> str:
+    for codec_name in H264_ENCODERS:
+        try:
+            codec = av.CodecContext.create(codec_name, "w")
+            codec.width = width
+            codec.height = height
+            codec.pix_fmt = "yuv420p"
+            codec.time_base = fractions.Fraction(1, RECORDING_FRAME_RATE)
+            codec.open()
+            codec.close()
+            return codec_name
+        except Exception as e:
+            logger.info(f"H.264 encoder {codec_name} not available: {e}")
+    raise RuntimeError(f"None of the H.264 encoders {H264_ENCODERS} is available")
+
+
+def add_encoding_stream(container, width: int, height: int):
+    """Adds an H.264 stream that encodes `width` x `height` frames, hardware accelerated if possible."""
+    codec_name = select_h264_encoder(width, height)
+    stream = container.add_stream(codec_name, rate=RECORDING_FRAME_RATE)
+    stream.width = width
+    stream.height = height
+    stream.pix_fmt = "yuv420p"
+    if codec_name == "libx264":
+        stream.options = {"preset": "veryfast"}
+    return stream
+
+
+def detached_frame(frame: av.VideoFrame, pts: int, time_base: fractions.Fraction) -> av.VideoFrame:
+    """A yuv420p copy of a decoded frame with its own timestamp.
+
+    Decoded frames are shared by every subscriber of a track and their timestamps are rewritten on the event loop,
+    so a frame encoded in another thread must not be the original.
+    """
+    if frame.format.name == "yuv420p":
+        copy = av.VideoFrame.from_ndarray(frame.to_ndarray(), format="yuv420p")
+    else:
+        copy = frame.reformat(format="yuv420p")
+    copy.pts = pts
+    copy.time_base = time_base
+    return copy
+
+
+def parameter_sets(access_unit: bytes) -> bytes:
+    """The SPS and PPS NAL units of an Annex B access unit, with start codes."""
+    nal_units = access_unit.split(b"\x00\x00\x01")
+    return b"".join(b"\x00\x00\x00\x01" + nal_unit.rstrip(b"\x00") for nal_unit in nal_units
+                    if nal_unit and nal_unit[0] & 0x1F in (NAL_TYPE_SPS, NAL_TYPE_PPS))
+
+
+def add_remux_stream(container, keyframe: av.Packet):
+    """Adds an H.264 stream that takes packets as they are, the SPS/PPS of `keyframe` become its extradata.
+
+    The stream is copied from the keyframe demuxed as raw H.264, `add_stream("h264")` would create an encoder
+    that replaces the extradata with its own parameter sets when the container starts.
+    """
+    with av.open(io.BytesIO(bytes(keyframe)), format="h264") as source:
+        template = source.streams.video[0]
+        if not template.codec_context.width or not template.codec_context.height:
+            raise ValueError("Keyframe could not be parsed")
+        template.codec_context.extradata = parameter_sets(bytes(keyframe))
+        return container.add_stream(template=template)
+
+
+class RtpTimestampUnwrapper:
+    """Turns 32 bit RTP timestamps into ticks since the first one, across wrap-arounds."""
+
+    def __init__(self):
+        self.__first_timestamp: int | None = None
+        self.__last_ticks = 0
+
+    def unwrap(self, timestamp: int) -> int:
+        if self.__first_timestamp is None:
+            self.__first_timestamp = timestamp
+        ticks = (timestamp - self.__first_timestamp) % RTP_TIMESTAMP_MODULO
+        # Add the wraps already passed, i.e. pick the candidate closest to the previous timestamp
+        ticks += (self.__last_ticks - ticks + RTP_TIMESTAMP_MODULO // 2) // RTP_TIMESTAMP_MODULO * RTP_TIMESTAMP_MODULO
+        self.__last_ticks = ticks
+        return ticks
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import VIDEO_TIME_BASE, MediaStreamError
+
+from video.recorders.h264_stream import RtpTimestampUnwrapper, add_remux_stream
+
+
+class PacketRecorder:
+    """Writes the H.264 packets of a `PassthroughTrack` into an MP4/MKV file without decoding or encoding.
+
+    Same interface as aiortc's `MediaRecorder` (one video track). Recording starts at the first keyframe, which
+    the passthrough track guarantees; muxing a packet is cheap enough to stay on the event loop.
+    """
+
+    def __init__(self, file: str, format: str | None = None):
+        self.logger = logging.getLogger(__name__)
+        self.file = file
+        self.written_packets = 0
+        self.__container = av.open(file=file, format=format, mode="w")
+        self.__track: MediaStreamTrack | None = None
+        self.__stream = None
+        self.__timestamps = RtpTimestampUnwrapper()
+        self.__task: asyncio.Task | None = None
+
+    def addTrack(self, track: MediaStreamTrack):
+        if track.kind != "video":
+            raise ValueError("PacketRecorder only records video")
+        self.__track = track
+
+    async def start(self):
+        if self.__task is None and self.__track is not None:
+            self.__task = asyncio.create_task(self.__run_track(), name=f"packet-recorder-{self.file}")
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__container is not None:
+            self.__container.close()
+            self.__container = None
+            self.logger.info(f"Recorded {self.written_packets} packets to {self.file}")
+
+    async def __run_track(self):
+        while True:
+            try:
+                packet: av.Packet = await self.__track.recv()
+            except MediaStreamError:
+                return
+
+            if self.__stream is None:
+                self.__stream = add_remux_stream(self.__container, packet)
+            ticks = self.__timestamps.unwrap(packet.pts)
+            packet.pts = ticks
+            packet.dts = ticks
+            packet.time_base = VIDEO_TIME_BASE
+            packet.stream = self.__stream
+            self.__container.mux(packet)
+            self.written_packets += 1
@@ -0,0 +1,35 @@
+import os
+from pathlib import Path
+
+from video.recorders.retention_manager import RetentionManager
+from video.recorders.segment_index import SegmentIndex
+
+
+class RecordingStore:
+    """Segment directories of all cameras below `root_directory`, each with its index and retention budget."""
+
+    def __init__(self, root_directory: str, max_bytes_per_camera: int):
+        self.root_directory = root_directory
+        self.max_bytes_per_camera = max_bytes_per_camera
+        self.__indexes = dict[str, SegmentIndex]()
+        self.__retention_managers = dict[str, RetentionManager]()
+
+    def directory(self, camera_id: str) -> str:
+        return os.path.join(self.root_directory, camera_id)
+
+    def index(self, camera_id: str) -> SegmentIndex:
+        if camera_id not in self.__indexes:
+            Path.mkdir(Path(self.directory(camera_id)), exist_ok=True, parents=True)
+            self.__indexes[camera_id] = SegmentIndex(self.directory(camera_id))
+        return self.__indexes[camera_id]
+
+    def retention_manager(self, camera_id: str) -> RetentionManager:
+        if camera_id not in self.__retention_managers:
+            self.__retention_managers[camera_id] = RetentionManager(self.index(camera_id), self.max_bytes_per_camera)
+        return self.__retention_managers[camera_id]
+
+    def camera_ids(self) -> list[str]:
+        if not os.path.isdir(self.root_directory):
+            return []
+        return sorted(entry for entry in os.listdir(self.root_directory)
+                      if os.path.exists(os.path.join(self.root_directory, entry, SegmentIndex.INDEX_FILE_NAME)))
@@ -0,0 +1,26 @@
+import logging
+import os
+
+from video.recorders.segment_index import SegmentIndex
+
+
+class RetentionManager:
+    """Keeps the finished segments of one camera within a disk budget by deleting the oldest ones."""
+
+    def __init__(self, segment_index: SegmentIndex, max_bytes: int):
+        self.logger = logging.getLogger(__name__)
+        self.segment_index = segment_index
+        self.max_bytes = max_bytes
+        self.deleted_segments = 0
+
+    def enforce(self):
+        while self.segment_index.total_bytes > self.max_bytes:
+            segment = self.segment_index.pop_oldest()
+            if segment is None:
+                return
+            try:
+                os.remove(self.segment_index.path(segment))
+            except FileNotFoundError:
+                pass
+            self.deleted_segments += 1
+            self.logger.info(f"Deleted segment {segment.file_name} to stay within {self.max_bytes} bytes")
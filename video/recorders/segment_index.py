@@ -0,0 +1,110 @@
+import bisect
+import json
+import logging
+import os
+import threading
+
+
+class Segment:
+
+    def __init__(self, file_name: str, start_time: float, end_time: float, size_bytes: int):
+        self.file_name = file_name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.size_bytes = size_bytes
+
+    def to_dict(self) -> dict:
+        return {
+            "fileName": self.file_name,
+            "startTime": self.start_time,
+            "endTime": self.end_time,
+            "sizeBytes": self.size_bytes,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Segment':
+        return Segment(data["fileName"], data["startTime"], data["endTime"], data["sizeBytes"])
+
+
+class SegmentIndex:
+    """Finished segments of one camera ordered by start time, persisted as `index.json` in its directory.
+
+    Lookups by time are binary searches, so clips can be served without listing the directory. The writer
+    thread adds segments while API handlers read, hence the lock.
+    """
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, directory: str):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.__segments = list[Segment]()
+        self.__start_times = list[float]()
+        self.__total_bytes = 0
+        self.__lock = threading.Lock()
+        self.__load()
+
+    @property
+    def total_bytes(self) -> int:
+        return self.__total_bytes
+
+    def path(self, segment: Segment) -> str:
+        return os.path.join(self.directory, segment.file_name)
+
+    def add(self, segment: Segment):
+        with self.__lock:
+            position = bisect.bisect_right(self.__start_times, segment.start_time)
+            self.__segments.insert(position, segment)
+            self.__start_times.insert(position, segment.start_time)
+            self.__total_bytes += segment.size_bytes
+            self.__save()
+
+    def pop_oldest(self) -> Segment | None:
+        with self.__lock:
+            if not self.__segments:
+                return None
+            segment = self.__segments.pop(0)
+            self.__start_times.pop(0)
+            self.__total_bytes -= segment.size_bytes
+            self.__save()
+            return segment
+
+    def find(self, start_time: float, end_time: float) -> list[Segment]:
+        """Segments overlapping [start_time, end_time], oldest first."""
+        with self.__lock:
+            # Segments never overlap, so only the one before the first later start can reach into the range
+            first = max(bisect.bisect_right(self.__start_times, start_time) - 1, 0)
+            last = bisect.bisect_right(self.__start_times, end_time)
+            return [segment for segment in self.__segments[first:last] if segment.end_time >= start_time]
+
+    def get_statistics(self) -> dict:
+        with self.__lock:
+            return {
+                "segments": len(self.__segments),
+                "totalBytes": self.__total_bytes,
+                "startTime": self.__segments[0].start_time if self.__segments else None,
+                "endTime": self.__segments[-1].end_time if self.__segments else None,
+            }
+
+    def __save(self):
+        index_path = os.path.join(self.directory, SegmentIndex.INDEX_FILE_NAME)
+        temporary_path = index_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump([segment.to_dict() for segment in self.__segments], file)
+        # Atomic, a crash never leaves a truncated index behind
+        os.replace(temporary_path, index_path)
+
+    def __load(self):
+        index_path = os.path.join(self.directory, SegmentIndex.INDEX_FILE_NAME)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, "r") as file:
+                segments = [Segment.from_dict(data) for data in json.load(file)]
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"Segment index {index_path} is unreadable, starting a new one: {e}")
+            return
+        # Files deleted by hand are dropped from the index
+        self.__segments = sorted((segment for segment in segments if os.path.exists(self.path(segment))),
+                                 key=lambda segment: segment.start_time)
+        self.__start_times = [segment.start_time for segment in self.__segments]
+        self.__total_bytes = sum(segment.size_bytes for segment in self.__segments)
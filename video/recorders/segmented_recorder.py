@@ -0,0 +1,191 @@
+import asyncio
+import fractions
+import logging
+import os
+import queue
+import threading
+import time
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import VIDEO_TIME_BASE, MediaStreamError
+
+from video.recorders.h264_stream import RtpTimestampUnwrapper, add_encoding_stream, add_remux_stream, detached_frame
+from video.recorders.retention_manager import RetentionManager
+from video.recorders.segment_index import Segment, SegmentIndex
+
+
+class SegmentedRecorder:
+    """Records one camera as a rolling series of fixed-length segments, written by a background thread.
+
+    The track may yield `av.Packet`s (a `PassthroughTrack`, remuxed) or decoded frames (encoded). Packet
+    segments are cut at the first keyframe after `segment_seconds`. MP4 segments are fragmented, so a segment
+    stays playable up to its last fragment if the process dies. Every finished segment is added to the
+    camera's `SegmentIndex` and the `RetentionManager` then deletes the oldest segments over the disk budget.
+    """
+    DEFAULT_SEGMENT_SECONDS = 60
+    DEFAULT_MAX_QUEUE_SIZE = 60
+    FRAGMENTED_MP4_OPTIONS = {"movflags": "frag_keyframe+empty_moov+default_base_moof"}
+
+    def __init__(self, segment_index: SegmentIndex, retention_manager: RetentionManager, container: str = "mp4",
+                 segment_seconds: float = DEFAULT_SEGMENT_SECONDS, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.segment_index = segment_index
+        self.retention_manager = retention_manager
+        self.container = container
+        self.segment_seconds = segment_seconds
+        self.written_segments = 0
+        self.dropped_count = 0
+        self.failed_segments = 0
+        self.__track: MediaStreamTrack | None = None
+        self.__items = queue.Queue(maxsize=max_queue_size)
+        # After dropping a packet everything up to the next keyframe is undecodable
+        self.__awaiting_keyframe = False
+        self.__task: asyncio.Task | None = None
+        self.__thread: threading.Thread | None = None
+
+    def addTrack(self, track: MediaStreamTrack):
+        if track.kind != "video":
+            raise ValueError("SegmentedRecorder only records video")
+        self.__track = track
+
+    async def start(self):
+        if self.__task is None and self.__track is not None:
+            self.__thread = threading.Thread(target=self.__write_segments, daemon=True,
+                                             name=f"segment-writer-{self.segment_index.directory}")
+            self.__thread.start()
+            self.__task = asyncio.create_task(self.__run_track(), name=f"segmented-recorder-{id(self)}")
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__thread is not None:
+            if self.__thread.is_alive():
+                await asyncio.to_thread(self.__items.put, None)
+            await asyncio.to_thread(self.__thread.join)
+            self.__thread = None
+
+    async def __run_track(self):
+        while True:
+            try:
+                item = await self.__track.recv()
+            except MediaStreamError:
+                return
+
+            if isinstance(item, av.Packet) and self.__awaiting_keyframe:
+                if not item.is_keyframe:
+                    self.dropped_count += 1
+                    continue
+                self.__awaiting_keyframe = False
+            try:
+                # The timestamp is read now, a shared frame's pts changes with the next frame of its track
+                self.__items.put_nowait((item, item.pts, item.time_base, time.time()))
+            except queue.Full:
+                self.dropped_count += 1
+                self.__awaiting_keyframe = isinstance(item, av.Packet)
+
+    def __write_segments(self):
+        segment = None
+        failing = False
+        while True:
+            entry = self.__items.get()
+            if entry is None:
+                break
+            item, pts, time_base, received_time = entry
+            try:
+                segment = self.__write(segment, item, pts, time_base, received_time)
+                if failing:
+                    self.logger.info(f"Segmented recording in {self.segment_index.directory} recovered")
+                    failing = False
+            except Exception as e:
+                # Only this segment is lost, the next item starts a new one
+                if not failing:
+                    self.logger.error(f"Segmented recording in {self.segment_index.directory} failed: {e}")
+                    failing = True
+                self.failed_segments += 1
+                self.__discard_segment(segment)
+                segment = None
+        if segment is not None:
+            try:
+                self.__finish_segment(segment, segment.end_time)
+            except Exception as e:
+                self.logger.error(f"Closing segment {segment.path} failed: {e}")
+                self.__discard_segment(segment)
+
+    def __write(self, segment: 'SegmentWriter | None', item, pts: int, time_base: fractions.Fraction,
+                received_time: float) -> 'SegmentWriter | None':
+        is_packet = isinstance(item, av.Packet)
+        if segment is not None and received_time - segment.start_time >= self.segment_seconds and \
+                (not is_packet or item.is_keyframe):
+            finished_segment, segment = segment, None
+            self.__finish_segment(finished_segment, received_time)
+        if segment is None:
+            if is_packet and not item.is_keyframe:
+                return None
+            segment = SegmentWriter(self.segment_index.directory, self.container, received_time, item,
+                                    SegmentedRecorder.FRAGMENTED_MP4_OPTIONS if self.container == "mp4" else None)
+        segment.write(item, pts, time_base, received_time)
+        return segment
+
+    def __discard_segment(self, segment: 'SegmentWriter | None'):
+        if segment is None:
+            return
+        segment.abort()
+        try:
+            os.remove(segment.path)
+        except OSError:
+            pass
+
+    def __finish_segment(self, segment: 'SegmentWriter', end_time: float):
+        segment.close()
+        self.segment_index.add(Segment(os.path.basename(segment.path), segment.start_time, end_time,
+                                       os.path.getsize(segment.path)))
+        self.written_segments += 1
+        self.retention_manager.enforce()
+
+
+class SegmentWriter:
+    """One open segment file, only used by the writer thread."""
+
+    def __init__(self, directory: str, container: str, start_time: float, first_item, options: dict | None):
+        self.path = os.path.join(directory, time.strftime('%Y%m%d-%H%M%S', time.localtime(start_time)) +
+                                 f"-{int(start_time * 1000) % 1000:03d}.{container}")
+        self.start_time = start_time
+        self.end_time = start_time
+        self.__container = av.open(self.path, mode="w", options=options)
+        # Every segment starts at 0, across wraps of the 32 bit RTP timestamps
+        self.__timestamps = RtpTimestampUnwrapper()
+        self.__is_remux = isinstance(first_item, av.Packet)
+        if self.__is_remux:
+            self.__stream = add_remux_stream(self.__container, first_item)
+        else:
+            self.__stream = add_encoding_stream(self.__container, first_item.width, first_item.height)
+
+    def write(self, item, pts: int, time_base: fractions.Fraction, received_time: float):
+        """`pts` / `time_base` as read when `item` was queued."""
+        ticks = self.__timestamps.unwrap(pts)
+        if self.__is_remux:
+            # Every subscriber of the tap gets its own packet
+            item.pts = ticks
+            item.dts = ticks
+            item.time_base = VIDEO_TIME_BASE
+            item.stream = self.__stream
+            self.__container.mux(item)
+        else:
+            for packet in self.__stream.encode(detached_frame(item, ticks, time_base)):
+                self.__container.mux(packet)
+        self.end_time = received_time
+
+    def close(self):
+        if not self.__is_remux:
+            for packet in self.__stream.encode(None):
+                self.__container.mux(packet)
+        self.__container.close()
+
+    def abort(self):
+        """Closes the file without flushing the encoder, after writing to it failed."""
+        try:
+            self.__container.close()
+        except Exception:
+            pass
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import queue
+import threading
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from video.recorders.h264_stream import add_encoding_stream, detached_frame
+
+
+class ThreadedEncodeRecorder:
+    """Records decoded frames like aiortc's `MediaRecorder`, but encodes and muxes in a background thread.
+
+    The event loop only hands frames over to a bounded queue. If the encoder cannot keep up, the incoming frame
+    is dropped and counted instead of letting decoded frames pile up.
+    """
+    DEFAULT_MAX_QUEUE_SIZE = 30
+
+    def __init__(self, file: str, format: str | None = None, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.file = file
+        self.encoded_frames = 0
+        self.dropped_frames = 0
+        self.__container = av.open(file=file, format=format, mode="w")
+        self.__track: MediaStreamTrack | None = None
+        self.__frames = queue.Queue(maxsize=max_queue_size)
+        self.__task: asyncio.Task | None = None
+        self.__thread: threading.Thread | None = None
+
+    def addTrack(self, track: MediaStreamTrack):
+        if track.kind != "video":
+            raise ValueError("ThreadedEncodeRecorder only records video")
+        self.__track = track
+
+    async def start(self):
+        if self.__task is None and self.__track is not None:
+            self.__thread = threading.Thread(target=self.__encode_frames, name=f"recorder-{self.file}", daemon=True)
+            self.__thread.start()
+            self.__task = asyncio.create_task(self.__run_track(), name=f"recorder-{self.file}")
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.__thread is not None:
+            if self.__thread.is_alive():
+                # The sentinel must not be dropped, the queue drains as the thread keeps encoding
+                await asyncio.to_thread(self.__frames.put, None)
+            await asyncio.to_thread(self.__thread.join)
+            self.__thread = None
+            self.logger.info(f"Recorded {self.encoded_frames} frames to {self.file} ({self.dropped_frames} dropped)")
+
+    async def __run_track(self):
+        while True:
+            try:
+                frame = await self.__track.recv()
+            except MediaStreamError:
+                return
+            try:
+                # The frame is shared with the track's other subscribers, its pts changes with the next frame
+                self.__frames.put_nowait((frame, frame.pts, frame.time_base))
+            except queue.Full:
+                self.dropped_frames += 1
+
+    def __encode_frames(self):
+        stream = None
+        try:
+            while True:
+                entry = self.__frames.get()
+                if entry is None:
+                    break
+                frame, pts, time_base = entry
+                if stream is None:
+                    stream = add_encoding_stream(self.__container, frame.width, frame.height)
+                for packet in stream.encode(detached_frame(frame, pts, time_base)):
+                    self.__container.mux(packet)
+                self.encoded_frames += 1
+
+            if stream is not None:
+                for packet in stream.encode(None):
+                    self.__container.mux(packet)
+        except Exception as e:
+            self.logger.error(f"Recording to {self.file} failed: {e}")
+        finally:
+            self.__container.close()
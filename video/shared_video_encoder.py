@@ -0,0 +1,364 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable
+
+from aiortc import MediaStreamTrack, RTCRtpSender
+from aiortc.codecs.base import Encoder
+from aiortc.codecs.h264 import DEFAULT_BITRATE, MAX_BITRATE, MIN_BITRATE, H264Encoder
+from aiortc.mediastreams import VIDEO_TIME_BASE, MediaStreamError, convert_timebase
+
+from services.metrics import LATENCY_BUCKETS_MS, REGISTRY
+from video.frame_tracer import FRAME_TRACER
+
+NAL_TYPE_IDR = 5
+# Lower bound of the lowest rendition of a ladder
+MIN_RENDITION_BITRATE = 100_000
+
+ENCODE_MS = REGISTRY.histogram("video_encode_ms", "Scaling and H.264 encoding of one frame by a shared encoder",
+                               LATENCY_BUCKETS_MS, ("stream", "rendition"))
+
+
+class Rendition:
+    """One output resolution of the ladder. `height` None keeps the source resolution."""
+
+    def __init__(self, height: int | None, max_bitrate: int, min_bitrate: int):
+        self.height = height
+        self.max_bitrate = max_bitrate
+        self.min_bitrate = min_bitrate
+
+    @staticmethod
+    def parse_ladder(specification: str) -> list['Rendition']:
+        """'1080:3000,540:1200,270:400' (height:max kbps) -> renditions ordered from highest to lowest.
+
+        A rendition's minimum bitrate is the maximum of the next lower one, so the bitrate ranges line up.
+        """
+        steps = sorted(((int(height), int(kbps) * 1000) for height, kbps in
+                        (step.split(":") for step in specification.split(",") if step.strip())), reverse=True)
+        return [Rendition(height, max_bitrate, steps[index + 1][1] if index + 1 < len(steps) else MIN_RENDITION_BITRATE)
+                for index, (height, max_bitrate) in enumerate(steps)]
+
+    def __repr__(self):
+        return f"{self.height or 'source'}p@{self.max_bitrate // 1000}kbps"
+
+
+class EncodedVideoFrame:
+    """RTP payloads of one encoded frame, shared by every consumer of a rendition."""
+
+    def __init__(self, payloads: list[bytes], timestamp: int, keyframe: bool):
+        self.payloads = payloads
+        self.timestamp = timestamp
+        self.keyframe = keyframe
+
+
+class FanOutTrack(MediaStreamTrack):
+    """Consumer side of a `SharedVideoEncoder`, yields `EncodedVideoFrame`s instead of decoded frames.
+
+    Frames are queued in order because every encoded frame may be referenced by the next one. A consumer that
+    falls `MAX_QUEUED_FRAMES` behind is resynchronised: its queue is cleared and it waits for the next keyframe.
+    A consumer switching renditions keeps its queue and continues at the new rendition's next keyframe.
+    """
+    kind = "video"
+    MAX_QUEUED_FRAMES = 30
+
+    def __init__(self, encoder: 'SharedVideoEncoder', name: str):
+        super().__init__()
+        self.name = name
+        self.dropped_count = 0
+        self.rendition_index = 0
+        self.switched_at = 0.0
+        self.__encoder = encoder
+        self.__frames = deque[EncodedVideoFrame | None]()
+        self.__frame_available = asyncio.Event()
+        # A new consumer cannot decode anything before the first keyframe
+        self.__awaiting_keyframe = True
+
+    def await_keyframe(self):
+        self.__awaiting_keyframe = True
+
+    def push(self, encoded_frame: EncodedVideoFrame | None):
+        if encoded_frame is not None:
+            if self.__awaiting_keyframe and not encoded_frame.keyframe:
+                self.dropped_count += 1
+                return
+            if len(self.__frames) >= FanOutTrack.MAX_QUEUED_FRAMES:
+                self.dropped_count += len(self.__frames) + 1
+                self.__frames.clear()
+                self.__awaiting_keyframe = True
+                self.__encoder.request_keyframe(self.rendition_index)
+                return
+            self.__awaiting_keyframe = False
+        self.__frames.append(encoded_frame)
+        self.__frame_available.set()
+
+    async def recv(self) -> EncodedVideoFrame:
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        self.__encoder.start()
+        while not self.__frames:
+            self.__frame_available.clear()
+            await self.__frame_available.wait()
+        encoded_frame = self.__frames.popleft()
+
+        if encoded_frame is None:
+            self.stop()
+            raise MediaStreamError
+        return encoded_frame
+
+    def stop(self):
+        super().stop()
+        if self.__encoder is not None:
+            self.__encoder.unsubscribe(self)
+            self.__encoder = None
+            self.__frames.clear()
+
+
+class FanOutEncoderHandle(Encoder):
+    """Stands in for the per-sender encoder of an `RTCRtpSender` that sends a `FanOutTrack`.
+
+    The sender hands the track's `EncodedVideoFrame`s to `pack`, which returns the already packetized payloads.
+    PLI/FIR requests of the receiver and its REMB estimate are forwarded to the shared encoder.
+    """
+
+    def __init__(self, encoder: 'SharedVideoEncoder', sender: RTCRtpSender, track: FanOutTrack):
+        self.__encoder = encoder
+        self.__sender = sender
+        self.__track = track
+        self.__target_bitrate = DEFAULT_BITRATE
+
+    def encode(self, frame, force_keyframe: bool = False):
+        raise RuntimeError("FanOutEncoderHandle only packs frames encoded by the shared encoder")
+
+    def pack(self, encoded_frame: EncodedVideoFrame) -> tuple[list[bytes], int]:
+        # The sender sets its private keyframe flag on PLI/FIR but only reads it when it encodes itself
+        if getattr(self.__sender, "_RTCRtpSender__force_keyframe", False):
+            self.__sender._RTCRtpSender__force_keyframe = False
+            self.__encoder.request_keyframe(self.__track.rendition_index)
+        return encoded_frame.payloads, encoded_frame.timestamp
+
+    @property
+    def target_bitrate(self) -> int:
+        return self.__target_bitrate
+
+    @target_bitrate.setter
+    def target_bitrate(self, bitrate: int):
+        self.__target_bitrate = bitrate
+        self.__encoder.on_bitrate_estimate(self.__track)
+
+
+class BoundedH264Encoder(H264Encoder):
+    """H.264 encoder with its own bitrate bounds, aiortc clamps to the same global range for every resolution."""
+
+    def __init__(self, min_bitrate: int, max_bitrate: int):
+        super().__init__()
+        self.min_bitrate = min_bitrate
+        self.max_bitrate = max_bitrate
+        self.__target_bitrate = max(min_bitrate, min(DEFAULT_BITRATE, max_bitrate))
+
+    @property
+    def target_bitrate(self) -> int:
+        return self.__target_bitrate
+
+    @target_bitrate.setter
+    def target_bitrate(self, bitrate: int):
+        self.__target_bitrate = max(self.min_bitrate, min(bitrate, self.max_bitrate))
+
+
+class RenditionEncoder:
+    """Scales (libswscale, via `VideoFrame.reformat`) and encodes the frames of one rendition."""
+
+    def __init__(self, rendition: Rendition, stream_name: str):
+        self.rendition = rendition
+        self.encode_time = ENCODE_MS.labels(stream_name, repr(rendition))
+        self.encoder = BoundedH264Encoder(rendition.min_bitrate, rendition.max_bitrate)
+        self.tracks = set[FanOutTrack]()
+        self.encoded_frames = 0
+        self.keyframe_requests = 0
+        self.forced_keyframes = 0
+        self.__keyframe_requested = False
+        self.__last_forced_keyframe = 0.0
+
+    def request_keyframe(self):
+        self.keyframe_requests += 1
+        self.__keyframe_requested = True
+
+    def take_keyframe_request(self) -> bool:
+        now = time.monotonic()
+        if not self.__keyframe_requested or \
+                now - self.__last_forced_keyframe < SharedVideoEncoder.KEYFRAME_MIN_INTERVAL_SECONDS:
+            return False
+        self.__keyframe_requested = False
+        self.__last_forced_keyframe = now
+        self.forced_keyframes += 1
+        return True
+
+    def encode(self, frame, force_keyframe: bool) -> EncodedVideoFrame:
+        start = time.perf_counter()
+        height = self.rendition.height
+        if height is not None and height < frame.height:
+            # Even dimensions for yuv420p, the aspect ratio of the source is kept
+            width = round(frame.width * height / frame.height / 2) * 2
+            scaled_frame = frame.reformat(width=width, height=height, format="yuv420p")
+            scaled_frame.pts = frame.pts
+            scaled_frame.time_base = frame.time_base
+            frame = scaled_frame
+        nal_units = list(self.encoder._encode_frame(frame, force_keyframe))
+        keyframe = any(nal_unit[0] & 0x1F == NAL_TYPE_IDR for nal_unit in nal_units)
+        self.encode_time.observe((time.perf_counter() - start) * 1000)
+        return EncodedVideoFrame(self.encoder._packetize(nal_units),
+                                 convert_timebase(frame.pts, frame.time_base, VIDEO_TIME_BASE), keyframe)
+
+    def get_statistics(self) -> dict:
+        return {
+            "rendition": repr(self.rendition),
+            "subscribers": len(self.tracks),
+            "encodedFrames": self.encoded_frames,
+            "keyframeRequests": self.keyframe_requests,
+            "forcedKeyframes": self.forced_keyframes,
+            "targetBitrate": self.encoder.target_bitrate,
+        }
+
+
+class SharedVideoEncoder:
+    """Encodes the frames of one source track once per rendition and fans the RTP payloads out to the consumers.
+
+    Without it every consumer's `RTCRtpSender` runs its own H.264 encoder on the same frame. With a ladder of
+    renditions (e.g. 1080p/540p/270p) every consumer is assigned the highest rendition its REMB estimate
+    supports; only renditions with consumers are scaled and encoded. Keyframe requests are coalesced per
+    rendition: pending requests are served by a single forced keyframe, at most one per
+    `KEYFRAME_MIN_INTERVAL_SECONDS`. A rendition's bitrate follows the lowest estimate of its consumers.
+    """
+    KEYFRAME_MIN_INTERVAL_SECONDS = 0.5
+    # A consumer moves to a higher rendition only with this much headroom and not sooner than the dwell time
+    SWITCH_UP_HEADROOM = 1.2
+    MIN_RENDITION_DWELL_SECONDS = 5.0
+
+    def __init__(self, source: MediaStreamTrack, name: str, renditions: list[Rendition] | None = None,
+                 on_closed: Callable[['SharedVideoEncoder'], None] | None = None):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.rendition_switches = 0
+        self.__source = source
+        self.__on_closed = on_closed
+        renditions = renditions or [Rendition(None, MAX_BITRATE, MIN_BITRATE)]
+        self.__renditions = [RenditionEncoder(rendition, name) for rendition in renditions]
+        self.__handles = dict[FanOutTrack, FanOutEncoderHandle]()
+        self.__task: asyncio.Task | None = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(rendition.tracks) for rendition in self.__renditions)
+
+    def subscribe(self, name: str) -> FanOutTrack:
+        track = FanOutTrack(self, name)
+        self.__assign(track, self.__select_rendition(DEFAULT_BITRATE))
+        return track
+
+    def attach(self, sender: RTCRtpSender, track: FanOutTrack) -> FanOutEncoderHandle:
+        """Makes `sender`, which sends `track`, pack the shared payloads instead of creating its own encoder."""
+        handle = FanOutEncoderHandle(self, sender, track)
+        sender._RTCRtpSender__encoder = handle
+        self.__handles[track] = handle
+        return handle
+
+    def unsubscribe(self, track: FanOutTrack):
+        self.__renditions[track.rendition_index].tracks.discard(track)
+        self.__handles.pop(track, None)
+        self.__update_target_bitrate(self.__renditions[track.rendition_index])
+        if self.subscriber_count == 0:
+            self.close()
+
+    def start(self):
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__run(), name=f"shared-encoder-{self.name}")
+
+    def close(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        self.__source.stop()
+        for rendition in self.__renditions:
+            for track in list(rendition.tracks):
+                track.push(None)
+        if self.__on_closed is not None:
+            self.__on_closed(self)
+            self.__on_closed = None
+
+    def request_keyframe(self, rendition_index: int = 0):
+        self.__renditions[rendition_index].request_keyframe()
+
+    def on_bitrate_estimate(self, track: FanOutTrack):
+        handle = self.__handles.get(track)
+        if handle is None:
+            return
+        rendition_index = self.__select_rendition(handle.target_bitrate, track.rendition_index)
+        if rendition_index != track.rendition_index and \
+                time.monotonic() - track.switched_at >= SharedVideoEncoder.MIN_RENDITION_DWELL_SECONDS:
+            self.logger.info(f"{track.name}: {self.__renditions[track.rendition_index].rendition} -> "
+                             f"{self.__renditions[rendition_index].rendition} ({handle.target_bitrate} bps)")
+            self.rendition_switches += 1
+            self.__assign(track, rendition_index)
+        self.__update_target_bitrate(self.__renditions[track.rendition_index])
+
+    def get_statistics(self) -> dict:
+        return {
+            "name": self.name,
+            "subscribers": self.subscriber_count,
+            "renditionSwitches": self.rendition_switches,
+            "renditions": [rendition.get_statistics() for rendition in self.__renditions],
+            "consumers": {track.name: {"rendition": repr(self.__renditions[track.rendition_index].rendition),
+                                       "estimatedBitrate": handle.target_bitrate,
+                                       "droppedFrames": track.dropped_count}
+                          for track, handle in self.__handles.items()},
+        }
+
+    def __select_rendition(self, bitrate: int, current_index: int | None = None) -> int:
+        """Index of the highest rendition `bitrate` supports; moving up needs `SWITCH_UP_HEADROOM`."""
+        for index, rendition in enumerate(self.__renditions):
+            required = rendition.rendition.min_bitrate
+            if current_index is not None and index < current_index:
+                required *= SharedVideoEncoder.SWITCH_UP_HEADROOM
+            if bitrate >= required:
+                return index
+        return len(self.__renditions) - 1
+
+    def __assign(self, track: FanOutTrack, rendition_index: int):
+        self.__renditions[track.rendition_index].tracks.discard(track)
+        track.rendition_index = rendition_index
+        track.switched_at = time.monotonic()
+        track.await_keyframe()
+        rendition = self.__renditions[rendition_index]
+        rendition.tracks.add(track)
+        rendition.request_keyframe()
+
+    def __update_target_bitrate(self, rendition: RenditionEncoder):
+        estimates = [self.__handles[track].target_bitrate for track in rendition.tracks if track in self.__handles]
+        if estimates:
+            rendition.encoder.target_bitrate = min(estimates)
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+        self.logger.info(f"Shared encoder [{self.name}] started ({self.__renditions[0].rendition}"
+                         f"{''.join(f', {rendition.rendition}' for rendition in self.__renditions[1:])})")
+        while True:
+            try:
+                frame = await self.__source.recv()
+            except MediaStreamError:
+                break
+            # Renditions without consumers cost nothing, the others are scaled and encoded in parallel
+            active = [rendition for rendition in self.__renditions if rendition.tracks]
+            encoded_frames = await asyncio.gather(*[
+                loop.run_in_executor(None, rendition.encode, frame, rendition.take_keyframe_request())
+                for rendition in active])
+            FRAME_TRACER.mark(frame.pts, "encoded")
+            for rendition, encoded_frame in zip(active, encoded_frames):
+                if not encoded_frame.payloads:
+                    continue
+                rendition.encoded_frames += 1
+                for track in list(rendition.tracks):
+                    track.push(encoded_frame)
+        self.logger.info(f"Shared encoder [{self.name}] stopped")
+        self.__task = None
+        self.close()
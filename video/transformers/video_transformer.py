@@ -1,15 +1,56 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import Callable
 
 from av import VideoFrame
 
 
 class VideoTransformer(ABC):
-
     def __init__(self):
         self._start_detection_time = 0
         self.measured_detection_time_ms = 0
         self.frames_detection_count = 0
+        self.__detection_listeners = list[tuple[asyncio.AbstractEventLoop, Callable[[dict], None]]]()
+
+    def add_detection_listener(self, listener: Callable[[dict], None]):
+        """`listener` is called on the current event loop with every detection result."""
+        self.__detection_listeners.append((asyncio.get_running_loop(), listener))
+
+    def remove_detection_listener(self, listener: Callable[[dict], None]):
+        self.__detection_listeners = [(loop, registered) for loop, registered in self.__detection_listeners
+                                      if registered != listener]
+
+    def publish_detections(self, detections: dict):
+        """Safe to call from frame processing worker threads."""
+        for loop, listener in self.__detection_listeners:
+            loop.call_soon_threadsafe(listener, detections)
 
     @abstractmethod
     async def transform_frame_task(self, frame) -> VideoFrame:
         pass
+
+    async def detect_frame(self, frame) -> dict | None:
+        """Runs detection only, used when detections are composited onto live frames. None = not supported."""
+        return None
+
+    def annotate_frame(self, frame, detections) -> VideoFrame:
+        return frame
+
+    async def annotate_frame_task(self, frame, detections) -> VideoFrame:
+        return self.annotate_frame(frame, detections)
+
+
+class PipelinedTransformerMixin(ABC):
+    """Splits `transform_frame_task` into stages, so `VideoTransformTrack` can overlap them for consecutive frames."""
+
+    @abstractmethod
+    async def preprocess_frame_task(self, frame):
+        pass
+
+    @abstractmethod
+    async def infer_task(self, preprocessed):
+        pass
+
+    @abstractmethod
+    async def postprocess_frame_task(self, inferred) -> VideoFrame:
+        pass
@@ -1,19 +1,20 @@
 import asyncio
 import logging
 import time
-from functools import partial
 
-import cv2
-import numpy as np
 from av import VideoFrame
 
 from ai.yolo_model import YoloModel
+from services.metrics import LATENCY_BUCKETS_MS, REGISTRY
 from video.detection_service import DetectionService
-from video.transformers.video_transformer import VideoTransformer
+from video.frame_tracer import FRAME_TRACER
+from video.transformers.video_transformer import PipelinedTransformerMixin, VideoTransformer
 
+ANNOTATE_MS = REGISTRY.histogram("annotate_ms", "Drawing detections onto a frame, BGR conversions included",
+                                 LATENCY_BUCKETS_MS, ("model",))
 
-class YoloTransformer(VideoTransformer):
 
+class YoloTransformer(VideoTransformer, PipelinedTransformerMixin):
     def __init__(self, model_id: str, detection_service):
         super().__init__()
         self.logger = logging.getLogger(__name__)
@@ -30,19 +31,111 @@ class YoloTransformer(VideoTransformer):
             logging.error(f"Model with ID: {model_id} is not a YOLO model")
             return
         self.__model = model
+        self.__annotate_time = ANNOTATE_MS.labels(model_id)
 
     async def transform_frame_task(self, frame) -> VideoFrame:
+        self.logger.info(f"Detecting [{self.__model.model_id}]...")
+        executor = self.detection_service.frame_processing_executor
+        if executor.is_inline:
+            return await self.detect(frame)
+        return await executor.run(self.__transform_frame_blocking, frame, asyncio.get_running_loop())
+
+    async def detect(self, frame) -> VideoFrame:
+        self._start_detection_time = time.time_ns()
+        FRAME_TRACER.mark(frame.pts, "inference_start")
+        detections = await self.__model.detect_frame(frame)
+        FRAME_TRACER.mark(frame.pts, "inference_end")
+        self.__model.log_detections(detections)
+        self.publish_detections(detections)
+        self.frames_detection_count += 1
+        self.measured_detection_time_ms = (time.time_ns() - self._start_detection_time) // 1_000_000
+        return self.annotate_frame(frame, detections, detached=True)
+
+    async def detect_frame(self, frame) -> dict | None:
+        executor = self.detection_service.frame_processing_executor
+        if executor.is_inline:
+            self._start_detection_time = time.time_ns()
+            detections = await self.__model.detect_frame(frame)
+            self.publish_detections(detections)
+            self.frames_detection_count += 1
+            self.measured_detection_time_ms = (time.time_ns() - self._start_detection_time) // 1_000_000
+            return detections
+        return await executor.run(self.__detect_frame_blocking, frame, asyncio.get_running_loop())
+
+    def annotate_frame(self, frame, detections, detached: bool = False) -> VideoFrame:
+        """`detached`: the result is kept and re-timed by the track, it must not be the decoded frame itself,
+        which other subscribers of the source hold."""
+        # The only full-resolution BGR conversion, frames without detections are passed on as decoded
+        if len(detections["boxes"]) == 0:
+            FRAME_TRACER.mark(frame.pts, "annotated")
+            return YoloTransformer.__copy_frame(frame) if detached else frame
+
+        start = time.perf_counter()
         img = frame.to_ndarray(format="bgr24")
-        return await self.detect(frame, img)
+        self.__model.get_overlay().draw(img, detections)
 
-    async def detect(self, frame, img) -> VideoFrame:
-        self.logger.info(f"Detecting [{self.__model.model_id}]...")
+        annotated_frame = VideoFrame.from_ndarray(img, format="bgr24")
+        annotated_frame.pts = frame.pts
+        annotated_frame.time_base = frame.time_base
+        self.__annotate_time.observe((time.perf_counter() - start) * 1000)
+        FRAME_TRACER.mark(frame.pts, "annotated")
+        return annotated_frame
+
+    async def annotate_frame_task(self, frame, detections, detached: bool = False) -> VideoFrame:
+        if len(detections["boxes"]) == 0 and not detached:
+            return self.annotate_frame(frame, detections)
+        return await self.detection_service.frame_processing_executor.run(self.annotate_frame, frame, detections,
+                                                                          detached)
+
+    async def preprocess_frame_task(self, frame):
+        return await self.detection_service.frame_processing_executor.run(self.__preprocess_frame_blocking, frame)
+
+    async def infer_task(self, preprocessed):
+        frame, resized_img = preprocessed
+        start_ns = time.time_ns()
+        FRAME_TRACER.mark(frame.pts, "inference_start")
+        detections = self.__model.postprocess_to_size(await self.__model.infer(resized_img), frame.height,
+                                                      frame.width, resized_img)
+        FRAME_TRACER.mark(frame.pts, "inference_end")
+        self.publish_detections(detections)
+        self.frames_detection_count += 1
+        self.measured_detection_time_ms = (time.time_ns() - start_ns) // 1_000_000
+        return frame, detections
+
+    async def postprocess_frame_task(self, inferred) -> VideoFrame:
+        frame, detections = inferred
+        return await self.annotate_frame_task(frame, detections, detached=True)
+
+    def __preprocess_frame_blocking(self, frame):
+        return frame, self.__model.preprocess_frame(frame)
+
+    def __transform_frame_blocking(self, frame, loop) -> VideoFrame:
+        # scale + convert -> infer -> annotate -> rebuild frame, all in one worker thread
+        self._start_detection_time = time.time_ns()
+        FRAME_TRACER.mark(frame.pts, "inference_start")
+        detections = self.__model.detect_frame_blocking(frame, loop)
+        FRAME_TRACER.mark(frame.pts, "inference_end")
+        self.publish_detections(detections)
+        self.frames_detection_count += 1
+        self.measured_detection_time_ms = (time.time_ns() - self._start_detection_time) // 1_000_000
+        return self.annotate_frame(frame, detections, detached=True)
+
+    def __detect_frame_blocking(self, frame, loop) -> dict:
         self._start_detection_time = time.time_ns()
-        img = await self.__model.detect_yolo_as_image(img)
+        FRAME_TRACER.mark(frame.pts, "inference_start")
+        detections = self.__model.detect_frame_blocking(frame, loop)
+        FRAME_TRACER.mark(frame.pts, "inference_end")
+        self.publish_detections(detections)
         self.frames_detection_count += 1
         self.measured_detection_time_ms = (time.time_ns() - self._start_detection_time) // 1_000_000
+        return detections
 
-        transformed_frame = VideoFrame.from_ndarray(np.uint8(img), format="bgr24")
-        transformed_frame.pts = frame.pts
-        transformed_frame.time_base = frame.time_base
-        return transformed_frame
+    @staticmethod
+    def __copy_frame(frame) -> VideoFrame:
+        if frame.format.name == "yuv420p":
+            copy = VideoFrame.from_ndarray(frame.to_ndarray(), format="yuv420p")
+        else:
+            copy = frame.reformat(format="yuv420p")
+        copy.pts = frame.pts
+        copy.time_base = frame.time_base
+        return copy
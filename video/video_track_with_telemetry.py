@@ -5,6 +5,11 @@ import time
 from aiortc import MediaStreamTrack
 from av import VideoFrame
 
+from services.metrics import REGISTRY
+
+FRAMES_DECODED = REGISTRY.counter("video_frames_decoded_total", "Decoded frames read from a track, rate() = decode fps",
+                                  ("track",))
+
 
 class VideoTrackWithTelemetry(MediaStreamTrack):
     PRINT_TELEMETRY_DATA_IN_SECONDS = 10
@@ -19,6 +24,7 @@ class VideoTrackWithTelemetry(MediaStreamTrack):
         self.fps_decoded = 0
         self.__received_frames = 0
         self.__decoded_incoming_frames = 0
+        self.__decoded_frames_counter = FRAMES_DECODED.labels(name)
         self.__timestamp_start_ns = time.time_ns()
         self.__telemetry_task = asyncio.create_task(self.calculate_fps())
 
@@ -32,11 +38,16 @@ class VideoTrackWithTelemetry(MediaStreamTrack):
         self.__received_frames += 1
         frame: VideoFrame = await self.track.recv()
         self.__decoded_incoming_frames += 1
+        self.__decoded_frames_counter.inc()
         return await self.on_frame_received(frame)
 
     async def on_frame_received(self, frame) -> VideoFrame:
         return frame
 
+    def _on_telemetry_window(self, passed_seconds: float):
+        """Called after every fps window, for subclasses with rates of their own."""
+        pass
+
     async def calculate_fps(self):
         while True:
             passed_seconds = (((time.time_ns() - self.__timestamp_start_ns) + 0.000000001) / 1_000_000_000)
@@ -55,6 +66,7 @@ class VideoTrackWithTelemetry(MediaStreamTrack):
             self.__received_frames = 0
             self.__decoded_incoming_frames = 0
             self.__timestamp_start_ns = time.time_ns()
+            self._on_telemetry_window(passed_seconds)
 
             # App.telemetry_service.fps_decoding = self.__fps_decoding
             # App.telemetry_service.fps_detection = self.__fps_detection
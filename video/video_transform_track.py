@@ -1,21 +1,74 @@
 import asyncio
 import logging
+import time
+
 from av import VideoFrame
-from video.transformers.video_transformer import VideoTransformer
+from video.frame_tracer import FRAME_TRACER
+from video.motion_gate import MotionGate
+from video.object_tracker import ObjectTracker
+from video.transformers.video_transformer import PipelinedTransformerMixin, VideoTransformer
 from video.video_track_with_telemetry import VideoTrackWithTelemetry
 
 
+class LatestValueSlot:
+    """Hands values to the next pipeline stage without blocking, a value it did not pick up yet is replaced."""
+
+    def __init__(self):
+        self.replaced_count = 0
+        self.__value = None
+        self.__has_value = False
+        self.__value_available = asyncio.Event()
+
+    def put(self, value):
+        if self.__has_value:
+            self.replaced_count += 1
+        self.__value = value
+        self.__has_value = True
+        self.__value_available.set()
+
+    async def get(self):
+        while not self.__has_value:
+            self.__value_available.clear()
+            await self.__value_available.wait()
+        value = self.__value
+        self.__value = None
+        self.__has_value = False
+        return value
+
+
 class VideoTransformTrack(VideoTrackWithTelemetry):
-    def __init__(self, track, name, video_transformer: VideoTransformer):
+    def __init__(self, track, name, video_transformer: VideoTransformer, composite_detections: bool = False,
+                 motion_gate: MotionGate | None = None, object_tracker: ObjectTracker | None = None,
+                 pipelined: bool = False):
         super().__init__(track, name)
         self.logger = logging.getLogger(__name__)
         self.video_transformer: VideoTransformer = video_transformer
         self.detection_time = 0
+        # Draw the latest detections onto every incoming frame instead of replaying the last inferred frame
+        self.composite_detections = composite_detections
+        self.motion_gate = motion_gate
+        # Tracked boxes are predicted for every frame, which only makes sense when compositing
+        self.object_tracker = object_tracker
+        if object_tracker is not None:
+            self.composite_detections = True
+        self.inference_executed_count = 0
+        self.inference_skipped_count = 0
+        self.fps_detection = 0
+        # Overlap preprocessing, inference and postprocessing of consecutive frames
+        self.pipelined = pipelined and not self.composite_detections and \
+            isinstance(video_transformer, PipelinedTransformerMixin)
 
         self.__is_processing_frame = False
         self.__current_frame = None
         self.__transformation_task: asyncio.Task | None = None
         self.__transformed_frames_count = 0
+        self.__window_start_transformed_frames = 0
+        self.__last_detections: dict | None = None
+        # One slot in front of every stage, a stage always picks up the newest result of the previous one
+        self.__preprocess_slot = LatestValueSlot()
+        self.__inference_slot = LatestValueSlot()
+        self.__postprocess_slot = LatestValueSlot()
+        self.__pipeline_tasks: list[asyncio.Task] = []
         self.on("ended", self.on_track_ended)
 
     async def create_transformation_task(self, frame: VideoFrame):
@@ -28,22 +81,113 @@ class VideoTransformTrack(VideoTrackWithTelemetry):
         self.detection_time = self.video_transformer.measured_detection_time_ms
         self.__transformed_frames_count += 1
 
+    async def create_detection_task(self, frame: VideoFrame):
+        detections = await self.video_transformer.detect_frame(frame)
+        if detections is None:
+            self.logger.warning(f"{self.name}: transformer does not support compositing, disabling it")
+            self.composite_detections = False
+            return
+        self.__last_detections = detections
+        if self.object_tracker is not None:
+            self.object_tracker.update(detections, self.__frame_time(frame))
+        self.detection_time = self.video_transformer.measured_detection_time_ms
+        self.__transformed_frames_count += 1
+
+    def _on_telemetry_window(self, passed_seconds: float):
+        self.fps_detection = (self.__transformed_frames_count - self.__window_start_transformed_frames) / passed_seconds
+        self.__window_start_transformed_frames = self.__transformed_frames_count
+
     def on_track_ended(self):
-        self.__transformation_task.cancel()
+        if self.__transformation_task:
+            self.__transformation_task.cancel()
+        for task in self.__pipeline_tasks:
+            task.cancel()
 
     async def on_frame_received(self, frame) -> VideoFrame:
-        if self.__current_frame is None:
-            self.__current_frame = frame
+        FRAME_TRACER.mark(frame.pts, "dequeued")
+        if self.composite_detections:
+            return await self.__composite_frame(frame)
+
+        # The transformed frame is re-timed for every frame; until there is one the decoded frame, which other
+        # subscribers of the source hold, is passed on unchanged
+        output_frame = self.__current_frame if self.__current_frame is not None else frame
+        output_frame.pts = frame.pts
+        output_frame.time_base = frame.time_base
+        output_frame.dts = frame.dts
 
-        self.__current_frame.pts = frame.pts
-        self.__current_frame.time_base = frame.time_base
-        self.__current_frame.dts = frame.dts
+        if self.pipelined:
+            self.__submit_to_pipeline(frame)
+            return output_frame
 
         if self.__is_processing_frame:
-            return self.__current_frame
+            return output_frame
+
+        # Unchanged scene: the last transformed frame already shows the current detections
+        if not self.__should_infer(frame):
+            return output_frame
 
         self.__is_processing_frame = True
         if not self.__transformation_task or self.__transformation_task.done():
+            self.inference_executed_count += 1
             self.__transformation_task = asyncio.create_task(self.create_transformation_task(frame))
 
-        return self.__current_frame
+        return output_frame
+
+    async def __composite_frame(self, frame) -> VideoFrame:
+        if (not self.__transformation_task or self.__transformation_task.done()) and self.__should_infer(frame):
+            self.inference_executed_count += 1
+            self.__transformation_task = asyncio.create_task(self.create_detection_task(frame))
+
+        if self.__last_detections is None:
+            return frame
+        if self.object_tracker is not None:
+            return await self.video_transformer.annotate_frame_task(
+                frame, self.object_tracker.predict(self.__frame_time(frame)))
+        return await self.video_transformer.annotate_frame_task(frame, self.__last_detections)
+
+    def __submit_to_pipeline(self, frame):
+        if not self.__pipeline_tasks:
+            self.__pipeline_tasks = [
+                asyncio.create_task(self.__run_pipeline_stage(self.__preprocess_stage), name=f"{self.name}-preprocess"),
+                asyncio.create_task(self.__run_pipeline_stage(self.__inference_stage), name=f"{self.name}-inference"),
+                asyncio.create_task(self.__run_pipeline_stage(self.__postprocess_stage),
+                                    name=f"{self.name}-postprocess"),
+            ]
+        self.__preprocess_slot.put(frame)
+
+    async def __run_pipeline_stage(self, stage):
+        while True:
+            try:
+                await stage()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"{self.name}: pipeline stage {stage.__name__} failed: {e}")
+
+    async def __preprocess_stage(self):
+        frame = await self.__preprocess_slot.get()
+        if not self.__should_infer(frame):
+            return
+        self.__inference_slot.put(await self.video_transformer.preprocess_frame_task(frame))
+
+    async def __inference_stage(self):
+        preprocessed = await self.__inference_slot.get()
+        self.inference_executed_count += 1
+        self.__postprocess_slot.put(await self.video_transformer.infer_task(preprocessed))
+
+    async def __postprocess_stage(self):
+        inferred = await self.__postprocess_slot.get()
+        transformed_frame = await self.video_transformer.postprocess_frame_task(inferred)
+        self.__current_frame = transformed_frame
+        self.detection_time = self.video_transformer.measured_detection_time_ms
+        self.__transformed_frames_count += 1
+
+    @staticmethod
+    def __frame_time(frame) -> float:
+        return frame.time if frame.time is not None else time.monotonic()
+
+    def __should_infer(self, frame) -> bool:
+        if self.motion_gate is None or self.motion_gate.should_infer(frame):
+            return True
+        self.inference_skipped_count += 1
+        return False